@@ -1,73 +1,18 @@
-import re
 import logging
-import datetime
-import json
-import hashlib
-import os
-import time
-import random
-from collections import defaultdict
-from typing import List, Dict, Tuple, Any, Union
-import sqlite3
-from jsonschema import validate, ValidationError
-from docx import Document
-from docx.shared import Inches
+import math
+from typing import List, Dict, Any, Callable
 import streamlit as st
-import google.generativeai as genai
 from google.generativeai.types import StopCandidateException
 import tornado
-import mimetypes
-
-
-# Konstanten und globale Einstellungen
-MODEL_NAME_TEXT = "gemini-2.0-flash-thinking-exp-01-21"  # Für Text
-MODEL_NAME_VISION = "gemini-2.0-flash-thinking-exp-01-21"  # Für Bilder
-
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-API_SLEEP_SECONDS = 60       # Wartezeit zwischen API-Aufrufen
-API_MAX_RETRIES = 3          # Maximale Wiederholungsanzahl bei API-Fehlern
-SUMMARY_SLEEP_SECONDS = 10  # Pause nach der Zusammenfassung
-
-AUDIT_LOG_FILE = "audit_log.txt"
-EXPIRATION_TIME_SECONDS = 300
-ROLE_PERMISSIONS = {
-    "user": ["REQ", "DATA"],
-    "admin": ["REQ", "DATA", "CALC", "IF", "AI"]
-}
-PRIORITY_MAP = {"HIGH": 1, "MEDIUM": 2, "LOW": 3}
-
-USER_DATA_FILE = "user_data.json"
-DISCUSSION_DB_FILE = "discussion_data.db"
-RATING_DATA_FILE = "rating_data.json"
-AGENT_CONFIG_FILE = "agent_config.json"
-
-USER_DATA_SCHEMA = {
-    "type": "object",
-    "patternProperties": {
-        "^[a-zA-Z0-9_-]+$": {
-            "type": "object",
-            "properties": {
-                "password": {"type": "string"}
-            },
-            "required": ["password"]
-        }
-    }
-}
-
-AGENT_CONFIG_SCHEMA = {
-    "type": "array",
-    "items": {
-        "type": "object",
-        "properties": {
-            "name": {"type": "string"},
-            "personality": {"type": "string", "enum": ["kritisch", "visionär", "konservativ", "neutral"]},
-            "description": {"type": "string"}
-        },
-        "required": ["name", "personality", "description"]
-    }
-}
-
+from think_tank import (
+    AGENT_PICKER_PAGE_SIZE, AgentRegistry, CONVERSATION_SUMMARY_MODE, LEADERBOARD_MIN_VOTES, PANEL_MAX_CONCURRENCY,
+    PERSONALITY_PROMPT_SUFFIXES, ROUND_MODES, SUMMARY_EVERY_N_TURNS, SUMMARY_MODES, SummaryPolicy,
+    TRANSCRIPT_PAGE_SIZE, agent_leaderboard_db, claim_discussion_resume_db, create_discussion_table,
+    get_agent_registry, get_api_key_pool, get_rate_limiter, joint_conversation_with_selected_agents,
+    list_discussions_db, load_discussion_db, load_resume_state_db, login_user, new_discussion_id,
+    rate_agent_response, register_user, save_chat_as_word, save_discussion_data_db, search_discussions_db,
+    start_metrics_exporters
+)
 
 translations = {
     "de": {
@@ -107,7 +52,36 @@ translations = {
         "saved_discussions" : "Gespeicherte Diskussionen",
         "load_discussions" : "Diskussionen laden",
         "agent_conversation" : "Agenten-Konversation",
-        "formatted_output" : "Formatierter Output"
+        "formatted_output" : "Formatierter Output",
+        "api_quota" : "API-Kontingent",
+        "summary_mode" : "Zusammenfassungsmodus",
+        "summary_every_n" : "Zusammenfassung alle N Runden",
+        "discussion_stats" : "Diskussionsstatistik",
+        "use_response_cache" : "Antwort-Cache verwenden",
+        "stream_responses" : "Antworten streamen",
+        "round_mode" : "Rundenmodus",
+        "panel_concurrency" : "Parallele Anfragen (Panel)",
+        "early_stop" : "Bei Wiederholungen vorzeitig beenden",
+        "agent_search" : "Agenten suchen",
+        "agent_category" : "Kategorie",
+        "all_categories" : "Alle Kategorien",
+        "page" : "Seite",
+        "agent_picker_status" : "Seite {page} von {pages} · {matches} Treffer · {selected} ausgewählt",
+        "clear_selection" : "Auswahl leeren",
+        "transcript_status" : "Einträge {start}–{end} von {total}",
+        "no_discussions" : "Keine gespeicherten Diskussionen.",
+        "open_discussion" : "Öffnen",
+        "previous_page" : "Zurück",
+        "next_page" : "Weiter",
+        "resume_discussion" : "Fortsetzen",
+        "resume_unavailable" : "Die Diskussion läuft bereits und kann nicht fortgesetzt werden.",
+        "search_discussions" : "Diskussionen durchsuchen",
+        "no_search_results" : "Keine Treffer.",
+        "leaderboard" : "Bestenliste der Agenten",
+        "personality_filter" : "Persönlichkeit",
+        "all_personalities" : "Alle Persönlichkeiten",
+        "no_ratings" : "Noch kein Agent mit mindestens {min_votes} Stimmen.",
+        "leaderboard_caption" : "Sortiert nach Wilson-Untergrenze des Anteils positiver Stimmen (mindestens {min_votes} Stimmen)."
     },
     "en": {
         "title": "CipherCore Agent Conversation",
@@ -146,7 +120,36 @@ translations = {
         "saved_discussions" : "Saved Discussions",
         "load_discussions" : "Load Discussions",
         "agent_conversation" : "Agent Conversation",
-        "formatted_output" : "Formatted Output"
+        "formatted_output" : "Formatted Output",
+        "api_quota" : "API Quota",
+        "summary_mode" : "Summary Mode",
+        "summary_every_n" : "Summarize every N rounds",
+        "discussion_stats" : "Discussion Statistics",
+        "use_response_cache" : "Use response cache",
+        "stream_responses" : "Stream responses",
+        "round_mode" : "Round Mode",
+        "panel_concurrency" : "Parallel requests (panel)",
+        "early_stop" : "Stop early when repeating",
+        "agent_search" : "Search agents",
+        "agent_category" : "Category",
+        "all_categories" : "All categories",
+        "page" : "Page",
+        "agent_picker_status" : "Page {page} of {pages} · {matches} matches · {selected} selected",
+        "clear_selection" : "Clear selection",
+        "transcript_status" : "Entries {start}–{end} of {total}",
+        "no_discussions" : "No saved discussions.",
+        "open_discussion" : "Open",
+        "previous_page" : "Previous",
+        "next_page" : "Next",
+        "resume_discussion" : "Resume",
+        "resume_unavailable" : "The discussion is already running and cannot be resumed.",
+        "search_discussions" : "Search discussions",
+        "no_search_results" : "No matches.",
+        "leaderboard" : "Agent leaderboard",
+        "personality_filter" : "Personality",
+        "all_personalities" : "All personalities",
+        "no_ratings" : "No agent has at least {min_votes} votes yet.",
+        "leaderboard_caption" : "Ranked by the Wilson lower bound of the upvote share (at least {min_votes} votes)."
     },
     "es": {
         "title": "Conversación de Agentes CipherCore",
@@ -185,7 +188,36 @@ translations = {
         "saved_discussions" : "Discusiones Guardadas",
         "load_discussions" : "Cargar Discusiones",
         "agent_conversation" : "Conversación de Agentes",
-        "formatted_output" : "Salida Formateada"
+        "formatted_output" : "Salida Formateada",
+        "api_quota" : "Cuota de API",
+        "summary_mode" : "Modo de resumen",
+        "summary_every_n" : "Resumir cada N rondas",
+        "discussion_stats" : "Estadísticas de la discusión",
+        "use_response_cache" : "Usar caché de respuestas",
+        "stream_responses" : "Transmitir respuestas",
+        "round_mode" : "Modo de ronda",
+        "panel_concurrency" : "Solicitudes paralelas (panel)",
+        "early_stop" : "Terminar antes si se repite",
+        "agent_search" : "Buscar agentes",
+        "agent_category" : "Categoría",
+        "all_categories" : "Todas las categorías",
+        "page" : "Página",
+        "agent_picker_status" : "Página {page} de {pages} · {matches} resultados · {selected} seleccionados",
+        "clear_selection" : "Borrar selección",
+        "transcript_status" : "Entradas {start}–{end} de {total}",
+        "no_discussions" : "No hay discusiones guardadas.",
+        "open_discussion" : "Abrir",
+        "previous_page" : "Anterior",
+        "next_page" : "Siguiente",
+        "resume_discussion" : "Reanudar",
+        "resume_unavailable" : "La discusión ya está en curso y no se puede reanudar.",
+        "search_discussions" : "Buscar discusiones",
+        "no_search_results" : "Sin resultados.",
+        "leaderboard" : "Clasificación de agentes",
+        "personality_filter" : "Personalidad",
+        "all_personalities" : "Todas las personalidades",
+        "no_ratings" : "Todavía ningún agente tiene al menos {min_votes} votos.",
+        "leaderboard_caption" : "Ordenado por el límite inferior de Wilson de la proporción de votos positivos (al menos {min_votes} votos)."
     },
     "ru": {
         "title": "Беседа Агентов CipherCore",
@@ -224,7 +256,36 @@ translations = {
         "saved_discussions" : "Сохраненные Обсуждения",
         "load_discussions" : "Загрузить Обсуждения",
         "agent_conversation" : "Беседа Агентов",
-        "formatted_output" : "Форматированный Вывод"
+        "formatted_output" : "Форматированный Вывод",
+        "api_quota" : "Квота API",
+        "summary_mode" : "Режим резюме",
+        "summary_every_n" : "Резюмировать каждые N раундов",
+        "discussion_stats" : "Статистика обсуждения",
+        "use_response_cache" : "Использовать кэш ответов",
+        "stream_responses" : "Потоковая передача ответов",
+        "round_mode" : "Режим раундов",
+        "panel_concurrency" : "Параллельные запросы (панель)",
+        "early_stop" : "Завершать досрочно при повторах",
+        "agent_search" : "Поиск агентов",
+        "agent_category" : "Категория",
+        "all_categories" : "Все категории",
+        "page" : "Страница",
+        "agent_picker_status" : "Страница {page} из {pages} · {matches} найдено · {selected} выбрано",
+        "clear_selection" : "Очистить выбор",
+        "transcript_status" : "Записи {start}–{end} из {total}",
+        "no_discussions" : "Нет сохраненных обсуждений.",
+        "open_discussion" : "Открыть",
+        "previous_page" : "Назад",
+        "next_page" : "Далее",
+        "resume_discussion" : "Продолжить",
+        "resume_unavailable" : "Обсуждение уже идёт и не может быть продолжено.",
+        "search_discussions" : "Поиск по обсуждениям",
+        "no_search_results" : "Ничего не найдено.",
+        "leaderboard" : "Рейтинг агентов",
+        "personality_filter" : "Личность",
+        "all_personalities" : "Все личности",
+        "no_ratings" : "Пока нет агентов как минимум с {min_votes} голосами.",
+        "leaderboard_caption" : "Сортировка по нижней границе Уилсона доли положительных голосов (не менее {min_votes} голосов)."
     },
     "zh": {
         "title": "CipherCore 代理对话",
@@ -263,7 +324,36 @@ translations = {
         "saved_discussions" : "已保存的讨论",
         "load_discussions" : "加载讨论",
         "agent_conversation" : "代理对话",
-        "formatted_output" : "格式化输出"
+        "formatted_output" : "格式化输出",
+        "api_quota" : "API 配额",
+        "summary_mode" : "摘要模式",
+        "summary_every_n" : "每N轮生成摘要",
+        "discussion_stats" : "讨论统计",
+        "use_response_cache" : "使用响应缓存",
+        "stream_responses" : "流式输出回答",
+        "round_mode" : "轮次模式",
+        "panel_concurrency" : "并行请求（小组）",
+        "early_stop" : "重复时提前结束",
+        "agent_search" : "搜索代理",
+        "agent_category" : "类别",
+        "all_categories" : "所有类别",
+        "page" : "页",
+        "agent_picker_status" : "第 {page} / {pages} 页 · {matches} 个匹配 · 已选 {selected} 个",
+        "clear_selection" : "清除选择",
+        "transcript_status" : "第 {start}–{end} 条，共 {total} 条",
+        "no_discussions" : "没有已保存的讨论。",
+        "open_discussion" : "打开",
+        "previous_page" : "上一页",
+        "next_page" : "下一页",
+        "resume_discussion" : "继续",
+        "resume_unavailable" : "讨论仍在进行中，无法继续。",
+        "search_discussions" : "搜索讨论",
+        "no_search_results" : "没有结果。",
+        "leaderboard" : "智能体排行榜",
+        "personality_filter" : "个性",
+        "all_personalities" : "所有个性",
+        "no_ratings" : "还没有获得至少 {min_votes} 票的智能体。",
+        "leaderboard_caption" : "按好评比例的 Wilson 下限排序（至少 {min_votes} 票）。"
     }
 }
 
@@ -288,641 +378,290 @@ def get_translation(lang: str, key: str) -> str:
             # Erst jetzt, wenn ALLES fehlschlägt, den "Fehlender Schlüssel" Text zurückgeben.
             return f"Fehlender Schlüssel: {key}"
 
-
-
-def load_json_data(filename: str, schema: dict = None) -> Dict[str, Any]:
-    """
-    Lädt JSON-Daten aus einer Datei und validiert sie gegen ein gegebenes Schema.
-
-    Args:
-        filename (str): Der Name der JSON-Datei.
-        schema (dict, optional): Das Schema zur Validierung der JSON-Daten.
-
-    Returns:
-        Dict[str, Any]: Die geladenen JSON-Daten.
-    """
-    try:
-        with open(filename, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            if schema:
-                validate(instance=data, schema=schema)
-            return data
-    except FileNotFoundError:
-        logging.warning(f"Datei '{filename}' nicht gefunden. Starte mit leeren Daten.")
-        return {}
-    except json.JSONDecodeError as e:
-        logging.error(f"Fehler beim Lesen von '{filename}': Ungültiges JSON-Format. Details: {e}")
-        return {}
-    except ValidationError as e:
-        logging.error(f"Datei '{filename}' entspricht nicht dem erwarteten Schema: {e}")
-        return {}
-
-def save_json_data(data: Dict[str, Any], filename: str) -> None:
-    """
-    Speichert JSON-Daten in einer Datei.
-
-    Args:
-        data (Dict[str, Any]): Die zu speichernden Daten.
-        filename (str): Der Name der Datei, in der die Daten gespeichert werden sollen.
-    """
-    try:
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4)
-    except IOError as e:
-        logging.error(f"Fehler beim Schreiben in Datei '{filename}': {e}")
-
-def load_user_data() -> Dict[str, Any]:
-    """
-    Lädt Benutzerdaten aus einer JSON-Datei.
-
-    Returns:
-        Dict[str, Any]: Die geladenen Benutzerdaten.
-    """
-    return load_json_data(USER_DATA_FILE, USER_DATA_SCHEMA)
-
-def save_user_data(user_data: Dict[str, Any]) -> None:
-    """
-    Speichert Benutzerdaten in einer JSON-Datei.
-
-    Args:
-        user_data (Dict[str, Any]): Die zu speichernden Benutzerdaten.
-    """
-    save_json_data(user_data, USER_DATA_FILE)
-
-def load_rating_data() -> Dict[str, Any]:
-    """
-    Lädt Bewertungsdaten aus einer JSON-Datei.
-
-    Returns:
-        Dict[str, Any]: Die geladenen Bewertungsdaten.
-    """
-    return load_json_data(RATING_DATA_FILE)
-
-def save_rating_data(rating_data: Dict[str, Any]) -> None:
-    """
-    Speichert Bewertungsdaten in einer JSON-Datei.
-
-    Args:
-        rating_data (Dict[str, Any]): Die zu speichernden Bewertungsdaten.
-    """
-    save_json_data(rating_data, RATING_DATA_FILE)
-
-def load_agent_config() -> List[Dict[str, str]]:
-    """
-    Lädt die Agentenkonfiguration aus einer JSON-Datei.
-
-    Returns:
-        List[Dict[str, str]]: Die geladene Agentenkonfiguration.
-    """
-    config = load_json_data(AGENT_CONFIG_FILE, AGENT_CONFIG_SCHEMA)
-    if not isinstance(config, list):
-        logging.error(f"Agentenkonfiguration in '{AGENT_CONFIG_FILE}' ist ungültig oder leer.")
-        return []
-    return config
-
-def hash_password(password: str) -> str:
-    """
-    Hasht ein Passwort mit SHA-256.
-
-    Args:
-        password (str): Das zu hashende Passwort.
-
-    Returns:
-        str: Der gehashte Passwort-String.
-    """
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def verify_password(password: str, hashed_password: str) -> bool:
-    """
-    Überprüft, ob ein Passwort mit dem gehashten Passwort übereinstimmt.
-
-    Args:
-        password (str): Das zu überprüfende Passwort.
-        hashed_password (str): Der gehashte Passwort-String.
-
-    Returns:
-        bool: True, wenn das Passwort übereinstimmt, sonst False.
-    """
-    return hash_password(password) == hashed_password
-
-def register_user(username: str, password: str) -> str:
-    """
-    Registriert einen neuen Benutzer.
-
-    Args:
-        username (str): Der Benutzername des neuen Benutzers.
-        password (str): Das Passwort des neuen Benutzers.
-
-    Returns:
-        str: Eine Nachricht, die den Status der Registrierung angibt.
-    """
-    if not re.match(r"^[a-zA-Z0-9_-]+$", username):
-        return "Ungültiger Nutzername. Nur Buchstaben, Zahlen, '-', '_' erlaubt."
-    if len(password) < 8:
-        return "Passwort muss mindestens 8 Zeichen lang sein."
-    user_data = load_user_data()
-    if username in user_data:
-        return "Nutzername bereits vergeben."
-    user_data[username] = {"password": hash_password(password)}
-    save_user_data(user_data)
-    return "Registrierung erfolgreich."
-
-def login_user(username: str, password: str) -> Tuple[str, str]:
+def render_agent_picker(lang: str, registry: AgentRegistry) -> Dict[str, str]:
     """
-    Loggt einen Benutzer ein.
+    Agentenauswahl mit Suche, Kategoriefilter und Seiten. Widgets werden nur für die sichtbare
+    Seite erzeugt; gewählte Agenten und Persönlichkeiten bleiben in st.session_state['agent_selections'].
 
     Args:
-        username (str): Der Benutzername des Benutzers.
-        password (str): Das Passwort des Benutzers.
+        lang (str): Der Sprachcode der Oberfläche.
+        registry (AgentRegistry): Die Agentenkonfiguration.
 
     Returns:
-        Tuple[str, str]: Eine Nachricht, die den Status des Logins angibt, und den Benutzernamen bei Erfolg.
-    """
-    user_data = load_user_data()
-    if username in user_data and verify_password(password, user_data[username]["password"]):
-        return "Login erfolgreich.", username
-    return "Login fehlgeschlagen.", None
-
-def create_discussion_table():
-    """
-    Erstellt die Diskussionstabelle in der SQLite-Datenbank, falls sie nicht existiert.
-    """
-    conn = sqlite3.connect(DISCUSSION_DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS discussions (
-            discussion_id TEXT PRIMARY KEY,
-            topic TEXT,
-            agents TEXT,
-            chat_history TEXT,
-            summary TEXT,
-            user TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        Dict[str, str]: Gewählte Agentennamen -> Persönlichkeit.
+    """
+    personalities = ["kritisch", "visionär", "konservativ", "neutral"] # Keine Übersetzung von festen Werten
+    selections = st.session_state['agent_selections']
+    all_label = get_translation(lang, "all_categories")
+
+    def clear_selection() -> None:
+        # Zustand der Checkboxen mitlöschen, sonst würden sichtbare Agenten wieder übernommen.
+        for name in list(selections):
+            st.session_state.pop(f"agent_pick_{name}", None)
+        selections.clear()
+
+    search_col, category_col = st.columns([2, 1])
+    with search_col:
+        query = st.text_input(get_translation(lang, "agent_search"), key="agent_picker_query")
+    with category_col:
+        category = st.selectbox(get_translation(lang, "agent_category"), [all_label] + registry.categories, key="agent_picker_category")
+    matches = registry.search(query, None if category == all_label else category)
+
+    # Neue Suche oder neuer Filter beginnt auf Seite 1; die Seite nie über das Ende hinaus.
+    pages = max(1, math.ceil(len(matches) / AGENT_PICKER_PAGE_SIZE))
+    if st.session_state.get('agent_picker_filter') != (query, category):
+        st.session_state['agent_picker_filter'] = (query, category)
+        st.session_state['agent_picker_page'] = 1
+    st.session_state['agent_picker_page'] = min(st.session_state.get('agent_picker_page', 1), pages)
+    page_col, info_col, clear_col = st.columns([1, 2, 1])
+    with page_col:
+        page = st.number_input(get_translation(lang, "page"), min_value=1, max_value=pages, step=1, key="agent_picker_page")
+    with info_col:
+        st.caption(get_translation(lang, "agent_picker_status").format(page=page, pages=pages, matches=len(matches), selected=len(selections)))
+    with clear_col:
+        st.button(get_translation(lang, "clear_selection"), on_click=clear_selection, disabled=not selections)
+
+    start = (page - 1) * AGENT_PICKER_PAGE_SIZE
+    for name in matches[start:start + AGENT_PICKER_PAGE_SIZE]:
+        selected = st.checkbox(name, value=name in selections, key=f"agent_pick_{name}")  # KEINE Übersetzung des Agenten-Namens
+        personality = st.radio(
+            f"Persönlichkeit für {name}", # Keine Übersetzung innerhalb des f-strings
+            personalities,
+            index=personalities.index(selections.get(name, personalities[0])),
+            horizontal=True,
+            key=f"personality_{name}"
         )
-    """)
-    conn.commit()
-    conn.close()
-
-create_discussion_table()
-
-def save_discussion_data_db(discussion_id: str, topic: str, agents: List[str], chat_history: List[Dict], summary: str, user: str = None) -> None:
-    """
-    Speichert Diskussionsdaten in der SQLite-Datenbank.
-
-    Args:
-        discussion_id (str): Die ID der Diskussion.
-        topic (str): Das Thema der Diskussion.
-        agents (List[str]): Die Liste der beteiligten Agenten.
-        chat_history (List[Dict]): Der Chatverlauf der Diskussion.
-        summary (str): Die Zusammenfassung der Diskussion.
-        user (str, optional): Der Benutzer, der die Diskussion gestartet hat.
-    """
-    conn = sqlite3.connect(DISCUSSION_DB_FILE)
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
-            INSERT INTO discussions (discussion_id, topic, agents, chat_history, summary, user)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (discussion_id, topic, json.dumps(agents), json.dumps(chat_history), summary, user))
-        conn.commit()
-    except sqlite3.Error as e:
-        logging.error(f"Datenbankfehler beim Speichern der Diskussion '{discussion_id}': {e}")
-        conn.rollback()
-    finally:
-        conn.close()
-
-def load_discussion_data_db(user: str = None) -> Dict[str, Any]:
-    """
-    Lädt Diskussionsdaten aus der SQLite-Datenbank.
-
-    Args:
-        user (str, optional): Der Benutzer, dessen Diskussionen geladen werden sollen.
-
-    Returns:
-        Dict[str, Any]: Die geladenen Diskussionsdaten.
-    """
-    conn = sqlite3.connect(DISCUSSION_DB_FILE)
-    cursor = conn.cursor()
-    discussions = {}
-    try:
-        if user:
-            cursor.execute("SELECT * FROM discussions WHERE user = ?", (user,))
+        if selected:
+            selections[name] = personality
         else:
-            cursor.execute("SELECT * FROM discussions")
-        rows = cursor.fetchall()
-        for row in rows:
-            disc_id, topic, agents_json, chat_history_json, summary, user_name, timestamp = row
-            agents = json.loads(agents_json) if agents_json else []
-            chat_history = json.loads(chat_history_json) if chat_history_json else []
-            discussions[disc_id] = {
-                "topic": topic,
-                "agents": agents,
-                "chat_history": chat_history,
-                "summary": summary,
-                "user": user_name,
-                "timestamp": timestamp
-            }
-    except sqlite3.Error as e:
-        logging.error(f"Datenbankfehler beim Laden der Diskussionen: {e}")
-    finally:
-        conn.close()
-    return discussions
-
-def evaluate_response(response: str) -> str:
-    """
-    Bewertet eine Antwort basierend auf bestimmten Schlüsselwörtern.
-
-    Args:
-        response (str): Die zu bewertende Antwort.
-
-    Returns:
-        str: Die Bewertung der Antwort ("schlechte antwort", "gute antwort", "neutral").
-    """
-    resp_l = response.lower()
-    if "wiederhole mich" in resp_l:
-        return "schlechte antwort"
-    elif "neue perspektive" in resp_l:
-        return "gute antwort"
-    else:
-        return "neutral"
+            selections.pop(name, None)
 
-discussion_ratings = defaultdict(lambda: defaultdict(dict), load_rating_data())
+    if selections:
+        st.caption(", ".join(f"{name} ({personality})" for name, personality in selections.items()))
+    return selections
 
-def rate_agent_response(discussion_id: str, iteration: int, agent_name: str, rating_type: str) -> None:
+def render_paginated(items: List[Any], key: str, lang: str, render_item: Callable[[Any], None]) -> None:
     """
-    Bewertet die Antwort eines Agenten.
+    Zeigt eine Seite von `items` mit TRANSCRIPT_PAGE_SIZE Einträgen; nur diese werden gerendert.
+    Kommen neue Einträge hinzu, springt die Anzeige auf die letzte Seite.
 
     Args:
-        discussion_id (str): Die ID der Diskussion.
-        iteration (int): Die Iteration der Antwort.
-        agent_name (str): Der Name des Agenten.
-        rating_type (str): Der Typ der Bewertung ("upvote" oder "downvote").
-    """
-    global discussion_ratings
-    if agent_name not in discussion_ratings[discussion_id][iteration]:
-        discussion_ratings[discussion_id][iteration][agent_name] = {"upvotes": 0, "downvotes": 0}
-    if rating_type == "upvote":
-        discussion_ratings[discussion_id][iteration][agent_name]["upvotes"] += 1
-    elif rating_type == "downvote":
-        discussion_ratings[discussion_id][iteration][agent_name]["downvotes"] += 1
-    save_rating_data(discussion_ratings)
+        items (List[Any]): Alle Einträge (z.B. Chatverlauf).
+        key (str): Präfix für Widget- und Session-State-Schlüssel.
+        lang (str): Der Sprachcode der Oberfläche.
+        render_item (Callable[[Any], None]): Rendert einen Eintrag.
+    """
+    pages = max(1, math.ceil(len(items) / TRANSCRIPT_PAGE_SIZE))
+    if st.session_state.get(f"{key}_len") != len(items):
+        st.session_state[f"{key}_len"] = len(items)
+        st.session_state[f"{key}_page"] = pages
+    if pages > 1:
+        page_col, info_col = st.columns([1, 3])
+        with page_col:
+            page = st.number_input(get_translation(lang, "page"), min_value=1, max_value=pages, step=1, key=f"{key}_page")
+        start = (page - 1) * TRANSCRIPT_PAGE_SIZE
+        with info_col:
+            st.caption(get_translation(lang, "transcript_status").format(start=start + 1, end=min(start + TRANSCRIPT_PAGE_SIZE, len(items)), total=len(items)))
+    else:
+        start = 0
+    for item in items[start:start + TRANSCRIPT_PAGE_SIZE]:
+        render_item(item)
 
-def generate_pdf_summary_from_bytes(file_bytes: bytes, api_key: str) -> str:
-    """
-    Generiert eine Zusammenfassung aus PDF-Bytes.
+def render_chat_message(message: Dict[str, str]) -> None:
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"]) # Keine Übersetzung, da dynamischer Inhalt
 
-    Args:
-        file_bytes (bytes): Die Bytes der PDF-Datei.
-        api_key (str): Der API-Schlüssel für den Gemini-Dienst.
+# Die folgenden Bereiche sind Fragmente: Blättern, Bewerten und Speichern führen nur das
+# jeweilige Fragment erneut aus, nicht main() mit dem gesamten Verlauf.
+@st.fragment
+def render_transcript(lang: str) -> None:
+    render_paginated(st.session_state['chat_history'], "transcript", lang, render_chat_message)
 
-    Returns:
-        str: Die generierte Zusammenfassung.
-    """
-    try:
-        mime_type = "application/pdf"
-        prompt = "Fasse den Inhalt der PDF zusammen. Achte darauf, dass wichtige Daten nicht verloren gehen!"
-        contents = [prompt, genai.types.Part.from_bytes(data=file_bytes, mime_type=mime_type)]
-        response = call_gemini_api(contents, api_key, model=MODEL_NAME_TEXT)  # Textmodell für PDF
-        return response.get("response", "Start der Konversation.")
-    except Exception as e:
-        logging.error("Fehler beim Generieren der PDF-Zusammenfassung:", exc_info=e)
-        return "Fehler beim Verarbeiten der PDF."
+@st.fragment
+def render_formatted_output(lang: str) -> None:
+    render_paginated(st.session_state['formatted_output_chunks'], "formatted_output", lang, st.markdown)
 
-def generate_image_summary_from_bytes(file_bytes: bytes, mime_type: str, api_key: str) -> str:
+@st.fragment
+def render_rating_controls(lang: str) -> None:
     """
-    Generiert eine Beschreibung/Analyse aus Bild-Bytes.
+    Upvote/Downvote für den zuletzt gemeldeten Beitrag (st.session_state['rating_info']).
 
     Args:
-        file_bytes (bytes): Die Bytes der Bilddatei.
-        mime_type (str): Der MIME-Typ der Bilddatei.
-        api_key (str): Der API-Schlüssel für den Gemini-Dienst.
-
-    Returns:
-        str: Die generierte Beschreibung/Analyse.
+        lang (str): Der Sprachcode der Oberfläche.
     """
-    try:
-        prompt = "Beschreibe den Inhalt des Bildes detailliert. Was sind die Hauptelemente, die Stimmung, und mögliche Interpretationen?"
-        contents = [prompt, genai.types.Part.from_bytes(data=file_bytes, mime_type=mime_type)]
-        response = call_gemini_api(contents, api_key, model=MODEL_NAME_VISION)  # Vision-Modell für Bilder
-        return response.get("response", "Start der Konversation.")
-    except Exception as e:
-        logging.error("Fehler beim Generieren der Bildbeschreibung:", exc_info=e)
-        return "Fehler beim Verarbeiten des Bildes."
+    if st.session_state['rating_info'].get("iteration") is None:
+        return
+    rating_col1, rating_col2, rating_col3 = st.columns([1, 1, 3])
+    with rating_col1:
+        upvote_btn = st.button(get_translation(lang, "upvote"))
+    with rating_col2:
+        downvote_btn = st.button(get_translation(lang, "downvote"))
+    with rating_col3:
+        rating_label = st.empty()
+
+    for clicked, vote in ((upvote_btn, "upvote"), (downvote_btn, "downvote")):
+        if not clicked:
+            continue
+        did = st.session_state['rating_info'].get("discussion_id")
+        itn = st.session_state['rating_info'].get("iteration")
+        agn = st.session_state['rating_info'].get("agent_name")
+        if did and itn and agn and rate_agent_response(did, itn, agn, vote, st.session_state['rating_info'].get("personality")):
+            rating_label.success(get_translation(lang, "rating_success"))
+        else:
+            rating_label.error(get_translation(lang, "rating_error"))
 
-def call_gemini_api(contents: list, api_key: str, model: str) -> Dict[str, str]:
+@st.fragment
+def render_save_controls(lang: str, topic: str, agent_names: List[str]) -> None:
     """
-    Ruft die Gemini API auf, mit Modell-Auswahl.
+    Speichern in der Datenbank und Word-Export des aktuellen Verlaufs.
 
     Args:
-        contents (list): Die Inhalte, die an die API gesendet werden sollen.
-        api_key (str): Der API-Schlüssel für den Gemini-Dienst.
-        model (str): Das Modell, das verwendet werden soll.
-
-    Returns:
-        Dict[str, str]: Die Antwort von der API.
+        lang (str): Der Sprachcode der Oberfläche.
+        topic (str): Das Thema der Diskussion.
+        agent_names (List[str]): Die ausgewählten Agenten.
     """
-    client = genai.Client(api_key=api_key)
-    retries = 0
-    wait_time = 1
-    max_wait_time = 60
-    while retries < API_MAX_RETRIES:
-        try:
-            logging.info(f"Sende Anfrage an Gemini ({model}): {str(contents)[:100]}... (Versuch {retries + 1})")
-            response = client.models.generate_content(model=model, contents=contents)  # Modell wird übergeben
-            if not hasattr(response, "text") or not response.text:
-                msg = "Leere Antwort von Gemini API."
-                logging.warning(msg)
-                return {"response": msg}
-            return {"response": response.text}
-        except Exception as e:
-            err_s = str(e)
-            logging.error(f"Gemini API Fehler: {err_s}")
-            if "429" in err_s:
-                retries += 1
-                if retries >= API_MAX_RETRIES:
-                    return {"response": f"Fehler: Maximale Anzahl an Versuchen erreicht. API-Kontingent wahrscheinlich erschöpft."}
-                wait_time = min(wait_time * 2, max_wait_time)
-                jitter = random.uniform(0.5, 1.5)
-                actual_wait_time = wait_time * jitter
-                logging.warning(f"API-Kontingent erschöpft. Warte {actual_wait_time:.2f} Sekunden...")
-                time.sleep(actual_wait_time)
+    save_col1, save_col2 = st.columns(2)
+    with save_col1:
+        save_btn = st.button(get_translation(lang, "save_discussion"))
+        save_status = st.empty()
+        if save_btn:
+            if st.session_state['user_state']:
+                save_discussion_data_db(st.session_state['discussion_id'], topic, agent_names, st.session_state['chat_history'], "Manuell gespeichert", st.session_state['user_state'])
+                save_status.success(get_translation(lang, "save_success"))
             else:
-                return {"response": f"Fehler bei Gemini API Aufruf: {err_s}"}
-    return {"response": f"Fehler: Maximale Anzahl an Versuchen erreicht ({API_MAX_RETRIES})."}
-
-def generate_summary(text: str, api_key: str) -> str:
-    """
-    Generiert eine Textzusammenfassung.
-
-    Args:
-        text (str): Der zu zusammenfassende Text.
-        api_key (str): Der API-Schlüssel für den Gemini-Dienst.
-
-    Returns:
-        str: Die generierte Zusammenfassung.
-    """
-    prompt = f"Fasse den folgenden Text prägnant zusammen:\n\n{text}"
-    result = call_gemini_api([prompt], api_key, model=MODEL_NAME_TEXT)  # Textmodell
-    if SUMMARY_SLEEP_SECONDS > 0:
-        time.sleep(SUMMARY_SLEEP_SECONDS)
-    return result.get("response", "Fehler: Keine Zusammenfassung generiert.")
+                save_status.warning(get_translation(lang, "login_warning"))
+    with save_col2:
+        word_save_btn = st.button(get_translation(lang, "save_as_word"))
+        if word_save_btn:
+            if st.session_state['discussion_id']:
+                word_filename = save_chat_as_word(st.session_state['chat_history'], st.session_state['discussion_id'])
+                if word_filename:
+                    with open(word_filename, "rb") as file:
+                        st.download_button(
+                            label=get_translation(lang, "download_word"), # Übersetztes Label
+                            data=file,
+                            file_name=word_filename,
+                            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+                        )
+                else:
+                    st.error(get_translation(lang, "word_error"))
+            else:
+                st.warning(get_translation(lang, "missing_discussion_id"))
 
-def process_uploaded_file(uploaded_file, api_key: str) -> str:
+@st.fragment
+def render_saved_discussions(lang: str) -> None:
     """
-    Verarbeitet die hochgeladene Datei und gibt eine Zusammenfassung/Beschreibung zurück.
+    Seitenweise Liste der gespeicherten Diskussionen des Benutzers (nur Metadaten) bzw. Treffer der
+    Volltextsuche; der Chatverlauf einer Diskussion wird erst beim Öffnen geladen.
 
     Args:
-        uploaded_file: Die hochgeladene Datei.
-        api_key (str): Der API-Schlüssel für den Gemini-Dienst.
-
-    Returns:
-        str: Die generierte Zusammenfassung/Beschreibung.
-    """
-    if uploaded_file is None:
-        return "Start der Konversation."
-
-    try:
-        file_bytes = uploaded_file.read()
-        uploaded_file.seek(0)  # Wichtig: Zurücksetzen des Dateizeigers
-        mime_type = uploaded_file.type  # MIME-Type direkt aus Streamlit-Objekt
-
-        if mime_type == "application/pdf":
-            return generate_pdf_summary_from_bytes(file_bytes, api_key)
-        elif mime_type.startswith("image"):
-            return generate_image_summary_from_bytes(file_bytes, mime_type, api_key)
-        else:
-            logging.warning(f"Nicht unterstützter Dateityp: {mime_type}")
-            return f"Nicht unterstützter Dateityp: {mime_type}"
+        lang (str): Der Sprachcode der Oberfläche.
+    """
+    user = st.session_state['user_state']
+
+    def open_discussion(discussion_id: str) -> None:
+        st.session_state['opened_discussion'] = discussion_id
+
+    search_text = st.text_input(get_translation(lang, "search_discussions"), key="discussion_search_query")
+    if search_text.strip():
+        if not user:
+            st.warning(get_translation(lang, "login_warning"))
+            return
+        hits = search_discussions_db(search_text, user)
+        if not hits:
+            st.info(get_translation(lang, "no_search_results"))
+        for hit in hits:
+            info_col, open_col = st.columns([5, 1])
+            with info_col:
+                st.markdown(f"**{hit['topic']}** · {hit['timestamp']}") # Keine Übersetzung, da dynamischer Inhalt
+                st.markdown(hit["snippet"])
+            with open_col:
+                st.button(get_translation(lang, "open_discussion"), key=f"search_open_{hit['discussion_id']}",
+                          on_click=open_discussion, args=(hit["discussion_id"],))
+        render_opened_discussion(user)
+        return
 
-    except Exception as e:
-        logging.error(f"Fehler beim Verarbeiten der Datei: {e}", exc_info=e)
-        return "Fehler beim Verarbeiten der Datei."
+    if st.button(get_translation(lang, "load_discussions")):
+        if not user:
+            st.warning(get_translation(lang, "login_warning"))
+            return
+        # Cursor-Stapel: Eintrag i ist der Cursor, mit dem Seite i geladen wird.
+        st.session_state['discussion_cursors'] = [None]
+        st.session_state['opened_discussion'] = None
+    cursors = st.session_state.get('discussion_cursors')
+    if not user or not cursors:
+        return
 
-def joint_conversation_with_selected_agents(
-    conversation_topic: str,
-    selected_agents: List[Dict[str, str]],
-    iterations: int,
-    expertise_level: str,
-    language: str,
-    chat_history: List[Dict[str, str]],
-    user_state: str,
-    discussion_id: str = None,
-    api_key: str = None,
-    uploaded_file=None
-):
-    """
-    Führt eine Konversation mit ausgewählten Agenten durch.
+    entries, next_cursor = list_discussions_db(user, before=cursors[-1])
+    if not entries:
+        st.info(get_translation(lang, "no_discussions"))
+    for entry in entries:
+        info_col, open_col = st.columns([5, 1])
+        with info_col:
+            status = f" · {entry['status']}" if entry["status"] != "completed" else ""
+            st.markdown(f"**{entry['topic']}** · {entry['timestamp']} · {', '.join(entry['agents'])}{status}") # Keine Übersetzung, da dynamischer Inhalt
+            if entry["summary_preview"]:
+                st.caption(entry["summary_preview"])
+        with open_col:
+            st.button(get_translation(lang, "open_discussion"), key=f"open_discussion_{entry['discussion_id']}",
+                      on_click=open_discussion, args=(entry["discussion_id"],))
+            if entry["resumable"]:
+                if st.button(get_translation(lang, "resume_discussion"), key=f"resume_discussion_{entry['discussion_id']}"):
+                    if claim_discussion_resume_db(entry["discussion_id"], user):
+                        # Die Konversation läuft im Hauptskript weiter, daher ein vollständiger Durchlauf.
+                        st.session_state['resume_discussion_id'] = entry["discussion_id"]
+                        st.rerun()
+                    else:
+                        st.warning(get_translation(lang, "resume_unavailable"))
+
+    # Callbacks laufen vor dem nächsten Durchlauf, die Liste zeigt also sofort die neue Seite.
+    prev_col, next_col = st.columns(2)
+    with prev_col:
+        st.button(get_translation(lang, "previous_page"), key="discussions_previous", disabled=len(cursors) == 1, on_click=cursors.pop)
+    with next_col:
+        st.button(get_translation(lang, "next_page"), key="discussions_next", disabled=next_cursor is None, on_click=cursors.append, args=(next_cursor,))
+    render_opened_discussion(user)
+
+@st.fragment
+def render_leaderboard(lang: str) -> None:
+    """
+    Bestenliste der Agenten (agent_leaderboard_db), wahlweise für eine Persönlichkeit.
 
     Args:
-        conversation_topic (str): Das Thema der Konversation.
-        selected_agents (List[Dict[str, str]]): Die Liste der ausgewählten Agenten.
-        iterations (int): Die Anzahl der Gesprächsrunden.
-        expertise_level (str): Das Experten-Level der Agenten.
-        language (str): Die Sprache der Konversation.
-        chat_history (List[Dict[str, str]]): Der Chatverlauf.
-        user_state (str): Der Zustand des Benutzers.
-        discussion_id (str, optional): Die ID der Diskussion.  Wird automatisch generiert, wenn nicht angegeben.
-        api_key (str, optional): Der API-Schlüssel für den Gemini-Dienst.
-        uploaded_file: Die hochgeladene Datei (optional).
-
-    Yields:
-        Tuple: Aktualisierter Chatverlauf, formatierter Textabschnitt, Diskussions-ID, Iterationsnummer, Agentenname.
+        lang (str): Der Sprachcode der Oberfläche.
     """
-    if discussion_id is None:
-        discussion_id = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-
-    # ---  Verwende IMMER eine feste Datei.  Guter Name, um Konflikte zu vermeiden. ---
-    chat_history_filename = "chat_history.txt"
-
-    # --- Option zum Auskommentieren (für lokale Entwicklung nützlich) ---
-    # Setze USE_CHAT_HISTORY_FILE auf False, um das Schreiben zu deaktivieren.
-    USE_CHAT_HISTORY_FILE = False   #  Oder True
-
-    active_agents_names = [sa["name"] for sa in selected_agents]
-    num_agents = len(active_agents_names)
-    agent_outputs = [""] * num_agents
-    topic_changed = False
-    logging.info(f"Konversation gestartet: {active_agents_names}, iters={iterations}, level={expertise_level}, lang={language}, Diskussions-ID: {discussion_id}, Datei: {uploaded_file is not None}")
-
-    initial_summary = process_uploaded_file(uploaded_file, api_key)
-    current_summary = initial_summary
-
-    for i in range(iterations):
-        agent_idx = i % num_agents
-        current_agent_name = active_agents_names[agent_idx]
-        current_agent_config = next((a for a in selected_agents if a["name"] == current_agent_name), None)
-        current_personality = current_agent_config.get("personality", "neutral")
-        current_instruction = current_agent_config.get("instruction", "")
-
-        prompt_text = (
-            f"Wir führen eine Konversation über: '{conversation_topic}'.\n"
-            + (f"Zusätzliche Informationen sind in der angehängten Datei verfügbar.\n" if uploaded_file is not None else "")
-            + f"Hier ist die Zusammenfassung der bisherigen Diskussion:\n{current_summary}\n\n"
-            + f"Iteration {i+1}: Agent {current_agent_name}, bitte antworte. {current_instruction}\n"
-        )
-        if i > 0:
-            prompt_text += f"Der vorherige Agent sagte: {agent_outputs[(agent_idx - 1) % num_agents]}\n"
-        if current_personality == "kritisch":
-            prompt_text += "\nSei kritisch."
-        elif current_personality == "visionär":
-            prompt_text += "\nSei visionär."
-        elif current_personality == "konservativ":
-            prompt_text += "\nSei konservativ."
-        prompt_text += f"\n\nAntworte auf {language}."
-
-        # Inhalte vorbereiten: Datei-Part anhängen, falls vorhanden.
-        contents = [prompt_text]
-        if uploaded_file is not None:
-            try:
-                file_bytes = uploaded_file.read()  # Bytes erneut lesen, falls benötigt
-                uploaded_file.seek(0)
-                mime_type = uploaded_file.type
-                contents = [prompt_text, genai.types.Part.from_bytes(data=file_bytes, mime_type=mime_type)]
-            except Exception as e:
-                logging.error(f"Fehler beim Lesen der Datei für Iteration {i+1}: {e}", exc_info=e)
-                yield chat_history, f"Fehler beim Lesen der Datei in Iteration {i+1}.", discussion_id, (i + 1), current_agent_name  # Fehler melden
-                continue  # Nächste Iteration
-
-        api_resp = call_gemini_api(contents, api_key, model=MODEL_NAME_TEXT)  # Immer Textmodell in der Konversation
-        agent_output = api_resp.get("response", f"Keine Antwort von {current_agent_name}")
-        agent_outputs[agent_idx] = agent_output
-
-        chat_history.append({
-            "role": "user",
-            "content": f"Agent {current_agent_name} (Iteration {i + 1}): Thema {conversation_topic}, Zusammenfassung bis Runde {i}: {current_summary}, Datei: {'vorhanden' if uploaded_file is not None else 'nicht vorhanden'}"
-        })
-        chat_history.append({
-            "role": "assistant",
-            "content": f"Antwort von Agent {current_agent_name} (Iteration {i+1}):\n{agent_output}"
-        })
-
-        # ---  Nur schreiben, wenn USE_CHAT_HISTORY_FILE True ist  ---
-        if USE_CHAT_HISTORY_FILE:
-            try:
-                with open(chat_history_filename, "w", encoding="utf-8") as f:
-                    for message in chat_history:
-                        f.write(f"{message['role']}: {message['content']}\n")
-            except IOError as e:
-                logging.error(f"Fehler beim Schreiben in Chatverlauf-Datei '{chat_history_filename}': {e}")
-
-
-        new_summary_input = f"Bisherige Zusammenfassung:\n{current_summary}\n\nNeue Antwort von {current_agent_name}:\n{agent_output}"
-        current_summary = generate_summary(new_summary_input, api_key)
-        time.sleep(API_SLEEP_SECONDS)
-
-        qual = evaluate_response(agent_output)
-        if qual == "schlechte antwort":
-            logging.info(f"{current_agent_name} => 'schlechte antwort', retry ...")
-            # Retry-Logik mit korrekter Behandlung der Datei
-            retry_contents = ["Versuche eine kreativere Antwort."]
-            if uploaded_file is not None:
-                try:
-                    file_bytes = uploaded_file.read()  # Bytes für Retry erneut lesen
-                    uploaded_file.seek(0)
-                    mime_type = uploaded_file.type
-                    retry_contents = [genai.types.Part.from_bytes(data=file_bytes, mime_type=mime_type), "Versuche eine kreativere Antwort."]
-                except Exception as e:
-                    logging.error(f"Fehler beim Lesen der Datei für Retry: {e}", exc_info=e)
-                    yield chat_history, "Fehler beim Lesen der Datei während des Retrys.", discussion_id, (i + 1), current_agent_name
-                    continue
-            retry_resp = call_gemini_api(retry_contents, api_key, model=MODEL_NAME_TEXT)  # Textmodell
-            retry_output = retry_resp.get("response", f"Keine Retry-Antwort von {current_agent_name}")
-            if "Fehler bei Gemini API Aufruf" not in retry_output:
-                agent_output = retry_output
-            agent_outputs[agent_idx] = agent_output
-
-        # WICHTIG: rating_info VOR dem Yield aktualisieren
-        st.session_state['rating_info']["discussion_id"] = discussion_id
-        st.session_state['rating_info']["iteration"] = i + 1  # Korrekte Iterationsnummer
-        st.session_state['rating_info']["agent_name"] = current_agent_name
-
-        logging.info(f"Antwort Agent {current_agent_name} (i={i+1}): {agent_output[:50]}...")
-        formatted_output_chunk = (
-            f"**Iteration {i+1}: Agent {current_agent_name} ({current_personality})**\n\n"
-            f"{agent_output}\n\n"
-            "---\n\n"
-        )
-        yield chat_history, formatted_output_chunk, discussion_id, (i + 1), current_agent_name
-
-        if i > iterations * 0.6 and agent_output == agent_outputs[(agent_idx - 1) % num_agents] and not topic_changed:
-            new_topic = "Neues Thema: KI-Trends 2026"
-            contents = [new_topic]
-            # Neue Themenlogik mit korrekter Behandlung der Datei
-            if uploaded_file is not None:
-                try:
-                    file_bytes = uploaded_file.read()  # Bytes erneut lesen
-                    uploaded_file.seek(0)
-                    mime_type = uploaded_file.type
-                    contents = [new_topic, genai.types.Part.from_bytes(data=file_bytes, mime_type=mime_type)]
-                except Exception as e:
-                    logging.error(f"Fehler beim Lesen der Datei für neues Thema: {e}", exc_info=e)
-                    yield chat_history, "Fehler beim Lesen der Datei beim Themenwechsel.", discussion_id, (i + 1), current_agent_name
-                    continue
-
-            agent_outputs = [new_topic] * num_agents
-            topic_changed = True
-
-    final_summary_input = "Gesamter Chatverlauf:\n" + "\n".join(
-        [f"{m['role']}: {m['content']}" for m in chat_history]
+    personalities = [None, *PERSONALITY_PROMPT_SUFFIXES, "neutral"]
+    personality = st.selectbox(
+        get_translation(lang, "personality_filter"), personalities, key="leaderboard_personality",
+        format_func=lambda option: get_translation(lang, "all_personalities") if option is None else option
     )
-    final_summary = generate_summary(final_summary_input, api_key)
-    chat_history.append({
-        "role": "assistant",
-        "content": f"**Gesamtzusammenfassung**:\n{final_summary}"
-    })
-
-    if user_state:
-        save_discussion_data_db(discussion_id, conversation_topic, active_agents_names, chat_history, final_summary, user_state)
-        logging.info(f"Diskussion {discussion_id} für {user_state} in Datenbank gespeichert.")
-    else:
-        logging.info("Keine Speicherung in Datenbank, kein Benutzer eingeloggt.")
-
-    final_text = agent_outputs[-1]
-    chat_history.append({
-        "role": "assistant",
-        "content": f"Finale Aussage:\n{final_text}"
-    })
-    logging.info(f"Finale Aussage: {final_text}")
-    yield chat_history, final_summary, discussion_id, None, None
+    entries = agent_leaderboard_db(personality)
+    if not entries:
+        st.info(get_translation(lang, "no_ratings").format(min_votes=LEADERBOARD_MIN_VOTES))
+        return
+    st.dataframe(entries, hide_index=True) # Keine Übersetzung, da es sich um Daten handelt.
+    st.caption(get_translation(lang, "leaderboard_caption").format(min_votes=LEADERBOARD_MIN_VOTES))
 
-def save_chat_as_word(chat_history: List[Dict], discussion_id: str) -> str:
+def render_opened_discussion(user: str) -> None:
     """
-    Speichert den Chatverlauf als Word-Dokument.
+    Zeigt die in der Liste oder den Suchtreffern geöffnete Diskussion vollständig an.
 
     Args:
-        chat_history (List[Dict]): Der Chatverlauf.
-        discussion_id (str): Die ID der Diskussion.
-
-    Returns:
-        str: Der Dateiname des gespeicherten Word-Dokuments.
+        user (str): Der angemeldete Benutzer.
     """
-    document = Document()
-    document.add_heading(f'CipherCore Agenten-Diskussion: {discussion_id}', level=1)
-    for message in chat_history:
-        role = message['role']
-        content = message['content']
-        if role == 'user':
-            document.add_paragraph("Nutzer:", style='List Bullet').add_run(f" {content}").bold = True
-        elif role == 'assistant':
-            agent_name_match = re.search(r'Agent (.*?)\s', content)
-            agent_name = agent_name_match.group(1) if agent_name_match else "Agent"
-            p = document.add_paragraph(f"{agent_name}:", style='List Bullet')
-            p.add_run(f" {content.split(':\n', 1)[1] if ':\n' in content else content}")
-    filename = f"CipherCore_Diskussion_{discussion_id}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.docx"
-    try:
-        document.save(filename)
-        logging.info(f"Word-Datei '{filename}' erfolgreich gespeichert.")
-        return filename
-    except Exception as e:
-        logging.error(f"Fehler beim Speichern der Word-Datei: {e}")
-        return None
-
-
+    opened = st.session_state.get('opened_discussion')
+    if opened:
+        discussion = load_discussion_db(opened, user)
+        if discussion is not None:
+            st.json(discussion, expanded=False) # Keine Übersetzung, da es sich um Daten handelt.
 
 def main():
     """
     Hauptfunktion der Streamlit-Anwendung.
     """
+    start_metrics_exporters()
+    create_discussion_table()
+
     # --- SPRACHAUSWAHL ---
     # 1. Sprache im Session State speichern (mit 'en' als Standard)
     if 'language' not in st.session_state:
@@ -957,12 +696,16 @@ def main():
         st.session_state['discussion_id'] = None
     if 'rating_info' not in st.session_state:
         st.session_state['rating_info'] = {}
-    if 'formatted_output_text' not in st.session_state:
-        st.session_state['formatted_output_text'] = ""
+    if 'formatted_output_chunks' not in st.session_state:
+        st.session_state['formatted_output_chunks'] = []  # Ein Abschnitt pro Beitrag statt eines wachsenden Strings
     if 'api_key' not in st.session_state:
         st.session_state['api_key'] = None  # Wichtig: Auch api_key initialisieren!
     if 'uploaded_file' not in st.session_state:
         st.session_state['uploaded_file'] = None
+    if 'discussion_stats' not in st.session_state:
+        st.session_state['discussion_stats'] = {}
+    if 'agent_selections' not in st.session_state:
+        st.session_state['agent_selections'] = {}  # Agentenname -> Persönlichkeit, auch für nicht sichtbare Seiten
 
 
     # --- JETZT erst die Texte holen, nachdem die Sprache korrekt gesetzt wurde ---
@@ -973,11 +716,21 @@ def main():
 
     st.sidebar.header(get_translation(lang, "api_key_header"))  # <--- Hier war das Problem
     api_key = st.sidebar.text_input("Geben Sie Ihren Gemini API-Schlüssel ein:", type="password")
-    if not api_key:
+    key_pool = get_api_key_pool()
+    if not api_key and not key_pool.entries:
         st.warning(get_translation(lang, "api_key_warning"))
         return
     else:
-        st.session_state['api_key'] = api_key  # api_key in den Session State, falls eingegeben
+        st.session_state['api_key'] = api_key or None  # Ohne eigenen Schlüssel wird nur der Schlüssel-Pool verwendet
+
+    with st.sidebar.expander(get_translation(lang, "api_quota"), expanded=False):
+        # Mit Schlüssel-Pool alle Schlüssel zeigen, sonst nur den eigenen.
+        for bucket_state in get_rate_limiter().snapshot(None if key_pool.entries else api_key):
+            st.caption(f"{key_pool.name_for_fingerprint(bucket_state['api_key']) if key_pool.entries else ''} {bucket_state['model']}".strip())
+            st.progress(bucket_state["rpm_fill"], text=f"RPM: {bucket_state['rpm_available']:.1f} / {bucket_state['rpm_capacity']:.0f}")
+            st.progress(bucket_state["tpm_fill"], text=f"TPM: {bucket_state['tpm_available']:.0f} / {bucket_state['tpm_capacity']:.0f}")
+        if key_pool.entries:
+            st.dataframe(key_pool.snapshot(), hide_index=True)
 
     # ... (Der Rest der main-Funktion bleibt gleich, aber stelle sicher, dass du ÜBERALL get_translation verwendest) ...
     with st.expander(get_translation(lang, "login_register"), expanded=False):  # Übersetzter Expander-Text
@@ -1008,24 +761,23 @@ def main():
                 register_status.info(msg)  # KEINE Übersetzung der Registrierungs-Meldung
 
     st.markdown("---")
-    agent_config_data = load_agent_config()
-    agent_selections = {}
+    agent_registry = get_agent_registry()
     st.subheader(get_translation(lang, "agent_selection"))
     with st.expander(get_translation(lang, "agent_selection"), expanded=False):
-        for agent_data in agent_config_data:
-            agent_selections[agent_data["name"]] = {
-                "selected": st.checkbox(agent_data["name"]),  # KEINE Übersetzung des Agenten-Namens
-                "personality": st.radio(
-                    f"Persönlichkeit für {agent_data['name']}", # Keine Übersetzung innerhalb des f-strings
-                    ["kritisch", "visionär", "konservativ", "neutral"], # Keine Übersetzung von festen Werten
-                    horizontal=True,
-                    key=f"personality_{agent_data['name']}"
-                )
-            }
+        agent_selections = render_agent_picker(lang, agent_registry)
+    # Reihenfolge der Konfiguration, unabhängig von der Reihenfolge der Auswahl.
+    selected_agent_names = [name for name in agent_registry.names if name in agent_selections]
 
     topic_input = st.text_input(get_translation(lang, "topic"))
     iteration_slider = st.slider(get_translation(lang, "iterations"), 1, 50, value=10, step=1)
     level_radio = st.radio(get_translation(lang, "expertise_level"), ["Beginner", "Fortgeschritten", "Experte"], horizontal=True) # Keine Übersetzung der Level
+    summary_mode_radio = st.radio(get_translation(lang, "summary_mode"), SUMMARY_MODES, index=SUMMARY_MODES.index(CONVERSATION_SUMMARY_MODE), horizontal=True) # Keine Übersetzung der Modi
+    summary_every_n = st.number_input(get_translation(lang, "summary_every_n"), min_value=1, max_value=50, value=SUMMARY_EVERY_N_TURNS, step=1)
+    use_response_cache = st.checkbox(get_translation(lang, "use_response_cache"), value=False)
+    stream_responses = st.checkbox(get_translation(lang, "stream_responses"), value=True)
+    round_mode_radio = st.radio(get_translation(lang, "round_mode"), ROUND_MODES, horizontal=True) # Keine Übersetzung der Modi
+    panel_concurrency = st.slider(get_translation(lang, "panel_concurrency"), 1, 16, value=PANEL_MAX_CONCURRENCY, step=1)
+    early_stop = st.checkbox(get_translation(lang, "early_stop"), value=False)
     # --- SPRACHAUSWAHL OBEN, nicht hier ---
     # lang_radio = st.radio("Sprache", ["Deutsch", "Englisch", "Französisch", "Spanisch", "Russisch", "Chinesisch"], horizontal=True)
 
@@ -1045,121 +797,114 @@ def main():
             st.write("Datei hochgeladen") # ODER übersetzen.
 
     with st.expander(get_translation(lang,"saved_discussions"), expanded=False):
-        load_disc_btn = st.button(get_translation(lang,"load_discussions"))
-        saved_discussions = st.empty()
-        if load_disc_btn:
-            if st.session_state['user_state']:
-                disc_data = load_discussion_data_db(st.session_state['user_state'])
-                saved_discussions.json(disc_data) # Keine Übersetzung, da es sich um Daten handelt.
-            else:
-                saved_discussions.warning(get_translation(lang,"login_warning"))
+        render_saved_discussions(lang)
+
+    with st.expander(get_translation(lang, "leaderboard"), expanded=False):
+        render_leaderboard(lang)
 
     start_btn = st.button(get_translation(lang, "start_conversation"))
 
     st.subheader(get_translation(lang, "agent_conversation"))
-    for message in st.session_state['chat_history']:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"]) # Keine Übersetzung, da dynamischer Inhalt
+    render_transcript(lang)
 
     st.subheader(get_translation(lang, "formatted_output"))
-    st.markdown(st.session_state['formatted_output_text'])# Keine Übersetzung, da dynamischer Inhalt
-
-    rating_col1, rating_col2, rating_col3 = st.columns([1, 1, 3])
-    if st.session_state['rating_info'].get("iteration") is not None:
-        with rating_col1:
-            upvote_btn = st.button(get_translation(lang, "upvote"))
-        with rating_col2:
-            downvote_btn = st.button(get_translation(lang, "downvote"))
-        with rating_col3:
-            rating_label = st.empty()
-
-        if upvote_btn:
-            did = st.session_state['rating_info'].get("discussion_id")
-            itn = st.session_state['rating_info'].get("iteration")
-            agn = st.session_state['rating_info'].get("agent_name")
-            if did and itn and agn:
-                rate_agent_response(did, itn, agn, "upvote")
-                rating_label.success(get_translation(lang, "rating_success"))
-            else:
-                rating_label.error(get_translation(lang, "rating_error"))
-        if downvote_btn:
-            did = st.session_state['rating_info'].get("discussion_id")
-            itn = st.session_state['rating_info'].get("iteration")
-            agn = st.session_state['rating_info'].get("agent_name")
-            if did and itn and agn:
-                rate_agent_response(did, itn, agn, "downvote")
-                rating_label.success(get_translation(lang, "rating_success"))
-            else:
-                rating_label.error(get_translation(lang, "rating_error"))
-
-    save_col1, save_col2 = st.columns(2)
-    with save_col1:
-        save_btn = st.button(get_translation(lang, "save_discussion"))
-        save_status = st.empty()
-        if save_btn:
-            if st.session_state['user_state']:
-                active_agents_names = [agent['name'] for agent in agent_config_data if agent_selections[agent['name']]['selected']]
-                save_discussion_data_db(st.session_state['discussion_id'], topic_input, active_agents_names, st.session_state['chat_history'], "Manuell gespeichert", st.session_state['user_state'])
-                save_status.success(get_translation(lang, "save_success"))
-            else:
-                save_status.warning(get_translation(lang, "login_warning"))
-    with save_col2:
-        word_save_btn = st.button(get_translation(lang, "save_as_word"))
-        if word_save_btn:
-            if st.session_state['discussion_id']:
-                word_filename = save_chat_as_word(st.session_state['chat_history'], st.session_state['discussion_id'])
-                if word_filename:
-                    with open(word_filename, "rb") as file:
-                        st.download_button(
-                            label=get_translation(lang, "download_word"), # Übersetztes Label
-                            data=file,
-                            file_name=word_filename,
-                            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                        )
-                else:
-                    st.error(get_translation(lang, "word_error"))
-            else:
-                st.warning(get_translation(lang, "missing_discussion_id"))
-
-    if start_btn:
-        selected_agents = [
-            {"name": agent, "personality": agent_selections[agent]["personality"], "instruction": next((a["description"] for a in agent_config_data if a["name"] == agent), "")}
-            for agent in agent_selections if agent_selections[agent]["selected"]
-        ]
-        if not selected_agents:
+    render_formatted_output(lang)
+
+    if st.session_state['discussion_stats']:
+        with st.expander(get_translation(lang, "discussion_stats"), expanded=False):
+            st.json(st.session_state['discussion_stats']) # Keine Übersetzung, da es sich um Daten handelt.
+
+    render_rating_controls(lang)
+    render_save_controls(lang, topic_input, selected_agent_names)
+
+    resume_id = st.session_state.pop('resume_discussion_id', None)
+    resume_state = load_resume_state_db(resume_id, st.session_state['user_state']) if resume_id else None
+    if start_btn or resume_state is not None:
+        if resume_state is not None:
+            # Fortsetzung: Parameter der gespeicherten Diskussion statt der aktuellen Auswahl.
+            resume_config = resume_state["config"]
+            conversation_params = {
+                "conversation_topic": resume_state["topic"],
+                "selected_agents": resume_config["selected_agents"],
+                "iterations": resume_config["iterations"],
+                "expertise_level": resume_config["expertise_level"],
+                "language": resume_config["language"],
+                "summary_mode": resume_config["summary_mode"],
+                "round_mode": resume_config["round_mode"],
+                "uploaded_file": None,
+            }
+            discussion_id = resume_id
+        else:
+            conversation_params = {
+                "conversation_topic": topic_input,  # Kein Prompt mehr hier
+                "selected_agents": [agent_registry.select(name, agent_selections[name]) for name in selected_agent_names],
+                "iterations": iteration_slider,
+                "expertise_level": level_radio, # Keine Übersetzung
+                "language": lang,  # Verwende den Sprachcode!
+                "summary_mode": summary_mode_radio,
+                "round_mode": round_mode_radio,
+                "uploaded_file": st.session_state.get('uploaded_file'),
+            }
+            discussion_id = new_discussion_id()
+        if not conversation_params["selected_agents"]:
             st.warning(get_translation(lang, "no_agents_selected")) # Übersetzte Warnung
         else:
             st.session_state['chat_history'] = []
-            st.session_state['formatted_output_text'] = ""
-            st.session_state['discussion_id'] = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            st.session_state['formatted_output_chunks'] = []
+            st.session_state['discussion_id'] = discussion_id
             st.session_state['rating_info'] = {}
+            st.session_state['discussion_stats'] = {}
             try:
                 with st.spinner("Konversation wird gestartet..."):  # Spinner-Text NICHT übersetzen ,aber eventuell auch hierfür einen key erstellen
                     agent_convo = joint_conversation_with_selected_agents(
-                        conversation_topic=topic_input,  # Kein Prompt mehr hier
-                        selected_agents=selected_agents,
-                        iterations=iteration_slider,
-                        expertise_level=level_radio, # Keine Übersetzung
-                        language=lang,  # Verwende den Sprachcode!
+                        **conversation_params,
                         chat_history=[],
                         user_state=st.session_state['user_state'],
                         discussion_id=st.session_state['discussion_id'],
                         api_key=st.session_state['api_key'],
-                        uploaded_file=st.session_state.get('uploaded_file')
+                        summary_policy=SummaryPolicy(every_n_turns=summary_every_n),
+                        stats=st.session_state['discussion_stats'],
+                        use_response_cache=use_response_cache,
+                        stream=stream_responses,
+                        max_concurrency=panel_concurrency,
+                        progress_callback=st.session_state['rating_info'].update,
+                        early_stop=early_stop,
+                        resume_state=resume_state
                     )
+                    stream_placeholder = None
+                    stream_text = ""
+                    agent_personalities = {agent["name"]: agent.get("personality") for agent in conversation_params["selected_agents"]}
                     for updated_hist, chunk_text, disc_id, iteration_num, agent_n in agent_convo:
+                        if updated_hist is None:
+                            # Streaming-Teilstück: in die aktuelle Agenten-Nachricht schreiben
+                            if stream_placeholder is None:
+                                with st.chat_message("assistant"):
+                                    stream_placeholder = st.empty()
+                                stream_text = ""
+                            stream_text += chunk_text
+                            stream_placeholder.markdown(stream_text)
+                            continue
                         st.session_state['discussion_id'] = disc_id
-                        st.session_state['rating_info']["discussion_id"] = disc_id
-                        st.session_state['rating_info']["iteration"] = iteration_num
-                        st.session_state['rating_info']["agent_name"] = agent_n
+                        if iteration_num is not None:
+                            # Die Gesamtzusammenfassung (ohne Iteration) lässt den zuletzt bewertbaren Beitrag stehen.
+                            st.session_state['rating_info']["discussion_id"] = disc_id
+                            st.session_state['rating_info']["iteration"] = iteration_num
+                            st.session_state['rating_info']["agent_name"] = agent_n
+                            st.session_state['rating_info']["personality"] = agent_personalities.get(agent_n)
 
                         if updated_hist and len(updated_hist) > len(st.session_state['chat_history']):
                             new_messages = updated_hist[len(st.session_state['chat_history']):]
                             for message in new_messages:
                                 st.session_state['chat_history'].append(message)
+                                if stream_placeholder is not None and message["role"] == "assistant":
+                                    # Gestreamte Nachricht durch die endgültige Fassung ersetzen
+                                    stream_placeholder.markdown(message["content"])
+                                    stream_placeholder = None
+                                    continue
                                 with st.chat_message(message["role"]):
                                     st.markdown(message["content"])
-                            st.session_state['formatted_output_text'] += chunk_text
+                            if chunk_text:
+                                st.session_state['formatted_output_chunks'].append(chunk_text)
 
             except (tornado.websocket.WebSocketClosedError, tornado.iostream.StreamClosedError) as e:
                 st.error(get_translation(lang, "connection_error"))
@@ -1167,5 +912,6 @@ def main():
                 st.error(f"Die Konversation wurde unerwartet beendet: {e}")  # Keine Übersetzung, da es eine spezifische Fehlermeldung ist.
             except Exception as e:
                 st.error(get_translation(lang, "unexpected_error"))
+
 if __name__ == "__main__":
     main()
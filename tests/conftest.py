@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from think_tank import (
+    MODEL_NAME_TEXT, MODEL_NAME_VISION, ApiKeyPool, CircuitBreakerRegistry, RateLimiter, set_llm_backend,
+    set_process_api_key_pool, set_process_circuit_breakers, set_process_rate_limiter
+)
+from think_tank_cli import temporary_database
+
+
+@pytest.fixture
+def discussion_db():
+    """Leere Diskussionsdatenbank in einem temporären Verzeichnis."""
+    with temporary_database("test_discussions.db") as tmp_dir:
+        yield tmp_dir
+
+
+@pytest.fixture
+def user_db():
+    """Leere Benutzerdatenbank in einem temporären Verzeichnis."""
+    with temporary_database("test_users.db", "USER_DB_FILE") as tmp_dir:
+        yield tmp_dir
+
+
+@pytest.fixture
+def llm_stack():
+    """
+    Unbegrenzter RateLimiter, leerer Schlüssel-Pool und frische Circuit Breaker für diesen Prozess;
+    das Backend setzt der Test mit set_llm_backend. Danach gelten wieder die Standardobjekte.
+    """
+    unlimited = {"rpm": 10 ** 9, "tpm": 10 ** 12}
+    set_process_rate_limiter(RateLimiter({"models": {MODEL_NAME_TEXT: unlimited, MODEL_NAME_VISION: unlimited}}))
+    set_process_api_key_pool(ApiKeyPool())
+    set_process_circuit_breakers(CircuitBreakerRegistry())
+    yield
+    set_llm_backend(None)
+    set_process_rate_limiter(None)
+    set_process_circuit_breakers(None)
+    set_process_api_key_pool(None)
@@ -0,0 +1,53 @@
+import logging
+import threading
+
+from think_tank import (
+    append_discussion_messages_db, finish_discussion_db, list_discussions_db, load_discussion_db,
+    search_discussions_db, start_discussion_db
+)
+
+WRITERS = 4
+READERS = 2
+DISCUSSIONS_PER_WRITER = 10
+ROUNDS = 5
+MESSAGES_PER_ROUND = 2
+
+
+def test_concurrent_writers_store_every_message(discussion_db, caplog):
+    stop_reading = threading.Event()
+
+    def writer(index):
+        for number in range(DISCUSSIONS_PER_WRITER):
+            discussion_id = f"stress_{index:02d}_{number:03d}"
+            start_discussion_db(discussion_id, f"Thema {index} {number}", ["Agent 0", "Agent 1"], f"user{index}", {"iterations": ROUNDS})
+            for turn in range(1, ROUNDS + 1):
+                append_discussion_messages_db(discussion_id, [
+                    {"role": "assistant", "content": f"Beitrag {turn}.{offset} von Schreiber {index}", "turn": turn, "agent": f"Agent {offset}"}
+                    for offset in range(MESSAGES_PER_ROUND)
+                ])
+            finish_discussion_db(discussion_id, "completed", f"Zusammenfassung {index} {number}")
+
+    def reader(index):
+        while not stop_reading.is_set():
+            list_discussions_db(f"user{index % WRITERS}")
+            load_discussion_db(f"stress_{index % WRITERS:02d}_000")
+            search_discussions_db("Beitrag", f"user{index % WRITERS}")
+
+    with caplog.at_level(logging.ERROR):
+        writers = [threading.Thread(target=writer, args=(i,)) for i in range(WRITERS)]
+        readers = [threading.Thread(target=reader, args=(i,)) for i in range(READERS)]
+        for thread in writers + readers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        stop_reading.set()
+        for thread in readers:
+            thread.join()
+
+    assert not [record.getMessage() for record in caplog.records if record.getMessage().startswith("Datenbankfehler")]
+    for index in range(WRITERS):
+        for number in range(DISCUSSIONS_PER_WRITER):
+            discussion = load_discussion_db(f"stress_{index:02d}_{number:03d}")
+            assert discussion["status"] == "completed"
+            answers = [message for message in discussion["chat_history"] if message["role"] == "assistant"]
+            assert len(answers) == ROUNDS * MESSAGES_PER_ROUND
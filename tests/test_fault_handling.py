@@ -0,0 +1,102 @@
+import time
+
+import pytest
+
+from think_tank import (
+    API_MAX_RETRIES, MODEL_NAME_TEXT, CircuitBreaker, CircuitBreakerRegistry, StubBackend, SummaryPolicy,
+    call_gemini_api, call_gemini_api_stream, get_sleep_seconds_total, joint_conversation_with_selected_agents,
+    set_llm_backend, set_process_circuit_breakers
+)
+
+API_KEY = "fault-test-key"
+
+pytestmark = pytest.mark.usefixtures("llm_stack")
+
+
+def run_call(backend, breakers=None):
+    """Ein call_gemini_api-Aufruf; liefert Ergebnis, Anzahl der Backend-Aufrufe und verschlafene Zeit."""
+    set_llm_backend(backend)
+    if breakers is not None:
+        set_process_circuit_breakers(breakers)
+    calls_before, sleep_before = backend.calls, get_sleep_seconds_total()
+    result = call_gemini_api(["Fehlerprüfung"], API_KEY, model=MODEL_NAME_TEXT)
+    return result, backend.calls - calls_before, get_sleep_seconds_total() - sleep_before
+
+
+def test_quota_error_is_retried_after_server_delay():
+    result, calls, slept = run_call(StubBackend(latency_mean=0, error_rate_429=1.0, retry_after=0.1))
+    assert result["error"] == "quota"
+    assert calls == API_MAX_RETRIES
+    assert slept == pytest.approx(0.1 * (API_MAX_RETRIES - 1), abs=0.05)
+
+
+def test_transient_error_is_retried():
+    result, calls, _ = run_call(StubBackend(latency_mean=0, error_rate_5xx=1.0, retry_after=0.01))
+    assert result["error"] == "transient"
+    assert calls == API_MAX_RETRIES
+
+
+def test_permanent_error_is_not_retried():
+    result, calls, slept = run_call(StubBackend(latency_mean=0, error_rate_400=1.0))
+    assert result["error"] == "permanent"
+    assert calls == 1
+    assert slept == 0
+
+
+def test_circuit_breaker_skips_calls_while_open_and_recovers():
+    backend = StubBackend(latency_mean=0, retry_after=0.01)
+    backend.outage = True
+    breakers = CircuitBreakerRegistry(failure_threshold=API_MAX_RETRIES, reset_seconds=0.3)
+
+    assert run_call(backend, breakers)[0]["error"] == "transient"
+    result, calls, _ = run_call(backend, breakers)
+    assert result["error"] == "circuit_open"
+    assert calls == 0
+
+    time.sleep(0.35)
+    backend.outage = False
+    assert "error" not in run_call(backend, breakers)[0]
+    assert breakers.get(API_KEY, MODEL_NAME_TEXT).state == "closed"
+
+
+def test_aborted_streaming_probe_closes_breaker():
+    backend = StubBackend(latency_mean=0)
+    breakers = CircuitBreakerRegistry(failure_threshold=1, reset_seconds=0.1)
+    breaker = breakers.get(API_KEY, MODEL_NAME_TEXT)
+    breaker.record_failure()
+    time.sleep(0.15)
+    set_llm_backend(backend)
+    set_process_circuit_breakers(breakers)
+
+    stream = call_gemini_api_stream(["Fehlerprüfung"], API_KEY, model=MODEL_NAME_TEXT)
+    next(stream)
+    stream.close()
+
+    assert breaker.state == "closed"
+    assert breaker.available()
+    assert "error" not in run_call(backend, breakers)[0]
+
+
+def test_released_probe_can_be_retried():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.1)
+    breaker.record_failure()
+    time.sleep(0.15)
+    assert breaker.acquire() == 0.0
+    assert breaker.acquire() > 0
+    breaker.release_probe()
+    assert breaker.acquire() == 0.0
+
+
+def test_error_responses_are_not_summarized():
+    backend = StubBackend(latency_mean=0, error_rate_400=0.3, record_prompts=True, seed=7)
+    set_llm_backend(backend)
+    stats = {}
+    agents = [{"name": name, "personality": "neutral", "instruction": ""} for name in ("Alpha", "Beta")]
+    for _ in joint_conversation_with_selected_agents(
+        conversation_topic="Fehlerprüfung", selected_agents=agents, iterations=8, expertise_level="Experte",
+        language="de", chat_history=[], user_state=None, api_key=API_KEY, stats=stats,
+        summary_policy=SummaryPolicy(every_n_turns=1)
+    ):
+        pass
+    assert stats["agent_errors"] > 0
+    assert not [prompt for prompt in backend.prompts if "Fehler bei Gemini API Aufruf" in prompt]
@@ -0,0 +1,67 @@
+import random
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import think_tank
+from think_tank import PERSONALITY_PROMPT_SUFFIXES, get_discussion_db, rate_agent_response, rebuild_agent_rating_stats
+
+PROCESSES = 4
+THREADS = 4
+VOTES = 100
+PERSONALITIES = list(PERSONALITY_PROMPT_SUFFIXES)
+# Wenige, stark umkämpfte Beiträge (Diskussion, Iteration, Agent, Persönlichkeit).
+HOT_KEYS = [(f"rating_test_{index % 2}", 1 + index // 2, f"Agent {index % 3}", PERSONALITIES[index % len(PERSONALITIES)]) for index in range(4)]
+
+
+def _vote_worker(db_file, worker):
+    """Gibt in einem eigenen Prozess mit mehreren Threads Stimmen ab und zählt die bestätigten."""
+    think_tank.DISCUSSION_DB_FILE = db_file
+    counted = Counter()
+    failures = Counter()
+    lock = threading.Lock()
+
+    def vote(thread_index):
+        rng = random.Random(worker * 1000 + thread_index)
+        for _ in range(VOTES):
+            discussion_id, iteration, agent_name, personality = rng.choice(HOT_KEYS)
+            rating_type = rng.choice(("upvote", "downvote"))
+            confirmed = rate_agent_response(discussion_id, iteration, agent_name, rating_type, personality)
+            with lock:
+                (counted if confirmed else failures)[(discussion_id, iteration, agent_name, rating_type)] += 1
+
+    voters = [threading.Thread(target=vote, args=(i,)) for i in range(THREADS)]
+    for voter in voters:
+        voter.start()
+    for voter in voters:
+        voter.join()
+    return counted, failures
+
+
+def test_concurrent_votes_from_several_processes_are_all_counted(discussion_db):
+    expected = Counter()
+    failures = Counter()
+    # Die Prozesse migrieren die neue Datei gleichzeitig; migrate() wendet jede Version genau einmal an.
+    with ProcessPoolExecutor(max_workers=PROCESSES) as pool:
+        for counted, failed in pool.map(_vote_worker, [think_tank.DISCUSSION_DB_FILE] * PROCESSES, range(PROCESSES)):
+            expected.update(counted)
+            failures.update(failed)
+
+    conn = get_discussion_db().connection()
+    stored = Counter()
+    for discussion_id, iteration, agent, upvotes, downvotes in conn.execute(
+            "SELECT discussion_id, iteration, agent, upvotes, downvotes FROM discussion_ratings"):
+        stored[(discussion_id, iteration, agent, "upvote")] = upvotes
+        stored[(discussion_id, iteration, agent, "downvote")] = downvotes
+    assert not failures
+    assert sum(expected.values()) == PROCESSES * THREADS * VOTES
+    assert +stored == expected
+
+    # Die fortgeschriebenen Kennzahlen müssen einer Neuberechnung aus discussion_ratings entsprechen.
+    query = "SELECT agent, personality, upvotes, downvotes, discussions FROM agent_rating_stats ORDER BY agent, personality"
+    maintained = conn.execute(query).fetchall()
+    with get_discussion_db().transaction() as cursor:
+        rebuild_agent_rating_stats(cursor)
+    assert maintained
+    assert conn.execute(query).fetchall() == maintained
+
@@ -0,0 +1,51 @@
+import random
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import think_tank
+from think_tank import get_user_db, login_user, register_user
+
+PROCESSES = 4
+THREADS = 4
+USERNAMES = [f"user_{index:05d}" for index in range(50)]
+
+
+def _registration_worker(db_file, worker):
+    """Registriert in einem eigenen Prozess mit mehreren Threads dieselben Namen und liefert die Meldungen."""
+    think_tank.USER_DB_FILE = db_file
+    results = []
+    lock = threading.Lock()
+
+    def register(thread_index):
+        # Alle Threads aller Prozesse versuchen dieselben Namen, in unterschiedlicher Reihenfolge.
+        names = list(USERNAMES)
+        random.Random(worker * 1000 + thread_index).shuffle(names)
+        for username in names:
+            message = register_user(username, f"passwort_{username}")
+            with lock:
+                results.append((username, message))
+
+    registrants = [threading.Thread(target=register, args=(i,)) for i in range(THREADS)]
+    for registrant in registrants:
+        registrant.start()
+    for registrant in registrants:
+        registrant.join()
+    return results
+
+
+def test_concurrent_registrations_of_the_same_names_succeed_exactly_once(user_db):
+    results = []
+    # Die Prozesse migrieren die neue Datei gleichzeitig; migrate() wendet jede Version genau einmal an.
+    with ProcessPoolExecutor(max_workers=PROCESSES) as pool:
+        for worker_results in pool.map(_registration_worker, [think_tank.USER_DB_FILE] * PROCESSES, range(PROCESSES)):
+            results.extend(worker_results)
+
+    successes = Counter(username for username, message in results if message == "Registrierung erfolgreich.")
+    rejections = {message for _, message in results if message != "Registrierung erfolgreich."}
+    assert len(results) == PROCESSES * THREADS * len(USERNAMES)
+    assert successes == Counter(USERNAMES)
+    assert rejections == {"Nutzername bereits vergeben."}
+    assert get_user_db().connection().execute("SELECT COUNT(*) FROM users").fetchone()[0] == len(USERNAMES)
+    for username in USERNAMES:
+        assert login_user(username, f"passwort_{username}") == ("Login erfolgreich.", username)
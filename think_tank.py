@@ -0,0 +1,4167 @@
+"""
+Kern von AI-THINK-TANK ohne Oberfläche: Konfiguration, Benutzer- und Diskussionsdatenbank, Anbindung an
+die Gemini API (Ratenbegrenzung, Schlüssel-Pool, Circuit Breaker, Antwort-Cache) und der Diskussionsmotor.
+Die Streamlit-Oberfläche (streamlit-app.py) und die Kommandozeile (think_tank_cli.py) importieren dieses Modul.
+"""
+import re
+import logging
+import datetime
+import json
+import hashlib
+import zlib
+import abc
+import contextlib
+import os
+import time
+import random
+import math
+import threading
+import asyncio
+from collections import defaultdict, OrderedDict, deque
+from typing import List, Dict, Tuple, Any, Union, Iterator, AsyncIterator, Callable, Deque
+import sqlite3
+from jsonschema import validate, ValidationError
+from docx import Document
+import streamlit as st
+import google.generativeai as genai
+import http.server
+import multiprocessing
+import multiprocessing.managers
+import uuid
+import functools
+import bisect
+import email.utils
+
+# Konstanten und globale Einstellungen
+MODEL_NAME_TEXT = "gemini-2.0-flash-thinking-exp-01-21"  # Für Text
+MODEL_NAME_VISION = "gemini-2.0-flash-thinking-exp-01-21"  # Für Bilder
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+API_MAX_RETRIES = 3          # Maximale Anzahl an Versuchen bei Kontingent- und vorübergehenden Fehlern
+API_MAX_WAIT_SECONDS = 60    # Obergrenze für Backoff und vom Server vorgegebene Wartezeiten (Retry-After)
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 5  # Aufeinanderfolgende Fehlschläge, nach denen Aufrufe übersprungen werden
+CIRCUIT_BREAKER_RESET_SECONDS = 30     # Danach wird ein einzelner Probeaufruf zugelassen
+
+# Kontingent pro Modell (Requests und Tokens pro Minute). Statt fester Pausen
+# wartet call_gemini_api nur dann, wenn der jeweilige Token-Bucket leer ist.
+DEFAULT_RATE_LIMIT = {"rpm": 10, "tpm": 250000}
+RATE_LIMITS = {
+    MODEL_NAME_TEXT: {"rpm": 10, "tpm": 250000},
+}
+RATE_LIMIT_CONFIG_FILE = "rate_limits.json"  # Optionale Überschreibungen pro Modell und API-Schlüssel
+API_KEY_POOL_FILE = "api_keys.json"          # Optionaler Pool aus mehreren Schlüsseln und Ersatzmodellen
+QUOTA_COOLDOWN_SECONDS = 60                  # So lange wird ein Schlüssel nach einem 429 ohne Retry-After gemieden
+CHARS_PER_TOKEN = 4                          # Grobe Schätzung für Text-Inhalte
+FILE_PART_TOKEN_ESTIMATE = 1000              # Geschätzte Tokens pro Datei-Part (PDF/Bild)
+FILE_PART_CACHE_MAX_BYTES = 256 * 1024 * 1024  # Obergrenze für zwischengespeicherte Datei-Parts (LRU)
+RESPONSE_CACHE_TTL_SECONDS = 7 * 24 * 3600      # Gültigkeit zwischengespeicherter API-Antworten
+RESPONSE_CACHE_MAX_BYTES = 100 * 1024 * 1024    # Obergrenze des Antwort-Caches (LRU)
+CLIENT_POOL_MAX_SIZE = 32                       # Maximale Anzahl gleichzeitig gehaltener Gemini-Clients
+CLIENT_POOL_IDLE_SECONDS = 600                  # Unbenutzte Clients werden danach geschlossen
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini")  # "gemini" oder "stub" (lokal, deterministisch, ohne API-Schlüssel)
+
+# Metriken (Prometheus-Textformat)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))  # HTTP-Endpunkt /metrics auf 127.0.0.1; 0 = aus
+METRICS_FILE = os.environ.get("METRICS_FILE", "")        # Periodisch geschriebene Datei, z.B. "metrics_{pid}.prom"; leer = aus
+METRICS_FILE_INTERVAL_SECONDS = 15
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRICS_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+METRIC_DESCRIPTIONS = {  # Name -> (Typ, Beschreibung, Buckets bei Histogrammen)
+    "llm_requests_total": ("counter", "LLM-Aufrufe nach Modell und Ergebnis (ok, cache_hit, empty, partial, quota, transient, permanent, circuit_open)"),
+    "llm_attempts_total": ("counter", "Einzelne Versuche gegen das LLM-Backend"),
+    "llm_retries_total": ("counter", "Wiederholte Versuche nach einem Fehler"),
+    "llm_429_total": ("counter", "Vom Backend gemeldete Kontingent-Fehler (429)"),
+    "llm_errors_total": ("counter", "Fehlgeschlagene Versuche nach Fehlerart (quota, transient, permanent)"),
+    "llm_rate_limit_wait_seconds_total": ("counter", "Wartezeit im lokalen Ratenbegrenzer"),
+    "llm_request_duration_seconds": ("histogram", "Dauer eines Versuchs gegen das LLM-Backend", METRICS_LATENCY_BUCKETS),
+    "llm_prompt_bytes": ("histogram", "Größe der gesendeten Inhalte in Bytes", METRICS_SIZE_BUCKETS),
+    "llm_response_bytes": ("histogram", "Größe der Antworten in Bytes", METRICS_SIZE_BUCKETS),
+    "operation_duration_seconds": ("histogram", "Dauer instrumentierter Operationen (Zusammenfassung, Datei, Datenbank, Word-Export)", METRICS_LATENCY_BUCKETS),
+    "operation_errors_total": ("counter", "Ausnahmen in instrumentierten Operationen"),
+}
+
+# "sequential": jeder Agent wartet auf die aktuelle Zusammenfassung.
+# "pipelined": der nächste Agent startet sofort, Zusammenfassungen laufen im Hintergrund.
+SUMMARY_MODES = ["sequential", "pipelined"]
+CONVERSATION_SUMMARY_MODE = "sequential"
+
+# Rollierende Zusammenfassung nur alle N Runden oder sobald der noch nicht zusammengefasste
+# Text zu lang wird; dazwischen werden die letzten Beiträge wörtlich an den Prompt angehängt.
+SUMMARY_EVERY_N_TURNS = 3
+SUMMARY_MAX_PENDING_CHARS = 6000
+
+# "sequential": Agenten sprechen reihum. "panel": alle Agenten antworten pro Runde gleichzeitig,
+# danach eine gemeinsame Zusammenfassung der Runde.
+ROUND_MODES = ["sequential", "panel"]
+PANEL_MAX_CONCURRENCY = 4  # Maximale Anzahl paralleler LLM-Aufrufe im Panel-Modus
+
+# Lokale Neuheitsbewertung jeder Antwort: Jaccard-Ähnlichkeit der Wort-n-Gramme gegenüber den letzten Beiträgen.
+NOVELTY_SHINGLE_SIZE = 2             # Wörter pro n-Gramm
+NOVELTY_WINDOW = 6                   # Anzahl der letzten Beiträge, mit denen verglichen wird
+NOVELTY_DUPLICATE_SIMILARITY = 0.5   # Ab dieser Ähnlichkeit gilt eine Antwort als Beinahe-Wiederholung (Retry/Themenwechsel)
+NOVELTY_STAGNATION_THRESHOLD = 0.6   # Neuheit (1 - Ähnlichkeit) darunter gilt als stagnierend
+NOVELTY_STAGNATION_TURNS = 3         # So viele stagnierende Antworten in Folge beenden die Diskussion vorzeitig (falls aktiviert)
+NOVELTY_RETRY_HINT = "Deine Antwort wiederholt weitgehend bisherige Beiträge. Bringe einen neuen Aspekt, ein Gegenargument oder einen konkreten nächsten Schritt ein."
+
+AUDIT_LOG_FILE = "audit_log.txt"
+EXPIRATION_TIME_SECONDS = 300
+ROLE_PERMISSIONS = {
+    "user": ["REQ", "DATA"],
+    "admin": ["REQ", "DATA", "CALC", "IF", "AI"]
+}
+PRIORITY_MAP = {"HIGH": 1, "MEDIUM": 2, "LOW": 3}
+
+USER_DATA_FILE = "user_data.json"   # Nur noch Quelle für die einmalige Übernahme in USER_DB_FILE
+USER_DB_FILE = "user_data.db"
+DISCUSSION_DB_FILE = "discussion_data.db"
+RESPONSE_CACHE_DB_FILE = "response_cache.db"
+RATING_DATA_FILE = "rating_data.json"
+AGENT_CONFIG_FILE = "agent_config.json"
+
+USER_DATA_SCHEMA = {
+    "type": "object",
+    "patternProperties": {
+        "^[a-zA-Z0-9_-]+$": {
+            "type": "object",
+            "properties": {
+                "password": {"type": "string"}
+            },
+            "required": ["password"]
+        }
+    }
+}
+
+AGENT_DEFAULT_CATEGORY = "Allgemein"  # Kategorie für Agenten ohne "category" in der Konfiguration
+AGENT_PICKER_PAGE_SIZE = 12          # Agenten pro Seite in der Agentenauswahl (nur diese erzeugen Widgets)
+DISCUSSION_PAGE_SIZE = 20            # Gespeicherte Diskussionen pro Seite (nur Metadaten)
+DISCUSSION_SUMMARY_PREVIEW_CHARS = 200  # Länge der Zusammenfassungs-Vorschau in der Liste
+DISCUSSION_SEARCH_LIMIT = 20         # Maximale Anzahl Treffer der Volltextsuche
+DISCUSSION_SEARCH_SNIPPET_TOKENS = 16  # Länge der Textausschnitte in den Suchtreffern (Tokens)
+DISCUSSION_SEARCH_WEIGHTS = (10.0, 5.0, 1.0)  # BM25-Gewichte für Thema, Zusammenfassung und Agentenantworten
+DISCUSSION_RESUME_STALE_SECONDS = 900  # Ohne Fortschritt so lange gilt eine "running"-Diskussion als verwaist und fortsetzbar
+CHAT_HISTORY_CODEC_VERSION = 1       # Speicherformat der Spalte chat_history (0 = JSON-Text, 1 = kompaktes JSON + zlib)
+CHAT_HISTORY_COMPRESSION_LEVEL = 6   # zlib-Stufe für chat_history (1 = schnell, 9 = kleinste Datei)
+PROMPT_SUMMARY_PLACEHOLDER = "{summary}"  # Platzhalter für die Zusammenfassung in gespeicherten Prompts (discussion_messages)
+DB_JOURNAL_MODE = "WAL"              # Journal-Modus der Diskussionsdatenbank (WAL: Leser und ein Schreiber gleichzeitig)
+DB_BUSY_TIMEOUT_SECONDS = 30         # So lange wartet ein Schreiber auf die Sperre, bevor "database is locked" gemeldet wird
+DB_STATEMENT_CACHE_SIZE = 256        # Vorbereitete Statements, die jede Verbindung wiederverwendet
+LEADERBOARD_SIZE = 20                # Agenten in der Bestenliste
+LEADERBOARD_MIN_VOTES = 5            # Mindestanzahl Stimmen für die Bestenliste
+LEADERBOARD_WILSON_Z = 1.96          # z-Wert der Wilson-Untergrenze (1.96 = 95 %-Konfidenz)
+TRANSCRIPT_PAGE_SIZE = 20            # Nachrichten bzw. Abschnitte pro Seite in Verlauf und formatiertem Output
+
+PERSONALITY_PROMPT_SUFFIXES = {  # Prompt-Zusatz je Persönlichkeit ("neutral" ohne Zusatz)
+    "kritisch": "\nSei kritisch.",
+    "visionär": "\nSei visionär.",
+    "konservativ": "\nSei konservativ.",
+}
+
+AGENT_CONFIG_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "name": {"type": "string"},
+            "personality": {"type": "string", "enum": ["kritisch", "visionär", "konservativ", "neutral"]},
+            "category": {"type": "string"},
+            "description": {"type": "string"}
+        },
+        "required": ["name", "personality", "description"]
+    }
+}
+
+class MetricsRegistry:
+    """
+    Prozessinterne Metriken (Zähler und Histogramme mit Labels) im Stil von Prometheus.
+    Beschreibungen und Typen stehen in METRIC_DESCRIPTIONS; render_prometheus() liefert das Textformat.
+    """
+
+    def __init__(self):
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = defaultdict(float)
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        """Erhöht einen Zähler um `value`."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Trägt einen Messwert in ein Histogramm ein (Buckets laut METRIC_DESCRIPTIONS)."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                buckets = METRIC_DESCRIPTIONS.get(name, ("histogram", "", METRICS_LATENCY_BUCKETS))[2]
+                histogram = {"buckets": buckets, "counts": [0] * (len(buckets) + 1), "sum": 0.0, "count": 0}
+                self._histograms[key] = histogram
+            histogram["counts"][bisect.bisect_left(histogram["buckets"], value)] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: Zähler sowie Anzahl und Summe der Histogramme, z.B. für Protokolle.
+        """
+        def label_key(name: str, labels: Tuple[Tuple[str, str], ...]) -> str:
+            return name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+
+        with self._lock:
+            return {
+                "counters": {label_key(name, labels): value for (name, labels), value in self._counters.items()},
+                "histograms": {label_key(name, labels): {"count": h["count"], "sum": h["sum"]} for (name, labels), h in self._histograms.items()},
+            }
+
+    @staticmethod
+    def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Tuple[str, str] = None) -> str:
+        pairs = list(labels) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+    @staticmethod
+    def _format_value(value: float) -> str:
+        return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+    def render_prometheus(self) -> str:
+        """
+        Returns:
+            str: Alle Metriken im Prometheus-Textformat (Version 0.0.4).
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, dict(h, counts=list(h["counts"]))) for key, h in self._histograms.items())
+        lines = []
+        described = set()
+
+        def describe(name: str, kind: str) -> None:
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {METRIC_DESCRIPTIONS.get(name, (kind, name))[1]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            describe(name, "counter")
+            lines.append(f"{name}{self._format_labels(labels)} {self._format_value(value)}")
+        for (name, labels), histogram in histograms:
+            describe(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(list(histogram["buckets"]) + ["+Inf"], histogram["counts"]):
+                cumulative += count
+                le = bound if bound == "+Inf" else self._format_value(bound)
+                lines.append(f"{name}_bucket{self._format_labels(labels, ('le', le))} {cumulative}")
+            lines.append(f"{name}_sum{self._format_labels(labels)} {self._format_value(histogram['sum'])}")
+            lines.append(f"{name}_count{self._format_labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+@st.cache_resource(show_spinner=False)
+def _create_metrics_registry() -> MetricsRegistry:
+    return MetricsRegistry()
+
+# Einmal beim Import aufgelöst, damit Messpunkte nicht bei jedem Aufruf st.cache_resource durchlaufen.
+_metrics_registry = _create_metrics_registry()
+
+def get_metrics() -> MetricsRegistry:
+    """
+    Liefert die prozessweite MetricsRegistry (über Streamlit-Reruns hinweg dieselbe Instanz).
+
+    Returns:
+        MetricsRegistry: Die Registry.
+    """
+    return _metrics_registry
+
+def instrumented(operation: str) -> Callable:
+    """
+    Dekorator, der Laufzeit und Fehler einer Funktion als `operation_duration_seconds` bzw.
+    `operation_errors_total` mit dem Label `operation` erfasst.
+
+    Args:
+        operation (str): Der Name der Operation im Label.
+
+    Returns:
+        Callable: Der Dekorator.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                _metrics_registry.inc("operation_errors_total", operation=operation)
+                raise
+            finally:
+                _metrics_registry.observe("operation_duration_seconds", time.perf_counter() - start, operation=operation)
+        return wrapper
+    return decorator
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    """Liefert die Metriken unter /metrics im Prometheus-Textformat."""
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = get_metrics().render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@st.cache_resource(show_spinner=False)
+def start_metrics_server(port: int) -> http.server.ThreadingHTTPServer:
+    """
+    Startet den Metrik-Endpunkt (einmal pro Prozess) auf 127.0.0.1:`port`.
+
+    Args:
+        port (int): Der TCP-Port.
+
+    Returns:
+        http.server.ThreadingHTTPServer: Der laufende Server.
+    """
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logging.info(f"Metrik-Endpunkt gestartet: http://127.0.0.1:{port}/metrics")
+    return server
+
+def write_metrics_file(path: str) -> None:
+    """
+    Schreibt die Metriken atomar (über eine temporäre Datei) im Prometheus-Textformat,
+    z.B. für den Textfile-Collector des node_exporter.
+
+    Args:
+        path (str): Der Zieldateiname.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(get_metrics().render_prometheus())
+    os.replace(tmp_path, path)
+
+@st.cache_resource(show_spinner=False)
+def start_metrics_file_writer(path: str, interval_seconds: float = METRICS_FILE_INTERVAL_SECONDS) -> threading.Thread:
+    """
+    Startet (einmal pro Prozess) einen Hintergrund-Thread, der die Metriken periodisch schreibt.
+
+    Args:
+        path (str): Der Zieldateiname.
+        interval_seconds (float, optional): Abstand zwischen zwei Schreibvorgängen.
+
+    Returns:
+        threading.Thread: Der Schreib-Thread.
+    """
+    def loop() -> None:
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                write_metrics_file(path)
+            except OSError as e:
+                logging.error(f"Fehler beim Schreiben der Metrik-Datei {path}: {e}")
+
+    thread = threading.Thread(target=loop, name="metrics-file-writer", daemon=True)
+    thread.start()
+    logging.info(f"Metriken werden alle {interval_seconds} Sekunden nach {path} geschrieben.")
+    return thread
+
+def start_metrics_exporters(http_endpoint: bool = True) -> None:
+    """
+    Startet die über METRICS_PORT und METRICS_FILE konfigurierten Exporte ({pid} im Dateinamen
+    wird durch die Prozess-ID ersetzt, damit Batch-Worker getrennte Dateien schreiben).
+
+    Args:
+        http_endpoint (bool, optional): Auch den HTTP-Endpunkt starten (nur im Hauptprozess sinnvoll).
+    """
+    if http_endpoint and METRICS_PORT:
+        try:
+            start_metrics_server(METRICS_PORT)
+        except OSError as e:
+            logging.error(f"Metrik-Endpunkt auf Port {METRICS_PORT} konnte nicht gestartet werden: {e}")
+    if METRICS_FILE:
+        start_metrics_file_writer(METRICS_FILE.format(pid=os.getpid()))
+
+def load_json_data(filename: str, schema: dict = None) -> Dict[str, Any]:
+    """
+    Lädt JSON-Daten aus einer Datei und validiert sie gegen ein gegebenes Schema.
+
+    Args:
+        filename (str): Der Name der JSON-Datei.
+        schema (dict, optional): Das Schema zur Validierung der JSON-Daten.
+
+    Returns:
+        Dict[str, Any]: Die geladenen JSON-Daten.
+    """
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            data = json.load(f)
+            if schema:
+                validate(instance=data, schema=schema)
+            return data
+    except FileNotFoundError:
+        logging.warning(f"Datei '{filename}' nicht gefunden. Starte mit leeren Daten.")
+        return {}
+    except json.JSONDecodeError as e:
+        logging.error(f"Fehler beim Lesen von '{filename}': Ungültiges JSON-Format. Details: {e}")
+        return {}
+    except ValidationError as e:
+        logging.error(f"Datei '{filename}' entspricht nicht dem erwarteten Schema: {e}")
+        return {}
+
+def save_json_data(data: Dict[str, Any], filename: str) -> None:
+    """
+    Speichert JSON-Daten in einer Datei.
+
+    Args:
+        data (Dict[str, Any]): Die zu speichernden Daten.
+        filename (str): Der Name der Datei, in der die Daten gespeichert werden sollen.
+    """
+    try:
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+    except IOError as e:
+        logging.error(f"Fehler beim Schreiben in Datei '{filename}': {e}")
+
+def load_agent_config(filename: str = None) -> List[Dict[str, str]]:
+    """
+    Lädt die Agentenkonfiguration aus einer JSON-Datei und validiert sie.
+    Für wiederholte Zugriffe get_agent_registry() verwenden (einmal pro Dateiversion geladen).
+
+    Args:
+        filename (str, optional): Pfad der Konfiguration. Standard: AGENT_CONFIG_FILE.
+
+    Returns:
+        List[Dict[str, str]]: Die geladene Agentenkonfiguration.
+    """
+    filename = filename or AGENT_CONFIG_FILE
+    config = load_json_data(filename, AGENT_CONFIG_SCHEMA)
+    if not isinstance(config, list):
+        logging.error(f"Agentenkonfiguration in '{filename}' ist ungültig oder leer.")
+        return []
+    return config
+
+class AgentRegistry:
+    """
+    Nach Namen indizierte Agentenkonfiguration mit vorberechneten Prompt-Bausteinen,
+    damit Auswahl und Prompt-Aufbau pro Agent O(1) sind.
+    """
+
+    def __init__(self, agents: List[Dict[str, str]]):
+        self.agents = agents
+        self.by_name: Dict[str, Dict[str, str]] = {}
+        for agent in agents:
+            # Bei doppelten Namen gilt wie bisher (next(...)) der erste Eintrag.
+            self.by_name.setdefault(agent["name"], agent)
+        self.names = list(self.by_name)
+        self._categories = {name: agent.get("category") or AGENT_DEFAULT_CATEGORY for name, agent in self.by_name.items()}
+        self.categories = sorted(set(self._categories.values()))
+        # Kleingeschriebener Suchtext pro Agent (Name, Beschreibung, Kategorie).
+        self._search_text = {
+            name: f"{name} {agent['description']} {self._categories[name]}".lower()
+            for name, agent in self.by_name.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.agents)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.by_name
+
+    def get(self, name: str) -> Dict[str, str]:
+        return self.by_name.get(name)
+
+    def category(self, name: str) -> str:
+        return self._categories[name]
+
+    def search(self, query: str = "", category: str = None) -> List[str]:
+        """
+        Filtert die Agenten nach Suchbegriffen und Kategorie (Reihenfolge der Konfiguration).
+
+        Args:
+            query (str, optional): Leerzeichen-getrennte Begriffe; alle müssen in Name, Beschreibung
+                oder Kategorie vorkommen (ohne Beachtung der Groß-/Kleinschreibung).
+            category (str, optional): Nur Agenten dieser Kategorie; None für alle.
+
+        Returns:
+            List[str]: Die Namen der passenden Agenten.
+        """
+        terms = query.lower().split()
+        return [
+            name for name in self.names
+            if (category is None or self._categories[name] == category)
+            and all(term in self._search_text[name] for term in terms)
+        ]
+
+    def select(self, name: str, personality: str = None) -> Dict[str, str]:
+        """
+        Baut die Agentenstruktur des Motors mit vorberechneten Prompt-Bausteinen.
+
+        Args:
+            name (str): Der Agentenname.
+            personality (str, optional): Gewählte Persönlichkeit. Standard: die aus der Konfiguration.
+
+        Returns:
+            Dict[str, str]: name, personality, instruction und personality_suffix.
+
+        Raises:
+            KeyError: Wenn der Agent nicht in der Konfiguration vorkommt.
+        """
+        agent = self.by_name[name]
+        personality = personality or agent["personality"]
+        return {
+            "name": name,
+            "personality": personality,
+            "instruction": agent["description"],
+            "personality_suffix": PERSONALITY_PROMPT_SUFFIXES.get(personality, ""),
+        }
+
+class AgentRegistryLoader:
+    """
+    Hält pro Konfigurationsdatei eine AgentRegistry und lädt sie nur neu, wenn sich
+    Änderungszeit oder Größe der Datei geändert haben (ein os.stat pro Zugriff).
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[Any, AgentRegistry]] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def get(self, filename: str) -> AgentRegistry:
+        try:
+            stat_result = os.stat(filename)
+            version = (stat_result.st_mtime_ns, stat_result.st_size)
+        except FileNotFoundError:
+            version = None
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+            registry = AgentRegistry(load_agent_config(filename))
+            self._entries[filename] = (version, registry)
+            self.loads += 1
+            logging.info(f"Agentenkonfiguration '{filename}' geladen: {len(registry)} Agenten.")
+            return registry
+
+@st.cache_resource(show_spinner=False)
+def _create_agent_registry_loader() -> AgentRegistryLoader:
+    return AgentRegistryLoader()
+
+def get_agent_registry(filename: str = None) -> AgentRegistry:
+    """
+    Liefert die prozessweit zwischengespeicherte AgentRegistry; Änderungen an der Datei werden
+    beim nächsten Zugriff erkannt.
+
+    Args:
+        filename (str, optional): Pfad der Konfiguration. Standard: AGENT_CONFIG_FILE.
+
+    Returns:
+        AgentRegistry: Die Registry (leer, wenn die Datei fehlt oder ungültig ist).
+    """
+    return _create_agent_registry_loader().get(filename or AGENT_CONFIG_FILE)
+
+def hash_password(password: str) -> str:
+    """
+    Hasht ein Passwort mit SHA-256.
+
+    Args:
+        password (str): Das zu hashende Passwort.
+
+    Returns:
+        str: Der gehashte Passwort-String.
+    """
+    return hashlib.sha256(password.encode()).hexdigest()
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    """
+    Überprüft, ob ein Passwort mit dem gehashten Passwort übereinstimmt.
+
+    Args:
+        password (str): Das zu überprüfende Passwort.
+        hashed_password (str): Der gehashte Passwort-String.
+
+    Returns:
+        bool: True, wenn das Passwort übereinstimmt, sonst False.
+    """
+    return hash_password(password) == hashed_password
+
+def register_user(username: str, password: str) -> str:
+    """
+    Registriert einen neuen Benutzer.
+
+    Args:
+        username (str): Der Benutzername des neuen Benutzers.
+        password (str): Das Passwort des neuen Benutzers.
+
+    Returns:
+        str: Eine Nachricht, die den Status der Registrierung angibt.
+    """
+    if not re.match(r"^[a-zA-Z0-9_-]+$", username):
+        return "Ungültiger Nutzername. Nur Buchstaben, Zahlen, '-', '_' erlaubt."
+    if len(password) < 8:
+        return "Passwort muss mindestens 8 Zeichen lang sein."
+    try:
+        # Die UNIQUE-Bedingung entscheidet auch bei gleichzeitigen Registrierungen desselben Namens.
+        with get_user_db().transaction() as cursor:
+            cursor.execute("INSERT INTO users (username, password_hash) VALUES (?, ?)", (username, hash_password(password)))
+    except sqlite3.IntegrityError:
+        return "Nutzername bereits vergeben."
+    except sqlite3.Error as e:
+        logging.error(f"Datenbankfehler bei der Registrierung von '{username}': {e}")
+        return "Registrierung fehlgeschlagen."
+    return "Registrierung erfolgreich."
+
+def login_user(username: str, password: str) -> Tuple[str, str]:
+    """
+    Loggt einen Benutzer ein.
+
+    Args:
+        username (str): Der Benutzername des Benutzers.
+        password (str): Das Passwort des Benutzers.
+
+    Returns:
+        Tuple[str, str]: Eine Nachricht, die den Status des Logins angibt, und den Benutzernamen bei Erfolg.
+    """
+    try:
+        row = get_user_db().connection().execute("SELECT password_hash FROM users WHERE username = ?", (username,)).fetchone()
+    except sqlite3.Error as e:
+        logging.error(f"Datenbankfehler beim Login von '{username}': {e}")
+        row = None
+    if row is not None and verify_password(password, row[0]):
+        return "Login erfolgreich.", username
+    return "Login fehlgeschlagen.", None
+
+def encode_chat_history(chat_history: List[Dict[str, Any]]) -> bytes:
+    """
+    Kodiert einen Chatverlauf für die Spalte chat_history: ein Byte Formatversion, danach kompaktes
+    UTF-8-JSON, mit zlib komprimiert. Die in jedem Prompt wiederholte Zusammenfassung liegt innerhalb
+    des zlib-Fensters und kostet nur noch Verweise.
+
+    Args:
+        chat_history (List[Dict[str, Any]]): Der Chatverlauf.
+
+    Returns:
+        bytes: Der kodierte Chatverlauf (als BLOB gespeichert).
+    """
+    payload = json.dumps(chat_history, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return bytes([CHAT_HISTORY_CODEC_VERSION]) + zlib.compress(payload, CHAT_HISTORY_COMPRESSION_LEVEL)
+
+def decode_chat_history(value: Union[str, bytes, None]) -> List[Dict[str, Any]]:
+    """
+    Dekodiert die Spalte chat_history in allen Formaten: JSON-Text älterer Zeilen (Format 0)
+    und BLOBs aus encode_chat_history.
+
+    Args:
+        value (Union[str, bytes, None]): Inhalt der Spalte.
+
+    Returns:
+        List[Dict[str, Any]]: Der Chatverlauf (leer, wenn die Spalte leer ist).
+
+    Raises:
+        ValueError: Bei einer unbekannten Formatversion.
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        return json.loads(value)
+    version = value[0]
+    if version == 1:
+        return json.loads(zlib.decompress(value[1:]))
+    raise ValueError(f"Unbekanntes chat_history-Format {version}")
+
+@st.cache_resource(show_spinner=False)
+def sqlite_has_fts5() -> bool:
+    """
+    Prüft einmal pro Prozess, ob das SQLite der Python-Installation FTS5 enthält.
+
+    Returns:
+        bool: True, wenn virtuelle FTS5-Tabellen angelegt werden können.
+    """
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute("CREATE VIRTUAL TABLE fts5_probe USING fts5(content)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+def discussion_search_available() -> bool:
+    """
+    Prüft, ob die Volltextsuche möglich ist: FTS5 für den Index und SQLite ab 3.35 für
+    "WITH ... AS MATERIALIZED" in search_discussions_db.
+
+    Returns:
+        bool: True, wenn search_discussions_db Treffer liefern kann.
+    """
+    return sqlite_has_fts5() and sqlite3.sqlite_version_info >= (3, 35)
+
+class SQLiteDatabase:
+    """
+    Zugriffsschicht für eine SQLite-Datei: eine langlebige Verbindung pro Thread (WAL-Modus, Busy-Timeout,
+    Statement-Cache von sqlite3), Schreibtransaktionen mit BEGIN IMMEDIATE und versionierte
+    Schema-Migrationen über PRAGMA user_version. `functions` ((Name, Parameterzahl, Funktion)) werden
+    auf jeder Verbindung als SQL-Funktionen registriert.
+    """
+
+    def __init__(self, db_file: str, migrations: List[Callable[[sqlite3.Cursor], None]] = (), journal_mode: str = DB_JOURNAL_MODE, busy_timeout: float = DB_BUSY_TIMEOUT_SECONDS,
+                 functions: List[Tuple[str, int, Callable]] = ()):
+        self.db_file = db_file
+        self.migrations = list(migrations)
+        self.functions = list(functions)
+        self.journal_mode = journal_mode
+        self.busy_timeout = busy_timeout
+        self.connections_opened = 0
+        self._local = threading.local()
+        self._lock = threading.RLock()  # migrate() öffnet unter der Sperre die erste Verbindung
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        Liefert die Verbindung des aufrufenden Threads und öffnet sie beim ersten Zugriff. Verbindungen
+        laufen im Autocommit-Modus; Schreibzugriffe gehören in transaction().
+
+        Returns:
+            sqlite3.Connection: Die Verbindung dieses Threads.
+        """
+        conn = getattr(self._local, "conn", None)
+        # Nach fork() (Batch-Worker, Prozess-Pools) nie die geerbte Verbindung des Elternprozesses verwenden.
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_file, timeout=self.busy_timeout, isolation_level=None, cached_statements=DB_STATEMENT_CACHE_SIZE)
+            # WAL: Leser blockieren Schreiber nicht und umgekehrt; NORMAL genügt im WAL-Modus für Konsistenz nach Absturz.
+            conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            for name, num_params, func in self.functions:
+                conn.create_function(name, num_params, func, deterministic=True)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            with self._lock:
+                self.connections_opened += 1
+        return conn
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator[sqlite3.Cursor]:
+        """
+        Schreibtransaktion: bei Erfolg COMMIT, bei einer Ausnahme ROLLBACK. BEGIN IMMEDIATE fordert die
+        Schreibsperre sofort an und wartet dabei bis zum Busy-Timeout; bei BEGIN (DEFERRED) könnte das
+        spätere Hochstufen einer Lesesperre ohne Warten mit "database is locked" scheitern.
+
+        Yields:
+            sqlite3.Cursor: Cursor der Verbindung dieses Threads.
+        """
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn.cursor()
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def migrate(self) -> int:
+        """
+        Führt alle noch nicht angewendeten Migrationen in einer Transaktion aus und setzt user_version.
+        Die Version wird erst innerhalb der Transaktion gelesen, damit parallel startende Prozesse
+        (z.B. Batch-Worker) eine Migration nicht doppelt ausführen.
+
+        Returns:
+            int: Die Schema-Version nach der Migration.
+        """
+        with self._lock:
+            with self.transaction() as cursor:
+                version = cursor.execute("PRAGMA user_version").fetchone()[0]
+                for target, migration in enumerate(self.migrations[version:], start=version + 1):
+                    migration(cursor)
+                    cursor.execute(f"PRAGMA user_version = {target}")
+                    logging.info(f"Migration {target} ({migration.__name__}) auf {self.db_file} angewendet.")
+                    version = target
+        return version
+
+    def file_size(self) -> int:
+        """
+        Größe der Datenbankdatei, nachdem der Inhalt des WAL zurückgeschrieben wurde.
+
+        Returns:
+            int: Größe in Bytes.
+        """
+        self.connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return os.path.getsize(self.db_file)
+
+    def close(self) -> None:
+        """
+        Schließt die Verbindung des aufrufenden Threads (die übrigen schließen mit ihrem Thread).
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+            self._local.conn = None
+
+def index_discussion_search(cursor: sqlite3.Cursor, discussion_id: str, topic: str = None, summary: str = None, contents: List[str] = ()) -> None:
+    """
+    Fügt Einträge in den Volltextindex discussion_search ein, in der Transaktion des Aufrufers.
+    Der Index wird nur ergänzt: eine Zeile für Thema/Zusammenfassung und eine pro Agentenantwort,
+    jeweils mit dem Benutzer der (bereits angelegten) Diskussion.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor der offenen Verbindung.
+        discussion_id (str): Die ID der Diskussion.
+        topic (str, optional): Das Thema der Diskussion.
+        summary (str, optional): Die Zusammenfassung der Diskussion.
+        contents (List[str], optional): Inhalte der Agentenantworten.
+    """
+    if not sqlite_has_fts5():
+        return
+    owner = cursor.execute("SELECT user FROM discussions WHERE discussion_id = ?", (discussion_id,)).fetchone()
+    user = owner[0] if owner else None
+    rows = [(discussion_id, user, topic, summary, None)] if topic or summary else []
+    rows.extend((discussion_id, user, None, None, content) for content in contents if content)
+    cursor.executemany("INSERT INTO discussion_search (discussion_id, user, topic, summary, content) VALUES (?, ?, ?, ?, ?)", rows)
+
+def searchable_contents(messages: List[Dict[str, Any]]) -> List[str]:
+    """
+    Inhalte, die in den Volltextindex aufgenommen werden: Antworten ohne Fehler. Die Prompts (Rolle "user")
+    wiederholen Thema und Zusammenfassung und werden ausgelassen.
+
+    Args:
+        messages (List[Dict[str, Any]]): Chat-Nachrichten.
+
+    Returns:
+        List[str]: Die zu indexierenden Inhalte.
+    """
+    return [m["content"] for m in messages if m.get("role") == "assistant" and not m.get("error")]
+
+def wilson_lower_bound(upvotes: int, downvotes: int) -> float:
+    """
+    Untere Grenze des Wilson-Konfidenzintervalls für den Anteil positiver Stimmen: wenige Stimmen
+    ergeben einen vorsichtigen Wert, sodass 3 von 3 nicht vor 95 von 100 landet.
+
+    Args:
+        upvotes (int): Anzahl positiver Stimmen.
+        downvotes (int): Anzahl negativer Stimmen.
+
+    Returns:
+        float: Wert zwischen 0 und 1 (0 ohne Stimmen).
+    """
+    total = upvotes + downvotes
+    if total == 0:
+        return 0.0
+    z2 = LEADERBOARD_WILSON_Z ** 2
+    share = upvotes / total
+    return (share + z2 / (2 * total) - LEADERBOARD_WILSON_Z * math.sqrt((share * (1 - share) + z2 / (4 * total)) / total)) / (1 + z2 / total)
+
+# --- Schema-Migrationen der Diskussionsdatenbank (Reihenfolge = Version, nur anhängen) ---
+# Datenbanken aus der Zeit vor user_version stehen auf Version 0; die Migrationen prüfen daher,
+# was bereits existiert.
+
+def migrate_discussions_table(cursor: sqlite3.Cursor) -> None:
+    """
+    Version 1: Tabelle discussions mit Index für die seitenweise Auflistung.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS discussions (
+            discussion_id TEXT PRIMARY KEY,
+            topic TEXT,
+            agents TEXT,
+            chat_history TEXT,
+            summary TEXT,
+            user TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # Für die seitenweise Auflistung pro Benutzer (neueste zuerst, discussion_id als Tie-Breaker).
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_discussions_user_timestamp ON discussions (user, timestamp, discussion_id)")
+
+def migrate_discussion_messages(cursor: sqlite3.Cursor) -> None:
+    """
+    Version 2: Status- und Konfigurationsspalten sowie die Tabelle discussion_messages.
+    """
+    # Spalten für laufende/fortsetzbare Diskussionen; alte Zeilen gelten als abgeschlossen.
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(discussions)")}
+    for column, definition in (("status", "TEXT DEFAULT 'completed'"), ("config", "TEXT"), ("updated_at", "DATETIME")):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE discussions ADD COLUMN {column} {definition}")
+    # Append-only: ein Eintrag pro Chat-Nachricht, geschrieben nach jeder Iteration.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS discussion_messages (
+            discussion_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            turn INTEGER,
+            agent TEXT,
+            role TEXT,
+            content TEXT,
+            error TEXT,
+            summary TEXT,
+            summary_covered INTEGER,
+            duration_seconds REAL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (discussion_id, seq)
+        )
+    """)
+
+def migrate_discussion_search(cursor: sqlite3.Cursor) -> None:
+    """
+    Version 3: Volltextindex discussion_search, einmalig aus den vorhandenen Diskussionen befüllt.
+    """
+    if not sqlite_has_fts5():
+        logging.warning("SQLite ohne FTS5: Die Volltextsuche über gespeicherte Diskussionen ist deaktiviert.")
+        return
+    if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'discussion_search'").fetchone() is not None:
+        return
+    # Volltextindex; discussion_id wird nur mitgeführt. user ist indexiert, damit die Suche eines Benutzers
+    # nur dessen Zeilen bewertet statt aller Treffer. Präfix-Index für die Suche beim Tippen.
+    cursor.execute("""
+        CREATE VIRTUAL TABLE discussion_search USING fts5(
+            discussion_id UNINDEXED, user, topic, summary, content,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '3'
+        )
+    """)
+    # Einmalig vorhandene Diskussionen aufnehmen, danach wird der Index bei jedem Einfügen ergänzt.
+    for discussion_id, topic, summary, chat_history_value in cursor.execute(
+            "SELECT discussion_id, topic, summary, chat_history FROM discussions").fetchall():
+        index_discussion_search(cursor, discussion_id, topic, summary, searchable_contents(decode_chat_history(chat_history_value)))
+    cursor.execute("""
+        INSERT INTO discussion_search (discussion_id, user, content)
+        SELECT m.discussion_id, d.user, m.content FROM discussion_messages m JOIN discussions d ON d.discussion_id = m.discussion_id
+        WHERE m.role = 'assistant' AND m.error IS NULL
+    """)
+
+def migrate_discussion_ratings(cursor: sqlite3.Cursor) -> None:
+    """
+    Version 4: Tabelle discussion_ratings; übernimmt einmalig die Bewertungen aus RATING_DATA_FILE
+    (neben der Datenbankdatei), die danach nicht mehr geschrieben wird.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS discussion_ratings (
+            discussion_id TEXT NOT NULL,
+            iteration INTEGER NOT NULL,
+            agent TEXT NOT NULL,
+            upvotes INTEGER NOT NULL DEFAULT 0,
+            downvotes INTEGER NOT NULL DEFAULT 0,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (discussion_id, iteration, agent)
+        )
+    """)
+    db_path = cursor.execute("PRAGMA database_list").fetchone()[2]
+    rating_file = os.path.join(os.path.dirname(db_path), RATING_DATA_FILE)
+    if not os.path.exists(rating_file):
+        return
+    # JSON-Schlüssel der Iterationen sind Strings, in der Tabelle Ganzzahlen.
+    rows = [
+        (discussion_id, int(iteration), agent, votes.get("upvotes", 0), votes.get("downvotes", 0))
+        for discussion_id, iterations in load_json_data(rating_file).items()
+        for iteration, agents in iterations.items()
+        for agent, votes in agents.items()
+    ]
+    cursor.executemany("""
+        INSERT INTO discussion_ratings (discussion_id, iteration, agent, upvotes, downvotes) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (discussion_id, iteration, agent) DO UPDATE SET
+            upvotes = upvotes + excluded.upvotes, downvotes = downvotes + excluded.downvotes
+    """, rows)
+    logging.info(f"{len(rows)} Bewertungen aus '{rating_file}' übernommen.")
+
+def rebuild_agent_rating_stats(cursor: sqlite3.Cursor) -> None:
+    """
+    Berechnet agent_rating_stats vollständig aus discussion_ratings neu (Migration und Benchmark;
+    im Betrieb hält rate_agent_response die Zeilen pro Stimme aktuell).
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor in einer Schreibtransaktion.
+    """
+    cursor.execute("DELETE FROM agent_rating_stats")
+    # personality '' ist die Zeile über alle Persönlichkeiten eines Agenten.
+    cursor.execute("""
+        INSERT INTO agent_rating_stats (agent, personality, upvotes, downvotes, discussions, wilson_score)
+        SELECT agent, '', SUM(upvotes), SUM(downvotes), COUNT(DISTINCT discussion_id), wilson_lower_bound(SUM(upvotes), SUM(downvotes))
+        FROM discussion_ratings GROUP BY agent
+    """)
+    cursor.execute("""
+        INSERT INTO agent_rating_stats (agent, personality, upvotes, downvotes, discussions, wilson_score)
+        SELECT agent, personality, SUM(upvotes), SUM(downvotes), COUNT(DISTINCT discussion_id), wilson_lower_bound(SUM(upvotes), SUM(downvotes))
+        FROM discussion_ratings WHERE personality IS NOT NULL GROUP BY agent, personality
+    """)
+
+def migrate_agent_rating_stats(cursor: sqlite3.Cursor) -> None:
+    """
+    Version 5: Persönlichkeit pro Bewertung und vorberechnete Kennzahlen pro Agent bzw. Agent und
+    Persönlichkeit (agent_rating_stats), aus den vorhandenen Bewertungen aufgebaut.
+    """
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(discussion_ratings)")}
+    if "personality" not in columns:
+        cursor.execute("ALTER TABLE discussion_ratings ADD COLUMN personality TEXT")
+    # Für die Prüfung, ob eine Stimme die erste eines Agenten in einer Diskussion ist.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_discussion_ratings_agent ON discussion_ratings (discussion_id, agent, personality)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS agent_rating_stats (
+            agent TEXT NOT NULL,
+            personality TEXT NOT NULL DEFAULT '',
+            upvotes INTEGER NOT NULL DEFAULT 0,
+            downvotes INTEGER NOT NULL DEFAULT 0,
+            discussions INTEGER NOT NULL DEFAULT 0,
+            wilson_score REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (agent, personality)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_agent_rating_stats_score ON agent_rating_stats (personality, wilson_score)")
+    rebuild_agent_rating_stats(cursor)
+
+DISCUSSION_DB_MIGRATIONS = [migrate_discussions_table, migrate_discussion_messages, migrate_discussion_search, migrate_discussion_ratings, migrate_agent_rating_stats]
+DISCUSSION_DB_FUNCTIONS = [("wilson_lower_bound", 2, wilson_lower_bound)]
+
+@st.cache_resource(show_spinner=False)
+def _create_discussion_db(db_file: str) -> SQLiteDatabase:
+    database = SQLiteDatabase(db_file, DISCUSSION_DB_MIGRATIONS, journal_mode=DB_JOURNAL_MODE, busy_timeout=DB_BUSY_TIMEOUT_SECONDS,
+                              functions=DISCUSSION_DB_FUNCTIONS)
+    database.migrate()
+    return database
+
+def get_discussion_db() -> SQLiteDatabase:
+    """
+    Liefert die prozessweit geteilte Datenbank für DISCUSSION_DB_FILE (beim ersten Zugriff migriert).
+    Benchmarks, die DISCUSSION_DB_FILE auf eine temporäre Datei umstellen, erhalten eine eigene Instanz.
+
+    Returns:
+        SQLiteDatabase: Die Diskussionsdatenbank.
+    """
+    return _create_discussion_db(DISCUSSION_DB_FILE)
+
+def create_discussion_table():
+    """
+    Bringt das Schema der Diskussionsdatenbank auf den neuesten Stand (DISCUSSION_DB_MIGRATIONS).
+    """
+    get_discussion_db()
+
+def migrate_users_table(cursor: sqlite3.Cursor) -> None:
+    """
+    Version 1 der Benutzerdatenbank: Tabelle users (Benutzername eindeutig und indexiert); übernimmt
+    einmalig die Konten aus USER_DATA_FILE (neben der Datenbankdatei), die danach nicht mehr geschrieben wird.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL UNIQUE,
+            password_hash TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    db_path = cursor.execute("PRAGMA database_list").fetchone()[2]
+    user_file = os.path.join(os.path.dirname(db_path), USER_DATA_FILE)
+    if not os.path.exists(user_file):
+        return
+    rows = [(username, account["password"]) for username, account in load_json_data(user_file, USER_DATA_SCHEMA).items()]
+    cursor.executemany("INSERT OR IGNORE INTO users (username, password_hash) VALUES (?, ?)", rows)
+    logging.info(f"{len(rows)} Benutzer aus '{user_file}' übernommen.")
+
+USER_DB_MIGRATIONS = [migrate_users_table]
+
+@st.cache_resource(show_spinner=False)
+def _create_user_db(db_file: str) -> SQLiteDatabase:
+    database = SQLiteDatabase(db_file, USER_DB_MIGRATIONS, journal_mode=DB_JOURNAL_MODE, busy_timeout=DB_BUSY_TIMEOUT_SECONDS)
+    database.migrate()
+    return database
+
+def get_user_db() -> SQLiteDatabase:
+    """
+    Liefert die prozessweit geteilte Benutzerdatenbank für USER_DB_FILE (beim ersten Zugriff migriert).
+
+    Returns:
+        SQLiteDatabase: Die Benutzerdatenbank.
+    """
+    return _create_user_db(USER_DB_FILE)
+
+@instrumented("save_discussion_data_db")
+def save_discussion_data_db(discussion_id: str, topic: str, agents: List[str], chat_history: List[Dict], summary: str, user: str = None) -> None:
+    """
+    Speichert Diskussionsdaten in der SQLite-Datenbank.
+
+    Args:
+        discussion_id (str): Die ID der Diskussion.
+        topic (str): Das Thema der Diskussion.
+        agents (List[str]): Die Liste der beteiligten Agenten.
+        chat_history (List[Dict]): Der Chatverlauf der Diskussion.
+        summary (str): Die Zusammenfassung der Diskussion.
+        user (str, optional): Der Benutzer, der die Diskussion gestartet hat.
+    """
+    try:
+        with get_discussion_db().transaction() as cursor:
+            cursor.execute("""
+                INSERT INTO discussions (discussion_id, topic, agents, chat_history, summary, user)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (discussion_id, topic, json.dumps(agents), encode_chat_history(chat_history), summary, user))
+            index_discussion_search(cursor, discussion_id, topic, summary, searchable_contents(chat_history))
+    except sqlite3.Error as e:
+        logging.error(f"Datenbankfehler beim Speichern der Diskussion '{discussion_id}': {e}")
+
+def migrate_chat_history_codec(batch_size: int = 500, vacuum: bool = True) -> Dict[str, Any]:
+    """
+    Einmalige Migration: kodiert alle Zeilen, deren chat_history noch im alten Format (JSON-Text oder ältere
+    Formatversion) vorliegt, mit encode_chat_history. Jeder Stapel ist eine eigene Transaktion, ein Abbruch
+    kann also einfach wiederholt werden. VACUUM gibt den frei gewordenen Platz an das Dateisystem zurück.
+
+    Args:
+        batch_size (int, optional): Zeilen pro Transaktion.
+        vacuum (bool, optional): Datenbankdatei anschließend verkleinern.
+
+    Returns:
+        Dict[str, Any]: Umgewandelte Zeilen, Bytes der Spalte vorher/nachher, Dateigröße vorher/nachher und Dauer.
+    """
+    started = time.perf_counter()
+    database = get_discussion_db()
+    conn = database.connection()
+    file_bytes_before = database.file_size()
+    result = {"rows": 0, "column_bytes_before": 0, "column_bytes_after": 0}
+    last_rowid = 0
+    while True:
+        rows = conn.execute("""
+            SELECT rowid, chat_history FROM discussions
+            WHERE rowid > ? AND chat_history IS NOT NULL
+              AND (typeof(chat_history) = 'text' OR substr(chat_history, 1, 1) != ?)
+            ORDER BY rowid LIMIT ?
+        """, (last_rowid, bytes([CHAT_HISTORY_CODEC_VERSION]), batch_size)).fetchall()
+        if not rows:
+            break
+        updates = []
+        for rowid, value in rows:
+            encoded = encode_chat_history(decode_chat_history(value))
+            result["column_bytes_before"] += len(value.encode("utf-8") if isinstance(value, str) else value)
+            result["column_bytes_after"] += len(encoded)
+            updates.append((encoded, rowid))
+        with database.transaction() as cursor:
+            cursor.executemany("UPDATE discussions SET chat_history = ? WHERE rowid = ?", updates)
+        result["rows"] += len(rows)
+        last_rowid = rows[-1][0]
+        logging.info(f"chat_history-Migration: {result['rows']} Zeilen umgewandelt.")
+    if vacuum and result["rows"]:
+        conn.execute("VACUUM")
+    result.update({
+        "file_bytes_before": file_bytes_before,
+        "file_bytes_after": database.file_size(),
+        "seconds": round(time.perf_counter() - started, 3),
+    })
+    return result
+
+def read_chat_history(cursor: sqlite3.Cursor, discussion_id: str, chat_history_value: Union[str, bytes, None]) -> List[Dict[str, str]]:
+    """
+    Chatverlauf einer Diskussion: aus der Spalte chat_history (ältere und manuell gespeicherte Diskussionen,
+    JSON-Text oder kodiert) oder, falls diese leer ist, aus der Tabelle discussion_messages.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor der offenen Verbindung.
+        discussion_id (str): Die ID der Diskussion.
+        chat_history_value (Union[str, bytes, None]): Inhalt der Spalte chat_history.
+
+    Returns:
+        List[Dict[str, str]]: Der Chatverlauf.
+    """
+    if chat_history_value:
+        return decode_chat_history(chat_history_value)
+    cursor.execute("SELECT role, content, error, summary, summary_covered FROM discussion_messages WHERE discussion_id = ? ORDER BY seq", (discussion_id,))
+    return expand_discussion_messages(cursor.fetchall())
+
+def format_prompt_message(agent_name: str, iteration: int, topic: str, summary: str, has_file: bool) -> str:
+    """
+    Eintrag im Chatverlauf für den Prompt eines Agenten.
+
+    Args:
+        agent_name (str): Name des Agenten.
+        iteration (int): Nummer der Iteration bzw. Runde (ab 1).
+        topic (str): Das Thema der Konversation.
+        summary (str): Die Zusammenfassung, die der Agent erhalten hat.
+        has_file (bool): Ob eine Datei angehängt ist.
+
+    Returns:
+        str: Der Inhalt der Chat-Nachricht.
+    """
+    return f"Agent {agent_name} (Iteration {iteration}): Thema {topic}, Zusammenfassung bis Runde {iteration - 1}: {summary}, Datei: {'vorhanden' if has_file else 'nicht vorhanden'}"
+
+def expand_discussion_messages(rows: List[Tuple[str, str, str, str, int]]) -> List[Dict[str, str]]:
+    """
+    Chatverlauf aus Zeilen von discussion_messages. Der Motor speichert Prompts mit PROMPT_SUMMARY_PLACEHOLDER
+    statt der Zusammenfassung (erkennbar an summary_covered) und die Zusammenfassung nur, wenn sie sich
+    geändert hat; hier wird jeweils die zuletzt gespeicherte wieder eingesetzt. Ältere Zeilen bleiben unverändert.
+
+    Args:
+        rows (List[Tuple[str, str, str, str, int]]): (role, content, error, summary, summary_covered) in seq-Reihenfolge.
+
+    Returns:
+        List[Dict[str, str]]: Der Chatverlauf.
+    """
+    messages = []
+    current_summary = ""
+    for role, content, error, summary, summary_covered in rows:
+        if summary is not None:
+            current_summary = summary
+        if role == "user" and summary_covered is not None:
+            # Letztes Vorkommen: das Thema davor könnte den Platzhalter zufällig enthalten.
+            head, _, tail = content.rpartition(PROMPT_SUMMARY_PLACEHOLDER)
+            content = head + current_summary + tail
+        messages.append({"role": role, "content": content, **({"error": error} if error else {})})
+    return messages
+
+@instrumented("load_discussion_data_db")
+def load_discussion_data_db(user: str = None) -> Dict[str, Any]:
+    """
+    Lädt Diskussionsdaten aus der SQLite-Datenbank.
+
+    Args:
+        user (str, optional): Der Benutzer, dessen Diskussionen geladen werden sollen.
+
+    Returns:
+        Dict[str, Any]: Die geladenen Diskussionsdaten.
+    """
+    discussions = {}
+    try:
+        cursor = get_discussion_db().connection().cursor()
+        columns = "discussion_id, topic, agents, chat_history, summary, user, timestamp, status"
+        if user:
+            cursor.execute(f"SELECT {columns} FROM discussions WHERE user = ?", (user,))
+        else:
+            cursor.execute(f"SELECT {columns} FROM discussions")
+        rows = cursor.fetchall()
+        for row in rows:
+            disc_id, topic, agents_json, chat_history_value, summary, user_name, timestamp, status = row
+            agents = json.loads(agents_json) if agents_json else []
+            discussions[disc_id] = {
+                "topic": topic,
+                "agents": agents,
+                "chat_history": read_chat_history(cursor, disc_id, chat_history_value),
+                "summary": summary,
+                "user": user_name,
+                "timestamp": timestamp,
+                "status": status
+            }
+    except sqlite3.Error as e:
+        logging.error(f"Datenbankfehler beim Laden der Diskussionen: {e}")
+    return discussions
+
+# Fortsetzbar sind abgebrochene Diskussionen und laufende, deren letzter Fortschritt älter als
+# DISCUSSION_RESUME_STALE_SECONDS ist (Parameter: datetime-Modifikator wie "-900 seconds").
+RESUMABLE_CONDITION = "(status = 'interrupted' OR (status = 'running' AND COALESCE(updated_at, timestamp) < datetime('now', ?)))"
+
+@instrumented("list_discussions_db")
+def list_discussions_db(user: str = None, limit: int = DISCUSSION_PAGE_SIZE, before: Tuple[str, str] = None) -> Tuple[List[Dict[str, Any]], Tuple[str, str]]:
+    """
+    Listet Diskussionen ohne Chatverlauf, neueste zuerst, mit Keyset-Paginierung über
+    (timestamp, discussion_id) und dem Index idx_discussions_user_timestamp.
+
+    Args:
+        user (str, optional): Nur Diskussionen dieses Benutzers; None für alle.
+        limit (int, optional): Anzahl der Einträge pro Seite.
+        before (Tuple[str, str], optional): Cursor der vorherigen Seite; None für die erste Seite.
+
+    Returns:
+        Tuple[List[Dict[str, Any]], Tuple[str, str]]: Die Einträge (discussion_id, topic, agents, timestamp,
+            summary_preview, status, resumable) und der Cursor für die nächste Seite (None, wenn es keine weitere gibt).
+    """
+    conditions, params = [], []
+    if user:
+        conditions.append("user = ?")
+        params.append(user)
+    if before is not None:
+        conditions.append("(timestamp, discussion_id) < (?, ?)")
+        params.extend(before)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = []
+    try:
+        cursor = get_discussion_db().connection().cursor()
+        # Eine Zeile mehr laden, um zu erkennen, ob eine weitere Seite existiert.
+        cursor.execute(f"""
+            SELECT discussion_id, topic, agents, timestamp, substr(summary, 1, ?), status, {RESUMABLE_CONDITION}
+            FROM discussions {where}
+            ORDER BY timestamp DESC, discussion_id DESC
+            LIMIT ?
+        """, (DISCUSSION_SUMMARY_PREVIEW_CHARS, f"-{DISCUSSION_RESUME_STALE_SECONDS} seconds", *params, limit + 1))
+        rows = cursor.fetchall()
+    except sqlite3.Error as e:
+        logging.error(f"Datenbankfehler beim Auflisten der Diskussionen: {e}")
+    entries = [
+        {"discussion_id": disc_id, "topic": topic, "agents": json.loads(agents_json) if agents_json else [], "timestamp": timestamp, "summary_preview": preview, "status": status, "resumable": bool(resumable)}
+        for disc_id, topic, agents_json, timestamp, preview, status, resumable in rows[:limit]
+    ]
+    next_cursor = (entries[-1]["timestamp"], entries[-1]["discussion_id"]) if len(rows) > limit else None
+    return entries, next_cursor
+
+def build_search_query(text: str) -> str:
+    """
+    Wandelt eine Eingabe in eine FTS5-Abfrage über Thema, Zusammenfassung und Antworten um: alle Wörter
+    müssen vorkommen, ein Wort mit angehängtem "*" als Präfix. Wörter werden in Anführungszeichen
+    gesetzt, andere Operatoren und Sonderzeichen der Eingabe wirken nicht.
+
+    Args:
+        text (str): Die Sucheingabe.
+
+    Returns:
+        str: Die FTS5-Abfrage oder "", wenn die Eingabe keine Wörter enthält.
+    """
+    # Präfixe nur auf Wunsch: ohne passenden Präfix-Index müsste FTS5 die Trefferlisten aller Varianten zusammenführen.
+    terms = re.findall(r"(\w+)(\*?)", text)
+    if not terms:
+        return ""
+    phrases = " ".join(f'"{term}"{star}' for term, star in terms)
+    return f"{{topic summary content}} : ({phrases})"
+
+@instrumented("search_discussions_db")
+def search_discussions_db(text: str, user: str = None, limit: int = DISCUSSION_SEARCH_LIMIT) -> List[Dict[str, Any]]:
+    """
+    Volltextsuche über Thema, Zusammenfassung und Agentenantworten, nach BM25 gerankt (DISCUSSION_SEARCH_WEIGHTS).
+    Jede Diskussion erscheint einmal, mit dem Textausschnitt ihres besten Treffers.
+
+    Args:
+        text (str): Die Sucheingabe.
+        user (str, optional): Nur Diskussionen dieses Benutzers; None für alle.
+        limit (int, optional): Maximale Anzahl der Treffer.
+
+    Returns:
+        List[Dict[str, Any]]: Treffer (discussion_id, topic, timestamp, status, snippet, score), bester zuerst.
+    """
+    query = build_search_query(text)
+    if not query or not discussion_search_available():
+        return []
+    match = query
+    user_filter = ""
+    if user:
+        # Über die indexierte Spalte user werden nur die Zeilen des Benutzers bewertet; der Join prüft exakt.
+        quoted_user = user.replace('"', '""')
+        match = f'user : "{quoted_user}" AND {query}'
+        user_filter = "WHERE d.user = ?"
+    hits = []
+    try:
+        cursor = get_discussion_db().connection().cursor()
+        # bm25() ist nur in der Abfrage auf der FTS-Tabelle selbst erlaubt, daher zuerst materialisieren.
+        # Bei MIN() stammen die übrigen Spalten aus der Zeile mit dem besten Wert.
+        cursor.execute(f"""
+            WITH matches AS MATERIALIZED (
+                SELECT rowid AS match_rowid, discussion_id, bm25(discussion_search, 0.0, 0.0, ?, ?, ?) AS score
+                FROM discussion_search WHERE discussion_search MATCH ?
+            )
+            SELECT m.discussion_id, MIN(m.score) AS best_score, m.match_rowid, d.topic, d.timestamp, d.status
+            FROM matches m JOIN discussions d ON d.discussion_id = m.discussion_id
+            {user_filter}
+            GROUP BY m.discussion_id
+            ORDER BY best_score
+            LIMIT ?
+        """, (*DISCUSSION_SEARCH_WEIGHTS, match, *([user] if user else []), limit))
+        for disc_id, score, match_rowid, topic, timestamp, status in cursor.fetchall():
+            snippet = cursor.execute(
+                "SELECT snippet(discussion_search, -1, '**', '**', ' … ', ?) FROM discussion_search WHERE discussion_search MATCH ? AND rowid = ?",
+                (DISCUSSION_SEARCH_SNIPPET_TOKENS, query, match_rowid)
+            ).fetchone()[0]
+            hits.append({"discussion_id": disc_id, "topic": topic, "timestamp": timestamp, "status": status, "snippet": snippet, "score": score})
+    except sqlite3.Error as e:
+        logging.error(f"Datenbankfehler bei der Suche nach '{text}': {e}")
+    return hits
+
+@instrumented("load_discussion_db")
+def load_discussion_db(discussion_id: str, user: str = None) -> Dict[str, Any]:
+    """
+    Lädt eine einzelne Diskussion vollständig (mit Chatverlauf), z.B. beim Öffnen aus der Liste.
+
+    Args:
+        discussion_id (str): Die ID der Diskussion.
+        user (str, optional): Wenn angegeben, nur eine Diskussion dieses Benutzers.
+
+    Returns:
+        Dict[str, Any]: Die Diskussion oder None, wenn sie nicht existiert.
+    """
+    query = "SELECT topic, agents, chat_history, summary, user, timestamp, status, config FROM discussions WHERE discussion_id = ?"
+    params = [discussion_id]
+    if user:
+        query += " AND user = ?"
+        params.append(user)
+    discussion = None
+    try:
+        cursor = get_discussion_db().connection().cursor()
+        cursor.execute(query, params)
+        row = cursor.fetchone()
+        if row is not None:
+            topic, agents_json, chat_history_value, summary, user_name, timestamp, status, config_json = row
+            discussion = {
+                "discussion_id": discussion_id,
+                "topic": topic,
+                "agents": json.loads(agents_json) if agents_json else [],
+                "chat_history": read_chat_history(cursor, discussion_id, chat_history_value),
+                "summary": summary,
+                "user": user_name,
+                "timestamp": timestamp,
+                "status": status,
+                "config": json.loads(config_json) if config_json else None
+            }
+    except sqlite3.Error as e:
+        logging.error(f"Datenbankfehler beim Laden der Diskussion '{discussion_id}': {e}")
+    return discussion
+
+def new_discussion_id() -> str:
+    """
+    Erzeugt eine eindeutige Diskussions-ID: Startzeitpunkt (sortierbar) und ein zufälliges Suffix,
+    damit innerhalb derselben Sekunde gestartete Diskussionen sich nicht überschreiben.
+
+    Returns:
+        str: Die ID, z.B. "20240101_120000_1a2b3c4d".
+    """
+    return f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+def start_discussion_db(discussion_id: str, topic: str, agents: List[str], user: str, config: Dict[str, Any], resume: bool = False) -> None:
+    """
+    Legt eine laufende Diskussion an (Status "running") bzw. setzt eine fortgesetzte wieder auf "running".
+    Die Nachrichten folgen mit append_discussion_messages_db.
+
+    Args:
+        discussion_id (str): Die ID der Diskussion.
+        topic (str): Das Thema der Diskussion.
+        agents (List[str]): Die Namen der beteiligten Agenten.
+        user (str): Der Benutzer, der die Diskussion gestartet hat.
+        config (Dict[str, Any]): Parameter zum Fortsetzen (Agenten, Iterationen, Sprache, Modi).
+        resume (bool, optional): Fortsetzung einer bestehenden Diskussion; nur dann wird eine vorhandene
+            Zeile übernommen, und nur, wenn sie demselben Benutzer gehört.
+    """
+    params = (discussion_id, topic, json.dumps(agents), user, json.dumps(config, ensure_ascii=False))
+    try:
+        with get_discussion_db().transaction() as cursor:
+            if resume:
+                cursor.execute("""
+                    INSERT INTO discussions (discussion_id, topic, agents, user, status, config, updated_at)
+                    VALUES (?, ?, ?, ?, 'running', ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT(discussion_id) DO UPDATE SET status = 'running', updated_at = CURRENT_TIMESTAMP
+                    WHERE discussions.user = excluded.user
+                """, params)
+            else:
+                # Neue Diskussion: ein reines INSERT, eine vorhandene ID führt zu einem Fehler statt zum Überschreiben.
+                cursor.execute("""
+                    INSERT INTO discussions (discussion_id, topic, agents, user, status, config, updated_at)
+                    VALUES (?, ?, ?, ?, 'running', ?, CURRENT_TIMESTAMP)
+                """, params)
+                index_discussion_search(cursor, discussion_id, topic)
+    except sqlite3.Error as e:
+        logging.error(f"Datenbankfehler beim Anlegen der Diskussion '{discussion_id}': {e}")
+
+@instrumented("append_discussion_messages_db")
+def append_discussion_messages_db(discussion_id: str, messages: List[Dict[str, Any]]) -> None:
+    """
+    Hängt die Nachrichten einer Iteration in einer Transaktion an (alle oder keine).
+
+    Args:
+        discussion_id (str): Die ID der Diskussion.
+        messages (List[Dict[str, Any]]): Nachrichten mit role und content sowie optional turn, agent,
+            error, summary, summary_covered (Stand der rollierenden Zusammenfassung) und duration_seconds.
+    """
+    try:
+        with get_discussion_db().transaction() as cursor:
+            next_seq = cursor.execute("SELECT COALESCE(MAX(seq), -1) + 1 FROM discussion_messages WHERE discussion_id = ?", (discussion_id,)).fetchone()[0]
+            cursor.executemany("""
+                INSERT INTO discussion_messages (discussion_id, seq, turn, agent, role, content, error, summary, summary_covered, duration_seconds)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (discussion_id, next_seq + offset, m.get("turn"), m.get("agent"), m["role"], m["content"], m.get("error"),
+                 m.get("summary"), m.get("summary_covered"), m.get("duration_seconds"))
+                for offset, m in enumerate(messages)
+            ])
+            index_discussion_search(cursor, discussion_id, contents=searchable_contents(messages))
+            cursor.execute("UPDATE discussions SET updated_at = CURRENT_TIMESTAMP WHERE discussion_id = ?", (discussion_id,))
+    except sqlite3.Error as e:
+        logging.error(f"Datenbankfehler beim Anhängen an Diskussion '{discussion_id}': {e}")
+
+def finish_discussion_db(discussion_id: str, status: str, summary: str = None) -> None:
+    """
+    Setzt den Status einer Diskussion ("completed" oder "interrupted") und ggf. die Gesamtzusammenfassung.
+
+    Args:
+        discussion_id (str): Die ID der Diskussion.
+        status (str): Der neue Status.
+        summary (str, optional): Die Gesamtzusammenfassung (nur bei "completed").
+    """
+    try:
+        with get_discussion_db().transaction() as cursor:
+            cursor.execute(
+                "UPDATE discussions SET status = ?, summary = COALESCE(?, summary), updated_at = CURRENT_TIMESTAMP WHERE discussion_id = ?",
+                (status, summary, discussion_id)
+            )
+            if summary:
+                index_discussion_search(cursor, discussion_id, summary=summary)
+    except sqlite3.Error as e:
+        logging.error(f"Datenbankfehler beim Abschließen der Diskussion '{discussion_id}': {e}")
+
+def claim_discussion_resume_db(discussion_id: str, user: str) -> bool:
+    """
+    Übernimmt eine fortsetzbare Diskussion (siehe RESUMABLE_CONDITION) in einer Transaktion und setzt sie
+    auf "running". Gleichzeitige Versuche, dieselbe Diskussion fortzusetzen, gelingen so nur einmal.
+
+    Args:
+        discussion_id (str): Die ID der Diskussion.
+        user (str): Der Benutzer; nur eigene Diskussionen können fortgesetzt werden.
+
+    Returns:
+        bool: True, wenn die Diskussion übernommen wurde.
+    """
+    try:
+        with get_discussion_db().transaction() as cursor:
+            cursor.execute(
+                f"UPDATE discussions SET status = 'running', updated_at = CURRENT_TIMESTAMP WHERE discussion_id = ? AND user = ? AND {RESUMABLE_CONDITION}",
+                (discussion_id, user, f"-{DISCUSSION_RESUME_STALE_SECONDS} seconds")
+            )
+            return cursor.rowcount == 1
+    except sqlite3.Error as e:
+        logging.error(f"Datenbankfehler beim Fortsetzen der Diskussion '{discussion_id}': {e}")
+        return False
+
+def load_resume_state_db(discussion_id: str, user: str = None) -> Dict[str, Any]:
+    """
+    Stellt den Zustand einer nicht abgeschlossenen Diskussion aus discussion_messages wieder her:
+    Chatverlauf, Beiträge, rollierende Zusammenfassung, letzte Antwort pro Agent und die Anzahl
+    der abgeschlossenen Runden (jede Runde wird in einer Transaktion geschrieben).
+
+    Args:
+        discussion_id (str): Die ID der Diskussion.
+        user (str, optional): Wenn angegeben, nur eine Diskussion dieses Benutzers.
+
+    Returns:
+        Dict[str, Any]: topic, config, chat_history, turns, agent_outputs, summary_state und completed_rounds;
+            None, wenn die Diskussion fehlt, abgeschlossen ist oder nicht inkrementell gespeichert wurde.
+    """
+    discussion = load_discussion_db(discussion_id, user)
+    if discussion is None or discussion["status"] == "completed" or not discussion["config"]:
+        return None
+    try:
+        rows = get_discussion_db().connection().execute("""
+            SELECT turn, agent, role, content, error, summary, summary_covered
+            FROM discussion_messages WHERE discussion_id = ? ORDER BY seq
+        """, (discussion_id,)).fetchall()
+    except sqlite3.Error as e:
+        logging.error(f"Datenbankfehler beim Laden der Nachrichten von '{discussion_id}': {e}")
+        return None
+
+    agent_names = [agent["name"] for agent in discussion["config"]["selected_agents"]]
+    agent_outputs = [""] * len(agent_names)
+    turns = []
+    summary_state = {"text": discussion["config"].get("initial_summary", ""), "covered": 0}
+    current_summary = summary_state["text"]
+    completed_rounds = 0
+    for turn, agent, role, content, error, summary, summary_covered in rows:
+        # Eine Zusammenfassung wird nur bei Änderung gespeichert (auch an Prompts); sonst gilt die vorherige.
+        if summary is not None:
+            current_summary = summary
+        if role != "assistant" or turn is None:
+            continue
+        completed_rounds = max(completed_rounds, turn)
+        if summary is not None or summary_covered is not None:
+            summary_state = {"text": current_summary, "covered": summary_covered or 0}
+        if error:
+            continue
+        # content ist die Chat-Nachricht; die Antwort selbst steht hinter dem festen Präfix des Motors.
+        prefix = f"Antwort von Agent {agent} (Iteration {turn}):\n"
+        output = content[len(prefix):] if content.startswith(prefix) else content
+        turns.append((agent, output))
+        if agent in agent_names:
+            agent_outputs[agent_names.index(agent)] = output
+    return {
+        "topic": discussion["topic"],
+        "config": discussion["config"],
+        "chat_history": discussion["chat_history"],
+        "turns": turns,
+        "agent_outputs": agent_outputs,
+        "summary_state": summary_state,
+        "completed_rounds": completed_rounds,
+    }
+
+def evaluate_response(response: str) -> str:
+    """
+    Bewertet eine Antwort basierend auf bestimmten Schlüsselwörtern.
+
+    Args:
+        response (str): Die zu bewertende Antwort.
+
+    Returns:
+        str: Die Bewertung der Antwort ("schlechte antwort", "gute antwort", "neutral").
+    """
+    resp_l = response.lower()
+    if "wiederhole mich" in resp_l:
+        return "schlechte antwort"
+    elif "neue perspektive" in resp_l:
+        return "gute antwort"
+    else:
+        return "neutral"
+
+def rate_agent_response(discussion_id: str, iteration: int, agent_name: str, rating_type: str, personality: str = None) -> bool:
+    """
+    Bewertet die Antwort eines Agenten. Die Stimme wird als atomares Upsert in discussion_ratings
+    gezählt, gleichzeitige Stimmen aus mehreren Sitzungen oder Prozessen gehen nicht verloren. In derselben
+    Transaktion werden die Kennzahlen in agent_rating_stats für den Agenten und, falls bekannt, für den
+    Agenten mit dieser Persönlichkeit fortgeschrieben (konstanter Aufwand pro Stimme).
+
+    Args:
+        discussion_id (str): Die ID der Diskussion.
+        iteration (int): Die Iteration der Antwort.
+        agent_name (str): Der Name des Agenten.
+        rating_type (str): Der Typ der Bewertung ("upvote" oder "downvote").
+        personality (str, optional): Die Persönlichkeit, mit der der Agent geantwortet hat.
+
+    Returns:
+        bool: True, wenn die Stimme gespeichert wurde.
+    """
+    if rating_type not in ("upvote", "downvote"):
+        logging.warning(f"Unbekannter Bewertungstyp '{rating_type}' ignoriert.")
+        return False
+    upvote = int(rating_type == "upvote")
+    try:
+        with get_discussion_db().transaction() as cursor:
+            # Erste Stimme für den Agenten (bzw. Agent und Persönlichkeit) in dieser Diskussion?
+            new_discussion = cursor.execute(
+                "SELECT NOT EXISTS (SELECT 1 FROM discussion_ratings WHERE discussion_id = ? AND agent = ?)", (discussion_id, agent_name)).fetchone()[0]
+            stats = [(agent_name, "", upvote, 1 - upvote, new_discussion, upvote, 1 - upvote)]
+            if personality:
+                new_personality_discussion = cursor.execute(
+                    "SELECT NOT EXISTS (SELECT 1 FROM discussion_ratings WHERE discussion_id = ? AND agent = ? AND personality = ?)",
+                    (discussion_id, agent_name, personality)).fetchone()[0]
+                stats.append((agent_name, personality, upvote, 1 - upvote, new_personality_discussion, upvote, 1 - upvote))
+            cursor.execute("""
+                INSERT INTO discussion_ratings (discussion_id, iteration, agent, upvotes, downvotes, personality) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (discussion_id, iteration, agent) DO UPDATE SET
+                    upvotes = upvotes + excluded.upvotes, downvotes = downvotes + excluded.downvotes,
+                    personality = COALESCE(personality, excluded.personality), updated_at = CURRENT_TIMESTAMP
+            """, (discussion_id, int(iteration), agent_name, upvote, 1 - upvote, personality))
+            cursor.executemany("""
+                INSERT INTO agent_rating_stats (agent, personality, upvotes, downvotes, discussions, wilson_score)
+                VALUES (?, ?, ?, ?, ?, wilson_lower_bound(?, ?))
+                ON CONFLICT (agent, personality) DO UPDATE SET
+                    upvotes = upvotes + excluded.upvotes, downvotes = downvotes + excluded.downvotes,
+                    discussions = discussions + excluded.discussions,
+                    wilson_score = wilson_lower_bound(upvotes + excluded.upvotes, downvotes + excluded.downvotes)
+            """, stats)
+    except sqlite3.Error as e:
+        logging.error(f"Datenbankfehler beim Bewerten von '{agent_name}' in Diskussion '{discussion_id}': {e}")
+        return False
+    return True
+
+def load_ratings_db(discussion_id: str) -> Dict[int, Dict[str, Dict[str, int]]]:
+    """
+    Lädt die Bewertungen einer Diskussion.
+
+    Args:
+        discussion_id (str): Die ID der Diskussion.
+
+    Returns:
+        Dict[int, Dict[str, Dict[str, int]]]: Iteration -> Agent -> {"upvotes", "downvotes"}.
+    """
+    ratings = defaultdict(dict)
+    try:
+        for iteration, agent, upvotes, downvotes in get_discussion_db().connection().execute(
+                "SELECT iteration, agent, upvotes, downvotes FROM discussion_ratings WHERE discussion_id = ?", (discussion_id,)):
+            ratings[iteration][agent] = {"upvotes": upvotes, "downvotes": downvotes}
+    except sqlite3.Error as e:
+        logging.error(f"Datenbankfehler beim Laden der Bewertungen von '{discussion_id}': {e}")
+    return dict(ratings)
+
+@instrumented("agent_leaderboard_db")
+def agent_leaderboard_db(personality: str = None, min_votes: int = LEADERBOARD_MIN_VOTES, limit: int = LEADERBOARD_SIZE) -> List[Dict[str, Any]]:
+    """
+    Bestenliste der Agenten nach Wilson-Untergrenze aus den vorberechneten Kennzahlen; der Aufwand hängt
+    von der Zahl der Agenten ab, nicht von der Zahl der Stimmen.
+
+    Args:
+        personality (str, optional): Nur Stimmen für diese Persönlichkeit; None für alle.
+        min_votes (int, optional): Agenten mit weniger Stimmen werden ausgelassen.
+        limit (int, optional): Maximale Anzahl der Einträge.
+
+    Returns:
+        List[Dict[str, Any]]: Einträge (agent, personality, upvotes, downvotes, votes, discussions, wilson_score), bester zuerst.
+    """
+    try:
+        rows = get_discussion_db().connection().execute("""
+            SELECT agent, personality, upvotes, downvotes, discussions, wilson_score FROM agent_rating_stats
+            WHERE personality = ? AND upvotes + downvotes >= ?
+            ORDER BY wilson_score DESC, agent
+            LIMIT ?
+        """, (personality or "", min_votes, limit)).fetchall()
+    except sqlite3.Error as e:
+        logging.error(f"Datenbankfehler beim Laden der Bestenliste: {e}")
+        return []
+    return [
+        {"agent": agent, "personality": personality_name or None, "upvotes": upvotes, "downvotes": downvotes,
+         "votes": upvotes + downvotes, "discussions": discussions, "wilson_score": round(score, 4)}
+        for agent, personality_name, upvotes, downvotes, discussions, score in rows
+    ]
+
+def agent_rating_stats_db(agent_name: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Kennzahlen eines Agenten insgesamt und pro Persönlichkeit.
+
+    Args:
+        agent_name (str): Der Name des Agenten.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Persönlichkeit ("" für insgesamt) -> upvotes, downvotes, discussions, wilson_score.
+    """
+    try:
+        rows = get_discussion_db().connection().execute(
+            "SELECT personality, upvotes, downvotes, discussions, wilson_score FROM agent_rating_stats WHERE agent = ?", (agent_name,)).fetchall()
+    except sqlite3.Error as e:
+        logging.error(f"Datenbankfehler beim Laden der Kennzahlen von '{agent_name}': {e}")
+        return {}
+    return {
+        personality: {"upvotes": upvotes, "downvotes": downvotes, "discussions": discussions, "wilson_score": round(score, 4)}
+        for personality, upvotes, downvotes, discussions, score in rows
+    }
+
+def api_key_fingerprint(api_key: str) -> str:
+    """
+    Liefert einen kurzen, nicht umkehrbaren Bezeichner für einen API-Schlüssel (für Logs und Konfiguration).
+
+    Args:
+        api_key (str): Der API-Schlüssel.
+
+    Returns:
+        str: Die ersten 12 Zeichen des SHA-256-Hashes des Schlüssels.
+    """
+    return hashlib.sha256((api_key or "").encode()).hexdigest()[:12]
+
+def estimate_tokens(contents: list) -> int:
+    """
+    Schätzt die Anzahl der Prompt-Tokens einer Anfrage.
+
+    Args:
+        contents (list): Die Inhalte, die an die API gesendet werden sollen.
+
+    Returns:
+        int: Die geschätzte Anzahl an Tokens (mindestens 1).
+    """
+    tokens = 0
+    for item in contents:
+        if isinstance(item, str):
+            tokens += len(item) // CHARS_PER_TOKEN
+        else:
+            tokens += FILE_PART_TOKEN_ESTIMATE
+    return max(tokens, 1)
+
+_sleep_lock = threading.Lock()
+_sleep_seconds_total = 0.0
+
+def tracked_sleep(seconds: float) -> None:
+    """
+    Schläft und verbucht die Wartezeit prozessweit (für Benchmarks, siehe get_sleep_seconds_total).
+
+    Args:
+        seconds (float): Die Wartezeit in Sekunden.
+    """
+    global _sleep_seconds_total
+    time.sleep(seconds)
+    with _sleep_lock:
+        _sleep_seconds_total += seconds
+
+def get_sleep_seconds_total() -> float:
+    """
+    Returns:
+        float: Die in diesem Prozess insgesamt durch Ratenbegrenzung und Backoff verschlafene Zeit.
+    """
+    with _sleep_lock:
+        return _sleep_seconds_total
+
+def contents_size_bytes(contents: list) -> int:
+    """
+    Anzahl der Bytes, die für diese Inhalte übertragen werden (Text als UTF-8, Datei-Parts roh).
+
+    Args:
+        contents (list): Die Inhalte einer Anfrage.
+
+    Returns:
+        int: Die Größe in Bytes.
+    """
+    size = 0
+    for item in contents:
+        if isinstance(item, str):
+            size += len(item.encode("utf-8"))
+        else:
+            size += len(getattr(getattr(item, "inline_data", None), "data", b"") or b"")
+    return size
+
+class TokenBucket:
+    """
+    Einfacher Token-Bucket: füllt sich kontinuierlich bis zur Kapazität auf.
+    Nicht threadsicher, die Synchronisation übernimmt der RateLimiter.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+            self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Sekunden, bis `amount` Tokens verfügbar sind (0, wenn sofort verfügbar)."""
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_per_second
+
+    def fill_level(self) -> float:
+        return max(0.0, self.tokens) / self.capacity
+
+class RateLimiter:
+    """
+    Prozessweiter Ratenbegrenzer mit je einem Requests- und Tokens-pro-Minute-Bucket
+    pro (API-Schlüssel, Modell). Wird über get_rate_limiter() von allen Sessions geteilt.
+    """
+
+    def __init__(self, config: Dict[str, Any] = None):
+        config = config or {}
+        self._model_limits = dict(RATE_LIMITS)
+        self._model_limits.update(config.get("models", {}))
+        self._key_limits = config.get("api_keys", {})
+        self._buckets: Dict[Tuple[str, str], Dict[str, TokenBucket]] = {}
+        self._lock = threading.Lock()
+
+    def limits_for(self, api_key: str, model: str) -> Dict[str, int]:
+        """
+        Ermittelt das Kontingent für einen Schlüssel und ein Modell.
+        Schlüsselspezifische Einträge (per Fingerprint) haben Vorrang vor Modell-Einträgen.
+        """
+        limits = dict(DEFAULT_RATE_LIMIT)
+        limits.update(self._model_limits.get(model, {}))
+        key_limits = self._key_limits.get(api_key_fingerprint(api_key), {})
+        limits.update(key_limits.get("*", {}))
+        limits.update(key_limits.get(model, {}))
+        return limits
+
+    def _get_buckets(self, api_key: str, model: str) -> Dict[str, TokenBucket]:
+        bucket_key = (api_key_fingerprint(api_key), model)
+        buckets = self._buckets.get(bucket_key)
+        if buckets is None:
+            limits = self.limits_for(api_key, model)
+            buckets = {
+                "rpm": TokenBucket(limits["rpm"], limits["rpm"] / 60.0),
+                "tpm": TokenBucket(limits["tpm"], limits["tpm"] / 60.0),
+            }
+            self._buckets[bucket_key] = buckets
+        return buckets
+
+    def acquire(self, api_key: str, model: str, tokens: int) -> float:
+        """
+        Blockiert, bis ein Request und `tokens` Tokens verfügbar sind, und bucht sie ab.
+
+        Args:
+            api_key (str): Der API-Schlüssel.
+            model (str): Das Modell.
+            tokens (int): Die geschätzte Anzahl an Prompt-Tokens.
+
+        Returns:
+            float: Die insgesamt gewartete Zeit in Sekunden.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                buckets = self._get_buckets(api_key, model)
+                now = time.monotonic()
+                for bucket in buckets.values():
+                    bucket.refill(now)
+                needed_tokens = min(float(tokens), buckets["tpm"].capacity)
+                wait = max(buckets["rpm"].wait_time(1.0), buckets["tpm"].wait_time(needed_tokens))
+                if wait <= 0:
+                    buckets["rpm"].tokens -= 1.0
+                    buckets["tpm"].tokens -= needed_tokens
+                    return waited
+            logging.info(f"Ratenlimit für {model} erreicht, warte {wait:.2f} Sekunden...")
+            tracked_sleep(wait)
+            waited += wait
+
+    def availability(self, api_key: str, model: str, tokens: int) -> Tuple[float, float]:
+        """
+        Prüft ohne abzubuchen, wie schnell ein Aufruf möglich wäre (für die Schlüsselauswahl).
+
+        Returns:
+            Tuple[float, float]: Wartezeit in Sekunden und der kleinere Füllstand von RPM- und TPM-Bucket.
+        """
+        with self._lock:
+            buckets = self._get_buckets(api_key, model)
+            now = time.monotonic()
+            for bucket in buckets.values():
+                bucket.refill(now)
+            needed_tokens = min(float(tokens), buckets["tpm"].capacity)
+            wait = max(buckets["rpm"].wait_time(1.0), buckets["tpm"].wait_time(needed_tokens))
+            return wait, min(buckets["rpm"].fill_level(), buckets["tpm"].fill_level())
+
+    def record_usage(self, api_key: str, model: str, extra_tokens: int) -> None:
+        """
+        Korrigiert den Tokens-Bucket nachträglich um die Differenz zwischen geschätztem und
+        tatsächlichem Verbrauch (der Bucket darf dabei negativ werden).
+        """
+        if not extra_tokens:
+            return
+        with self._lock:
+            bucket = self._get_buckets(api_key, model)["tpm"]
+            bucket.refill(time.monotonic())
+            bucket.tokens = min(bucket.capacity, bucket.tokens - extra_tokens)
+
+    def snapshot(self, api_key: str = None) -> List[Dict[str, Any]]:
+        """
+        Liefert den aktuellen Füllstand aller Buckets (optional nur für einen API-Schlüssel).
+
+        Returns:
+            List[Dict[str, Any]]: Ein Eintrag pro (Schlüssel, Modell) mit Füllständen zwischen 0 und 1.
+        """
+        fingerprint = api_key_fingerprint(api_key) if api_key else None
+        result = []
+        with self._lock:
+            now = time.monotonic()
+            for (key_fp, model), buckets in self._buckets.items():
+                if fingerprint and key_fp != fingerprint:
+                    continue
+                for bucket in buckets.values():
+                    bucket.refill(now)
+                result.append({
+                    "api_key": key_fp,
+                    "model": model,
+                    "rpm_available": buckets["rpm"].tokens,
+                    "rpm_capacity": buckets["rpm"].capacity,
+                    "rpm_fill": buckets["rpm"].fill_level(),
+                    "tpm_available": buckets["tpm"].tokens,
+                    "tpm_capacity": buckets["tpm"].capacity,
+                    "tpm_fill": buckets["tpm"].fill_level(),
+                })
+        return result
+
+def load_rate_limit_config() -> Dict[str, Any]:
+    """
+    Lädt die optionalen Kontingent-Überschreibungen aus RATE_LIMIT_CONFIG_FILE.
+
+    Returns:
+        Dict[str, Any]: Die Konfiguration oder ein leeres Dictionary.
+    """
+    return load_json_data(RATE_LIMIT_CONFIG_FILE) if os.path.exists(RATE_LIMIT_CONFIG_FILE) else {}
+
+@st.cache_resource(show_spinner=False)
+def _create_rate_limiter() -> RateLimiter:
+    return RateLimiter(load_rate_limit_config())
+
+# Im Batch-Betrieb durch einen prozessübergreifend geteilten Proxy ersetzt (siehe set_process_rate_limiter).
+_process_rate_limiter = None
+
+def set_process_rate_limiter(limiter: Any) -> None:
+    """
+    Ersetzt den Ratenbegrenzer dieses Prozesses, z.B. durch einen RateLimiter-Proxy aus einem
+    multiprocessing-Manager, damit sich alle Batch-Worker ein Kontingent teilen.
+
+    Args:
+        limiter (Any): Ein Objekt mit der Schnittstelle von RateLimiter.
+    """
+    global _process_rate_limiter
+    _process_rate_limiter = limiter
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Liefert den prozessweit geteilten RateLimiter (eine Instanz für alle Streamlit-Sessions).
+
+    Returns:
+        RateLimiter: Der Ratenbegrenzer, konfiguriert aus RATE_LIMITS und optional RATE_LIMIT_CONFIG_FILE.
+    """
+    if _process_rate_limiter is not None:
+        return _process_rate_limiter
+    return _create_rate_limiter()
+
+class RateLimitManager(multiprocessing.managers.BaseManager):
+    """Manager-Prozess, der einen RateLimiter für mehrere Batch-Worker bereitstellt."""
+
+RateLimitManager.register("RateLimiter", RateLimiter)
+
+class FilePartCache:
+    """
+    Prozessweiter LRU-Cache für Datei-Parts, adressiert über den SHA-256-Hash des Inhalts.
+    Jede Datei wird einmal gelesen und gehasht; alle Aufrufe einer Diskussion (und andere
+    Diskussionen mit derselben Datei) verwenden denselben Part.
+    """
+
+    def __init__(self, max_bytes: int = FILE_PART_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._digest_by_data_id: Dict[int, str] = {}  # id(bytes) -> Hash, um erneutes Hashen zu sparen
+        self._digest_by_file_id: Dict[str, str] = {}  # Streamlit file_id -> Hash
+        self._lock = threading.Lock()
+
+    def _touch(self, digest: str) -> Any:
+        entry = self._entries.get(digest)
+        if entry is None:
+            return None
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return entry["part"]
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            digest, entry = self._entries.popitem(last=False)
+            self.total_bytes -= entry["size"]
+            self._digest_by_data_id.pop(id(entry["data"]), None)
+            for file_id in [fid for fid, d in self._digest_by_file_id.items() if d == digest]:
+                del self._digest_by_file_id[file_id]
+            logging.info(f"Datei-Part {digest[:12]} aus dem Cache entfernt ({entry['size']} Bytes).")
+
+    def get_by_file_id(self, file_id: str) -> Tuple[str, Any]:
+        """
+        Liefert (Hash, Part) für eine bereits bekannte Streamlit-Upload-ID oder (None, None).
+        """
+        with self._lock:
+            digest = self._digest_by_file_id.get(file_id)
+            part = self._touch(digest) if digest else None
+            return (digest, part) if part is not None else (None, None)
+
+    def get_or_create(self, file_bytes: bytes, mime_type: str, file_id: str = None) -> Tuple[str, Any]:
+        """
+        Liefert den Part für die Datei-Bytes und legt ihn bei Bedarf an.
+
+        Args:
+            file_bytes (bytes): Der Dateiinhalt.
+            mime_type (str): Der MIME-Typ.
+            file_id (str, optional): Die Streamlit-Upload-ID, unter der der Hash zusätzlich gemerkt wird.
+
+        Returns:
+            Tuple[str, Any]: Der SHA-256-Hash und der wiederverwendbare Part.
+        """
+        with self._lock:
+            digest = self._digest_by_data_id.get(id(file_bytes))
+            if digest and self._entries[digest]["data"] is file_bytes:
+                if file_id:
+                    self._digest_by_file_id[file_id] = digest
+                return digest, self._touch(digest)
+        digest = hashlib.sha256(file_bytes).hexdigest()
+        with self._lock:
+            part = self._touch(digest)
+            if part is None:
+                self.misses += 1
+                part = genai.types.Part.from_bytes(data=file_bytes, mime_type=mime_type)
+                self._entries[digest] = {"part": part, "data": file_bytes, "size": len(file_bytes), "mime_type": mime_type}
+                self._digest_by_data_id[id(file_bytes)] = digest
+                self.total_bytes += len(file_bytes)
+                self._evict()
+            if file_id:
+                self._digest_by_file_id[file_id] = digest
+            return digest, part
+
+    def digest_for_part(self, part: Any) -> str:
+        """
+        Liefert den Hash eines Parts aus diesem Cache oder None, wenn er unbekannt ist.
+        """
+        data = getattr(getattr(part, "inline_data", None), "data", None)
+        if data is None:
+            return None
+        with self._lock:
+            digest = self._digest_by_data_id.get(id(data))
+            if digest and self._entries.get(digest, {}).get("data") is data:
+                return digest
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.total_bytes, "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+    def clear(self) -> None:
+        """Leert den Cache, z.B. zwischen Benchmark-Szenarien."""
+        with self._lock:
+            self._entries.clear()
+            self._digest_by_data_id.clear()
+            self._digest_by_file_id.clear()
+            self.total_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+@st.cache_resource(show_spinner=False)
+def get_file_part_cache() -> FilePartCache:
+    """
+    Liefert den prozessweit geteilten FilePartCache.
+
+    Returns:
+        FilePartCache: Der Cache für Datei-Parts.
+    """
+    return FilePartCache()
+
+def get_uploaded_file_part(uploaded_file) -> Tuple[str, Any]:
+    """
+    Liest eine hochgeladene Datei (höchstens einmal pro Upload) und liefert ihren zwischengespeicherten Part.
+
+    Args:
+        uploaded_file: Die hochgeladene Datei.
+
+    Returns:
+        Tuple[str, Any]: Der SHA-256-Hash des Inhalts und der wiederverwendbare Part.
+    """
+    cache = get_file_part_cache()
+    file_id = getattr(uploaded_file, "file_id", None)
+    if file_id:
+        digest, part = cache.get_by_file_id(file_id)
+        if part is not None:
+            return digest, part
+    return cache.get_or_create(uploaded_file.getvalue(), uploaded_file.type, file_id=file_id)
+
+class GeminiClientPool:
+    """
+    Threadsicherer Pool von Gemini-Clients pro API-Schlüssel. Clients (und damit ihre
+    HTTP-Verbindungen und TLS-Sitzungen) werden wiederverwendet, nach CLIENT_POOL_IDLE_SECONDS
+    Leerlauf geschlossen und bei mehr als CLIENT_POOL_MAX_SIZE Schlüsseln nach LRU verdrängt.
+    Clients werden über lease() ausgeliehen; ein verdrängter Client, der noch ausgeliehen ist
+    (z.B. von einem langen Stream), wird erst bei der letzten Rückgabe geschlossen.
+    """
+
+    def __init__(self, max_size: int = CLIENT_POOL_MAX_SIZE, idle_seconds: float = CLIENT_POOL_IDLE_SECONDS, client_kwargs: Dict[str, Any] = None):
+        self.max_size = max_size
+        self.idle_seconds = idle_seconds
+        self.client_kwargs = client_kwargs or {}
+        self.created = 0
+        self._clients: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _close(client: Any) -> None:
+        close = getattr(client, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                logging.warning(f"Fehler beim Schließen eines Gemini-Clients: {e}")
+
+    def _evict(self, entry: Dict[str, Any], stale: List[Any]) -> None:
+        # Aufruf unter self._lock: ausgeliehene Clients erst bei der letzten Rückgabe schließen.
+        entry["evicted"] = True
+        if entry["in_use"] == 0:
+            stale.append(entry["client"])
+
+    def _acquire(self, api_key: str) -> Dict[str, Any]:
+        pool_key = hashlib.sha256(api_key.encode()).hexdigest()
+        now = time.monotonic()
+        stale = []
+        with self._lock:
+            for key in [k for k, entry in self._clients.items()
+                        if now - entry["last_used"] > self.idle_seconds and entry["in_use"] == 0 and k != pool_key]:
+                self._evict(self._clients.pop(key), stale)
+            entry = self._clients.get(pool_key)
+            if entry is None:
+                entry = {"client": genai.Client(api_key=api_key, **self.client_kwargs), "last_used": now, "in_use": 0, "evicted": False}
+                self._clients[pool_key] = entry
+                self.created += 1
+                while len(self._clients) > self.max_size:
+                    self._evict(self._clients.popitem(last=False)[1], stale)
+            entry["last_used"] = now
+            entry["in_use"] += 1
+            self._clients.move_to_end(pool_key)
+        for old_client in stale:
+            self._close(old_client)
+        return entry
+
+    def _release(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            entry["in_use"] -= 1
+            entry["last_used"] = time.monotonic()
+            close = entry["evicted"] and entry["in_use"] == 0
+        if close:
+            self._close(entry["client"])
+
+    @contextlib.contextmanager
+    def lease(self, api_key: str) -> Iterator[Any]:
+        """
+        Leiht den Client für einen API-Schlüssel für die Dauer des Blocks aus und legt ihn bei Bedarf an.
+        Solange er ausgeliehen ist, wird er weder wegen Leerlaufs noch beim Verdrängen geschlossen.
+
+        Args:
+            api_key (str): Der API-Schlüssel.
+
+        Yields:
+            Any: Der (wiederverwendete) genai.Client.
+        """
+        entry = self._acquire(api_key)
+        try:
+            yield entry["client"]
+        finally:
+            self._release(entry)
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._clients)
+
+@st.cache_resource(show_spinner=False)
+def get_client_pool() -> GeminiClientPool:
+    """
+    Liefert den prozessweit geteilten Client-Pool (für alle Streamlit-Sessions).
+
+    Returns:
+        GeminiClientPool: Der Client-Pool.
+    """
+    return GeminiClientPool()
+
+class LLMError(Exception):
+    """
+    Klassifizierter Fehler eines LLM-Aufrufs. `kind` landet als "error" im Ergebnis von
+    call_gemini_api; `retryable` entscheidet über Wiederholungen.
+    """
+    kind = "permanent"
+    retryable = False
+
+    def __init__(self, message: str, status_code: int = None, retry_after: float = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class QuotaExceededError(LLMError):
+    """Kontingent erschöpft (429 / RESOURCE_EXHAUSTED)."""
+    kind = "quota"
+    retryable = True
+
+class TransientLLMError(LLMError):
+    """Vorübergehender Fehler (5xx, 408, Timeout, Verbindungsabbruch)."""
+    kind = "transient"
+    retryable = True
+
+class PermanentLLMError(LLMError):
+    """Fehler, den eine Wiederholung nicht behebt (z.B. 400, 401, 403, 404)."""
+    kind = "permanent"
+
+class CircuitOpenError(LLMError):
+    """Der Circuit Breaker ist offen; der Aufruf wurde nicht gesendet."""
+    kind = "circuit_open"
+
+def parse_retry_after(error: Exception) -> float:
+    """
+    Liest eine vom Server vorgegebene Wartezeit aus einem API-Fehler: Attribut `retry_after`,
+    HTTP-Header Retry-After (Sekunden oder HTTP-Datum) oder RetryInfo.retryDelay (z.B. "23s") in den Details.
+
+    Args:
+        error (Exception): Die Ausnahme des Backends.
+
+    Returns:
+        float: Die Wartezeit in Sekunden oder None, wenn keine vorgegeben ist.
+    """
+    if getattr(error, "retry_after", None) is not None:
+        return float(error.retry_after)
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    header = headers.get("retry-after") if headers is not None else None
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            try:
+                retry_at = email.utils.parsedate_to_datetime(header)
+                return max(0.0, (retry_at - datetime.datetime.now(retry_at.tzinfo)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+    pending = [getattr(error, "details", None)]
+    while pending:
+        item = pending.pop()
+        if isinstance(item, dict):
+            delay = item.get("retryDelay")
+            if isinstance(delay, str) and delay.endswith("s"):
+                try:
+                    return float(delay[:-1])
+                except ValueError:
+                    pass
+            pending.extend(item.values())
+        elif isinstance(item, list):
+            pending.extend(item)
+    return None
+
+def classify_llm_error(error: Exception) -> LLMError:
+    """
+    Ordnet eine Ausnahme des Backends einer Fehlerart zu (Statuscode, Ausnahmetyp, notfalls Fehlertext).
+
+    Args:
+        error (Exception): Die Ausnahme des Backends.
+
+    Returns:
+        LLMError: QuotaExceededError, TransientLLMError oder PermanentLLMError.
+    """
+    if isinstance(error, LLMError):
+        return error
+    err_s = str(error)
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if not isinstance(code, int):
+        code_match = re.match(r"\s*(\d{3})\b", err_s)
+        code = int(code_match.group(1)) if code_match else None
+    retry_after = parse_retry_after(error)
+    type_name = type(error).__name__
+    if code == 429 or "RESOURCE_EXHAUSTED" in err_s:
+        return QuotaExceededError(err_s, 429, retry_after)
+    if (code is not None and (code >= 500 or code == 408)) or isinstance(error, (TimeoutError, ConnectionError)) \
+            or any(marker in type_name for marker in ("Timeout", "Connect", "RemoteProtocol")):
+        return TransientLLMError(err_s, code, retry_after)
+    return PermanentLLMError(err_s, code, retry_after)
+
+def llm_retry_delay(error: LLMError, attempt: int) -> float:
+    """
+    Wartezeit vor dem nächsten Versuch: die Vorgabe des Servers, sonst exponentielles Backoff mit Jitter.
+
+    Args:
+        error (LLMError): Der klassifizierte Fehler.
+        attempt (int): Die Anzahl der bisher fehlgeschlagenen Versuche (ab 1).
+
+    Returns:
+        float: Die Wartezeit in Sekunden (höchstens API_MAX_WAIT_SECONDS).
+    """
+    if error.retry_after is not None:
+        return min(error.retry_after, API_MAX_WAIT_SECONDS)
+    return min(2 ** attempt, API_MAX_WAIT_SECONDS) * random.uniform(0.5, 1.5)
+
+def llm_error_message(error: LLMError, attempts: int) -> str:
+    """Die Fehlermeldung, die call_gemini_api anstelle einer Antwort liefert."""
+    if isinstance(error, CircuitOpenError):
+        return f"Fehler: Gemini API vorübergehend nicht erreichbar, Aufruf übersprungen ({error})."
+    if isinstance(error, QuotaExceededError):
+        return "Fehler: Maximale Anzahl an Versuchen erreicht. API-Kontingent wahrscheinlich erschöpft."
+    if isinstance(error, TransientLLMError):
+        return f"Fehler: Maximale Anzahl an Versuchen erreicht ({attempts}). Letzter Fehler: {error}"
+    return f"Fehler bei Gemini API Aufruf: {error}"
+
+class CircuitBreaker:
+    """
+    Circuit Breaker für ein (API-Schlüssel, Modell)-Paar. Nach `failure_threshold` aufeinanderfolgenden
+    Kontingent- oder vorübergehenden Fehlern öffnet er für `reset_seconds`; danach lässt er einen
+    einzelnen Probeaufruf durch ("half_open"), dessen Ergebnis ihn schließt oder erneut öffnet.
+    """
+
+    def __init__(self, failure_threshold: int = CIRCUIT_BREAKER_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Returns:
+            float: 0.0, wenn der Aufruf gesendet werden darf, sonst die Sekunden bis zum nächsten Probeaufruf.
+        """
+        with self._lock:
+            if self.state == "closed":
+                return 0.0
+            remaining = self.opened_at + self.reset_seconds - time.monotonic()
+            if self.state == "open" and remaining <= 0:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return 0.0
+            return max(remaining, 0.001)
+
+    def available(self) -> bool:
+        """Ob acquire() derzeit einen Aufruf zulassen würde (ohne den Probeaufruf zu belegen)."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                return time.monotonic() >= self.opened_at + self.reset_seconds
+            return not self._probe_in_flight
+
+    def record_success(self) -> None:
+        """Der Dienst hat geantwortet (auch ein permanenter Fehler wie 400 zählt als erreichbar)."""
+        with self._lock:
+            if self.state != "closed":
+                logging.info("Circuit Breaker geschlossen, Gemini API wieder erreichbar.")
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """Der Probeaufruf endete ohne Ergebnis (abgebrochen); der nächste Aufruf darf erneut proben."""
+        with self._lock:
+            self._probe_in_flight = False
+            if self.state == "half_open":
+                # opened_at bleibt, acquire() wechselt daher sofort wieder nach "half_open".
+                self.state = "open"
+
+    def record_failure(self) -> None:
+        """Ein Kontingent- oder vorübergehender Fehler nach allen Wiederholungen bzw. im Probeaufruf."""
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    logging.warning(f"Circuit Breaker geöffnet nach {self.failures} Fehlern, Aufrufe werden {self.reset_seconds} Sekunden lang übersprungen.")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+class CircuitBreakerRegistry:
+    """Hält je einen CircuitBreaker pro (API-Schlüssel-Fingerprint, Modell)."""
+
+    def __init__(self, failure_threshold: int = CIRCUIT_BREAKER_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, api_key: str, model: str) -> CircuitBreaker:
+        key = (api_key_fingerprint(api_key), model)
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._breakers[key] = CircuitBreaker(self.failure_threshold, self.reset_seconds)
+            return breaker
+
+    def snapshot(self) -> Dict[str, str]:
+        with self._lock:
+            return {f"{fingerprint}/{model}": breaker.state for (fingerprint, model), breaker in self._breakers.items()}
+
+@st.cache_resource(show_spinner=False)
+def _create_circuit_breakers() -> CircuitBreakerRegistry:
+    return CircuitBreakerRegistry()
+
+_process_circuit_breakers = None
+
+def set_process_circuit_breakers(registry: CircuitBreakerRegistry) -> None:
+    """
+    Ersetzt die Circuit Breaker dieses Prozesses (z.B. mit kurzen Zeiten für die Fehlerprüfung).
+
+    Args:
+        registry (CircuitBreakerRegistry): Die zu verwendende Registry oder None für den Standard.
+    """
+    global _process_circuit_breakers
+    _process_circuit_breakers = registry
+
+def get_circuit_breakers() -> CircuitBreakerRegistry:
+    """
+    Liefert die prozessweit geteilten Circuit Breaker.
+
+    Returns:
+        CircuitBreakerRegistry: Die Registry.
+    """
+    if _process_circuit_breakers is not None:
+        return _process_circuit_breakers
+    return _create_circuit_breakers()
+
+def load_api_key_pool_config() -> Dict[str, Any]:
+    """
+    Lädt die Schlüssel- und Modell-Konfiguration aus API_KEY_POOL_FILE und der Umgebungsvariable
+    GEMINI_API_KEYS ("name=schlüssel,schlüssel2,..."). Schlüssel in der Datei können statt "key"
+    auch "env" (Name einer Umgebungsvariable) angeben, damit sie nicht im Klartext gespeichert werden.
+
+    Returns:
+        Dict[str, Any]: {"keys": [{"name", "key", "models"}], "model_fallbacks": {Modell: [Ersatzmodelle]}}.
+    """
+    config = load_json_data(API_KEY_POOL_FILE) if os.path.exists(API_KEY_POOL_FILE) else {}
+    keys = []
+    for idx, entry in enumerate(config.get("keys", [])):
+        key = entry.get("key") or os.environ.get(entry.get("env", ""), "")
+        if not key:
+            logging.warning(f"Schlüssel-Pool: Eintrag {entry.get('name', idx)} hat keinen Schlüssel und wird ignoriert.")
+            continue
+        keys.append({"name": entry.get("name") or f"key{idx + 1}", "key": key, "models": entry.get("models")})
+    for idx, item in enumerate(filter(None, (part.strip() for part in os.environ.get("GEMINI_API_KEYS", "").split(",")))):
+        name, _, key = item.rpartition("=")
+        keys.append({"name": name or f"env{idx + 1}", "key": key, "models": None})
+    return {"keys": keys, "model_fallbacks": config.get("model_fallbacks", {})}
+
+class ApiKeyPool:
+    """
+    Verteilt LLM-Aufrufe auf mehrere API-Schlüssel und Ersatzmodelle. Pro Versuch wird der am
+    wenigsten ausgelastete gesunde Kandidat gewählt: nicht in Abkühlung nach einem 429, Circuit
+    Breaker nicht offen, dann sofort verfügbares Kontingent, bevorzugt das angefragte Modell,
+    kürzeste Wartezeit, wenigste laufende Aufrufe und meiste Reserve im RateLimiter.
+    """
+
+    def __init__(self, config: Dict[str, Any] = None):
+        config = config or {}
+        self.entries: List[Dict[str, Any]] = list(config.get("keys", []))
+        self.model_fallbacks: Dict[str, List[str]] = config.get("model_fallbacks", {})
+        self._cooldown_until: Dict[Tuple[str, str], float] = {}
+        self._in_flight: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._usage: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._names: Dict[str, str] = {api_key_fingerprint(e["key"]): e["name"] for e in self.entries}
+        self._lock = threading.Lock()
+
+    def name_for(self, api_key: str) -> str:
+        """Der konfigurierte Name eines Schlüssels bzw. sein Fingerprint."""
+        return self.name_for_fingerprint(api_key_fingerprint(api_key))
+
+    def name_for_fingerprint(self, fingerprint: str) -> str:
+        """Wie name_for, aber für einen Fingerprint (z.B. aus RateLimiter.snapshot)."""
+        return self._names.get(fingerprint, fingerprint)
+
+    def candidates(self, api_key: str, model: str) -> List[Tuple[str, str]]:
+        """
+        Alle (Schlüssel, Modell)-Paare für eine Anfrage in Präferenzreihenfolge: zuerst das angefragte
+        Modell, dann die Ersatzmodelle. Ein übergebener, nicht konfigurierter Schlüssel gehört dazu.
+        """
+        keys = [(e["key"], e.get("models")) for e in self.entries]
+        if api_key and all(key != api_key for key, _ in keys):
+            keys.insert(0, (api_key, None))
+        result = []
+        for candidate_model in [model] + list(self.model_fallbacks.get(model, [])):
+            result.extend((key, candidate_model) for key, models in keys if not models or candidate_model in models)
+        return result
+
+    def select(self, api_key: str, model: str, tokens: int, limiter: Any, breakers: "CircuitBreakerRegistry") -> Tuple[str, str]:
+        """
+        Wählt den Kandidaten für den nächsten Versuch.
+
+        Args:
+            api_key (str): Der übergebene Schlüssel (z.B. aus der Seitenleiste) oder None.
+            model (str): Das angefragte Modell.
+            tokens (int): Die geschätzten Prompt-Tokens.
+            limiter (Any): Der RateLimiter.
+            breakers (CircuitBreakerRegistry): Die Circuit Breaker.
+
+        Returns:
+            Tuple[str, str]: (Schlüssel, Modell) oder None, wenn alle Circuit Breaker offen sind.
+        """
+        best, best_score = None, None
+        now = time.monotonic()
+        for rank, (key, candidate_model) in enumerate(self.candidates(api_key, model)):
+            if not breakers.get(key, candidate_model).available():
+                continue
+            pool_key = (api_key_fingerprint(key), candidate_model)
+            with self._lock:
+                cooling = max(0.0, self._cooldown_until.get(pool_key, 0.0) - now)
+                in_flight = self._in_flight[pool_key]
+            wait, fill = limiter.availability(key, candidate_model, tokens)
+            score = (cooling > 0, cooling, wait > 0, candidate_model != model, wait, in_flight, -fill, rank)
+            if best_score is None or score < best_score:
+                best, best_score = (key, candidate_model), score
+        return best
+
+    def _stats(self, api_key: str, model: str) -> Dict[str, int]:
+        pool_key = (api_key_fingerprint(api_key), model)
+        stats = self._usage.get(pool_key)
+        if stats is None:
+            stats = self._usage[pool_key] = {"requests": 0, "tokens": 0, "quota_errors": 0, "errors": 0}
+        return stats
+
+    def begin(self, api_key: str, model: str) -> None:
+        with self._lock:
+            self._in_flight[(api_key_fingerprint(api_key), model)] += 1
+            self._stats(api_key, model)["requests"] += 1
+
+    def end(self, api_key: str, model: str, tokens: int = 0, error: "LLMError" = None) -> None:
+        """
+        Beendet einen Versuch. Ein Kontingent-Fehler versetzt das Paar in Abkühlung
+        (Vorgabe des Servers oder QUOTA_COOLDOWN_SECONDS), damit der nächste Versuch ausweicht.
+        """
+        with self._lock:
+            pool_key = (api_key_fingerprint(api_key), model)
+            self._in_flight[pool_key] -= 1
+            stats = self._stats(api_key, model)
+            stats["tokens"] += tokens or 0
+            if error is not None:
+                stats["errors"] += 1
+                if isinstance(error, QuotaExceededError):
+                    stats["quota_errors"] += 1
+                    cooldown = error.retry_after if error.retry_after is not None else QUOTA_COOLDOWN_SECONDS
+                    self._cooldown_until[pool_key] = time.monotonic() + cooldown
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """
+        Returns:
+            List[Dict[str, Any]]: Nutzung pro (Schlüsselname, Modell) inkl. verbleibender Abkühlzeit.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [
+                dict(stats, key=self._names.get(fingerprint, fingerprint), model=model, in_flight=self._in_flight[(fingerprint, model)],
+                     cooldown_seconds=round(max(0.0, self._cooldown_until.get((fingerprint, model), 0.0) - now), 1))
+                for (fingerprint, model), stats in self._usage.items()
+            ]
+
+@st.cache_resource(show_spinner=False)
+def _create_api_key_pool() -> ApiKeyPool:
+    pool = ApiKeyPool(load_api_key_pool_config())
+    if pool.entries:
+        logging.info(f"Schlüssel-Pool geladen: {[e['name'] for e in pool.entries]}, Ersatzmodelle: {pool.model_fallbacks}")
+    return pool
+
+_process_api_key_pool = None
+
+def set_process_api_key_pool(pool: ApiKeyPool) -> None:
+    """
+    Ersetzt den Schlüssel-Pool dieses Prozesses.
+
+    Args:
+        pool (ApiKeyPool): Der zu verwendende Pool oder None für den Standard.
+    """
+    global _process_api_key_pool
+    _process_api_key_pool = pool
+
+def get_api_key_pool() -> ApiKeyPool:
+    """
+    Liefert den prozessweiten Schlüssel-Pool (leer, wenn weder API_KEY_POOL_FILE noch GEMINI_API_KEYS gesetzt sind;
+    dann wird nur der übergebene Schlüssel verwendet).
+
+    Returns:
+        ApiKeyPool: Der Pool.
+    """
+    if _process_api_key_pool is not None:
+        return _process_api_key_pool
+    return _create_api_key_pool()
+
+class LLMBackend(abc.ABC):
+    """
+    Schnittstelle für LLM-Backends. call_gemini_api übernimmt Ratenbegrenzung, Cache und Retries
+    und delegiert nur den eigentlichen Aufruf an das Backend. Antworten müssen `text` und optional
+    `usage_metadata.total_token_count` besitzen (wie die Antworten des Gemini-SDKs).
+    """
+
+    @abc.abstractmethod
+    def generate_content(self, api_key: str, model: str, contents: list) -> Any:
+        """Erzeugt die vollständige Antwort auf `contents`."""
+
+    @abc.abstractmethod
+    def generate_content_stream(self, api_key: str, model: str, contents: list) -> Iterator[Any]:
+        """Liefert die Antwort auf `contents` in Teilstücken (jeweils mit `text`)."""
+
+class GeminiBackend(LLMBackend):
+    """Backend für die Gemini API mit Clients aus dem GeminiClientPool."""
+
+    def generate_content(self, api_key: str, model: str, contents: list) -> Any:
+        with get_client_pool().lease(api_key) as client:
+            return client.models.generate_content(model=model, contents=contents)
+
+    def generate_content_stream(self, api_key: str, model: str, contents: list) -> Iterator[Any]:
+        # Der Client bleibt bis zum Ende (oder Abbruch) des Streams ausgeliehen.
+        with get_client_pool().lease(api_key) as client:
+            yield from client.models.generate_content_stream(model=model, contents=contents)
+
+class StubAPIError(Exception):
+    """Vom StubBackend injizierter API-Fehler mit HTTP-Statuscode und optionaler Retry-After-Vorgabe."""
+
+    def __init__(self, code: int, message: str, retry_after: float = None):
+        super().__init__(f"{code} {message}")
+        self.code = code
+        self.retry_after = retry_after
+
+class StubBackend(LLMBackend):
+    """
+    Lokales, deterministisches Backend für Benchmarks und Tests ohne API-Schlüssel.
+    Latenz und Antwortlänge sind konfigurierbar; 429- und 503-Fehler (optional mit Retry-After),
+    Timeouts und permanente 400-Fehler können mit einer Quote injiziert werden, `outage = True`
+    simuliert einen Totalausfall. Die Antwort hängt nur vom Seed und vom Inhalt der Anfrage ab.
+    Mit record_prompts=True werden die Textteile aller Anfragen in `prompts` gesammelt;
+    mit `repeat_rate` ist eine Antwort in diesem Anteil der Fälle eine leicht abgewandelte
+    Wiederholung der vorherigen (simuliert festgefahrene Diskussionen).
+    """
+
+    WORDS = ["Agent", "Analyse", "Risiko", "Chance", "Daten", "Markt", "Strategie", "Zukunft", "Modell",
+             "Energie", "Stadt", "Netz", "Kosten", "Nutzen", "Innovation", "Regulierung", "Bildung", "Sicherheit"]
+
+    def __init__(
+        self,
+        latency_mean: float = 0.05,
+        latency_jitter: float = 0.0,
+        latency_distribution: str = "uniform",
+        response_chars: int = 800,
+        error_rate_429: float = 0.0,
+        error_rate_5xx: float = 0.0,
+        error_rate_timeout: float = 0.0,
+        error_rate_400: float = 0.0,
+        retry_after: float = None,
+        record_prompts: bool = False,
+        repeat_rate: float = 0.0,
+        seed: int = 42
+    ):
+        self.latency_mean = latency_mean
+        self.latency_jitter = latency_jitter
+        self.latency_distribution = latency_distribution
+        self.response_chars = response_chars
+        self.error_rate_429 = error_rate_429
+        self.error_rate_5xx = error_rate_5xx
+        self.error_rate_timeout = error_rate_timeout
+        self.error_rate_400 = error_rate_400
+        self.retry_after = retry_after
+        self.outage = False
+        self.seed = seed
+        self.calls = 0
+        self.errors_429 = 0
+        self.injected_errors: Dict[str, int] = defaultdict(int)
+        self.prompt_bytes: List[int] = []
+        self.record_prompts = record_prompts
+        self.prompts: List[str] = []
+        self.repeat_rate = repeat_rate
+        self._last_text = ""
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _latency(self) -> float:
+        with self._lock:
+            if self.latency_distribution == "lognormal" and self.latency_mean > 0:
+                return self._rng.lognormvariate(math.log(self.latency_mean), self.latency_jitter or 0.25)
+            return max(0.0, self.latency_mean + self._rng.uniform(-self.latency_jitter, self.latency_jitter))
+
+    def _text(self, contents: list) -> str:
+        digest = hashlib.sha256(json.dumps(normalize_contents(contents), ensure_ascii=False).encode("utf-8")).hexdigest()
+        rng = random.Random(f"{self.seed}:{digest}")
+        if self._last_text and rng.random() < self.repeat_rate:
+            # Jedes zehnte Wort austauschen: inhaltlich dieselbe Antwort in leicht anderer Form.
+            words = self._last_text.split(" ")
+            for index in range(0, len(words), 10):
+                words[index] = rng.choice(self.WORDS)
+            return " ".join(words)[:self.response_chars]
+        words = []
+        length = 0
+        while length < self.response_chars:
+            word = rng.choice(self.WORDS)
+            words.append(word)
+            length += len(word) + 1
+        return " ".join(words)[:self.response_chars]
+
+    def _draw_fault(self) -> str:
+        if self.outage:
+            return "503"
+        draw = self._rng.random()
+        for fault, rate in (("429", self.error_rate_429), ("503", self.error_rate_5xx), ("timeout", self.error_rate_timeout), ("400", self.error_rate_400)):
+            if draw < rate:
+                return fault
+            draw -= rate
+        return None
+
+    def generate_content(self, api_key: str, model: str, contents: list) -> Any:
+        with self._lock:
+            self.calls += 1
+            self.prompt_bytes.append(contents_size_bytes(contents))
+            if self.record_prompts:
+                self.prompts.append("\n".join(item for item in contents if isinstance(item, str)))
+            fault = self._draw_fault()
+            if fault:
+                self.injected_errors[fault] += 1
+                if fault == "429":
+                    self.errors_429 += 1
+        time.sleep(self._latency())
+        if fault == "429":
+            raise StubAPIError(429, "RESOURCE_EXHAUSTED (Stub)", self.retry_after)
+        if fault == "503":
+            raise StubAPIError(503, "UNAVAILABLE (Stub)", self.retry_after)
+        if fault == "timeout":
+            raise TimeoutError("Zeitüberschreitung (Stub)")
+        if fault == "400":
+            raise StubAPIError(400, "INVALID_ARGUMENT (Stub)")
+        text = self._text(contents)
+        self._last_text = text
+        usage = type("StubUsage", (), {"total_token_count": estimate_tokens(contents) + len(text) // CHARS_PER_TOKEN})()
+        return type("StubResponse", (), {"text": text, "usage_metadata": usage})()
+
+    def generate_content_stream(self, api_key: str, model: str, contents: list) -> Iterator[Any]:
+        response = self.generate_content(api_key, model, contents)
+        for start in range(0, len(response.text), 80):
+            yield type("StubChunk", (), {"text": response.text[start:start + 80], "usage_metadata": None})()
+
+@st.cache_resource(show_spinner=False)
+def _create_llm_backend() -> LLMBackend:
+    if LLM_BACKEND == "stub":
+        logging.warning("LLM_BACKEND=stub: Es werden lokale Stub-Antworten statt der Gemini API verwendet.")
+        return StubBackend()
+    return GeminiBackend()
+
+_process_llm_backend = None
+
+def set_llm_backend(backend: LLMBackend) -> None:
+    """
+    Ersetzt das LLM-Backend dieses Prozesses (z.B. durch ein StubBackend für Benchmarks).
+
+    Args:
+        backend (LLMBackend): Das zu verwendende Backend oder None für den Standard.
+    """
+    global _process_llm_backend
+    _process_llm_backend = backend
+
+def get_llm_backend() -> LLMBackend:
+    """
+    Liefert das aktive LLM-Backend (Standard: LLM_BACKEND, "gemini" oder "stub").
+
+    Returns:
+        LLMBackend: Das Backend.
+    """
+    if _process_llm_backend is not None:
+        return _process_llm_backend
+    return _create_llm_backend()
+
+def normalize_contents(contents: list) -> List[Dict[str, str]]:
+    """
+    Bringt Anfrage-Inhalte in eine stabile, hashbare Form: Texte mit vereinheitlichten
+    Zeilenenden, Datei-Parts über den SHA-256-Hash ihres Inhalts.
+
+    Args:
+        contents (list): Die Inhalte, die an die API gesendet werden sollen.
+
+    Returns:
+        List[Dict[str, str]]: Die normalisierten Inhalte.
+    """
+    normalized = []
+    for item in contents:
+        if isinstance(item, str):
+            normalized.append({"text": item.replace("\r\n", "\n").strip()})
+            continue
+        digest = get_file_part_cache().digest_for_part(item)
+        inline_data = getattr(item, "inline_data", None)
+        if digest is None and inline_data is not None:
+            digest = hashlib.sha256(inline_data.data).hexdigest()
+        if digest is not None:
+            normalized.append({"file": digest, "mime_type": getattr(inline_data, "mime_type", "") or ""})
+        else:
+            normalized.append({"text": str(getattr(item, "text", item))})
+    return normalized
+
+def migrate_response_cache_table(cursor: sqlite3.Cursor) -> None:
+    """
+    Version 1: Tabelle response_cache (bei älteren Cache-Dateien bereits vorhanden).
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS response_cache (
+            cache_key TEXT PRIMARY KEY,
+            model TEXT,
+            response TEXT,
+            size INTEGER,
+            created REAL,
+            last_access REAL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_last_access ON response_cache (last_access)")
+
+def migrate_response_cache_total(cursor: sqlite3.Cursor) -> None:
+    """
+    Version 2: Laufende Gesamtgröße in response_cache_total, von Triggern bei jedem Einfügen, Ändern und
+    Löschen nachgeführt (auch über Prozesse hinweg), statt SUM(size) bei jedem Speichern; Index für die TTL.
+    """
+    cursor.execute("CREATE TABLE response_cache_total (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)")
+    cursor.execute("INSERT INTO response_cache_total (id, bytes) SELECT 0, COALESCE(SUM(size), 0) FROM response_cache")
+    cursor.execute("""
+        CREATE TRIGGER response_cache_total_insert AFTER INSERT ON response_cache BEGIN
+            UPDATE response_cache_total SET bytes = bytes + new.size WHERE id = 0;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER response_cache_total_update AFTER UPDATE OF size ON response_cache BEGIN
+            UPDATE response_cache_total SET bytes = bytes - old.size + new.size WHERE id = 0;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER response_cache_total_delete AFTER DELETE ON response_cache BEGIN
+            UPDATE response_cache_total SET bytes = bytes - old.size WHERE id = 0;
+        END
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_created ON response_cache (created)")
+
+RESPONSE_CACHE_MIGRATIONS = [migrate_response_cache_table, migrate_response_cache_total]
+
+class ResponseCache:
+    """
+    Persistenter Antwort-Cache für call_gemini_api in einer lokalen SQLite-Datei (über SQLiteDatabase),
+    mit TTL, Größenbegrenzung (LRU nach letztem Zugriff) und Treffer-/Fehlzählern.
+    """
+
+    def __init__(self, db_file: str = RESPONSE_CACHE_DB_FILE, ttl_seconds: int = RESPONSE_CACHE_TTL_SECONDS, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.db_file = db_file
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.db = SQLiteDatabase(db_file, RESPONSE_CACHE_MIGRATIONS, journal_mode=DB_JOURNAL_MODE, busy_timeout=DB_BUSY_TIMEOUT_SECONDS)
+        self.db.migrate()
+
+    @staticmethod
+    def make_key(model: str, contents: list) -> str:
+        """
+        Bildet den Cache-Schlüssel aus Modell und normalisierten Inhalten.
+        """
+        payload = json.dumps([model, normalize_contents(contents)], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str:
+        """
+        Liefert die zwischengespeicherte Antwort oder None (abgelaufene Einträge werden entfernt).
+        """
+        now = time.time()
+        try:
+            row = self.db.connection().execute("SELECT response, created FROM response_cache WHERE cache_key = ?", (key,)).fetchone()
+            if row and now - row[1] <= self.ttl_seconds:
+                with self.db.transaction() as cursor:
+                    cursor.execute("UPDATE response_cache SET last_access = ? WHERE cache_key = ?", (now, key))
+                with self._lock:
+                    self.hits += 1
+                return row[0]
+            if row:
+                with self.db.transaction() as cursor:
+                    cursor.execute("DELETE FROM response_cache WHERE cache_key = ?", (key,))
+        except sqlite3.Error as e:
+            logging.error(f"Datenbankfehler im Antwort-Cache (Lesen): {e}")
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def total_bytes(self) -> int:
+        """
+        Laufende Gesamtgröße der gespeicherten Antworten (response_cache_total).
+        """
+        return self.db.connection().execute("SELECT bytes FROM response_cache_total WHERE id = 0").fetchone()[0]
+
+    def put(self, key: str, model: str, response: str) -> None:
+        """
+        Speichert eine Antwort und verdrängt abgelaufene bzw. die am längsten ungenutzten Einträge.
+        """
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        try:
+            with self.db.transaction() as cursor:
+                # Upsert statt INSERT OR REPLACE: REPLACE löscht ohne Delete-Trigger, die Gesamtgröße bliebe zu hoch.
+                cursor.execute("""
+                    INSERT INTO response_cache (cache_key, model, response, size, created, last_access)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(cache_key) DO UPDATE SET model = excluded.model, response = excluded.response,
+                        size = excluded.size, created = excluded.created, last_access = excluded.last_access
+                """, (key, model, response, size, now, now))
+                cursor.execute("DELETE FROM response_cache WHERE created < ?", (now - self.ttl_seconds,))
+                total = cursor.execute("SELECT bytes FROM response_cache_total WHERE id = 0").fetchone()[0]
+                if total > self.max_bytes:
+                    excess = total - self.max_bytes
+                    evict_keys = []
+                    # Eigener Cursor: die Auswahl wird nur bis zum Erreichen der Grenze gelesen.
+                    for cache_key, entry_size in self.db.connection().execute("SELECT cache_key, size FROM response_cache ORDER BY last_access"):
+                        if excess <= 0:
+                            break
+                        evict_keys.append((cache_key,))
+                        excess -= entry_size
+                    cursor.executemany("DELETE FROM response_cache WHERE cache_key = ?", evict_keys)
+        except sqlite3.Error as e:
+            logging.error(f"Datenbankfehler im Antwort-Cache (Schreiben): {e}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+@st.cache_resource(show_spinner=False)
+def _create_response_cache() -> ResponseCache:
+    return ResponseCache()
+
+_process_response_cache = None
+
+def set_process_response_cache(cache: ResponseCache) -> None:
+    """
+    Ersetzt den Antwort-Cache dieses Prozesses (z.B. durch einen leeren Cache je Benchmark-Szenario).
+
+    Args:
+        cache (ResponseCache): Der zu verwendende Cache oder None für den Standard.
+    """
+    global _process_response_cache
+    _process_response_cache = cache
+
+def get_response_cache() -> ResponseCache:
+    """
+    Liefert den prozessweit geteilten Antwort-Cache.
+
+    Returns:
+        ResponseCache: Der Antwort-Cache.
+    """
+    if _process_response_cache is not None:
+        return _process_response_cache
+    return _create_response_cache()
+
+def generate_pdf_summary_from_bytes(file_bytes: bytes, api_key: str) -> str:
+    """
+    Generiert eine Zusammenfassung aus PDF-Bytes.
+
+    Args:
+        file_bytes (bytes): Die Bytes der PDF-Datei.
+        api_key (str): Der API-Schlüssel für den Gemini-Dienst.
+
+    Returns:
+        str: Die generierte Zusammenfassung.
+    """
+    try:
+        mime_type = "application/pdf"
+        prompt = "Fasse den Inhalt der PDF zusammen. Achte darauf, dass wichtige Daten nicht verloren gehen!"
+        _, file_part = get_file_part_cache().get_or_create(file_bytes, mime_type)
+        contents = [prompt, file_part]
+        response = call_gemini_api(contents, api_key, model=MODEL_NAME_TEXT, use_cache=True)  # Textmodell für PDF, reine Funktion der Datei
+        if response.get("error"):
+            logging.warning(f"PDF-Zusammenfassung fehlgeschlagen ({response['error']}), starte ohne Zusammenfassung der Datei.")
+            return "Start der Konversation."
+        return response.get("response", "Start der Konversation.")
+    except Exception as e:
+        logging.error("Fehler beim Generieren der PDF-Zusammenfassung:", exc_info=e)
+        return "Fehler beim Verarbeiten der PDF."
+
+def generate_image_summary_from_bytes(file_bytes: bytes, mime_type: str, api_key: str) -> str:
+    """
+    Generiert eine Beschreibung/Analyse aus Bild-Bytes.
+
+    Args:
+        file_bytes (bytes): Die Bytes der Bilddatei.
+        mime_type (str): Der MIME-Typ der Bilddatei.
+        api_key (str): Der API-Schlüssel für den Gemini-Dienst.
+
+    Returns:
+        str: Die generierte Beschreibung/Analyse.
+    """
+    try:
+        prompt = "Beschreibe den Inhalt des Bildes detailliert. Was sind die Hauptelemente, die Stimmung, und mögliche Interpretationen?"
+        _, file_part = get_file_part_cache().get_or_create(file_bytes, mime_type)
+        contents = [prompt, file_part]
+        response = call_gemini_api(contents, api_key, model=MODEL_NAME_VISION, use_cache=True)  # Vision-Modell für Bilder, reine Funktion der Datei
+        if response.get("error"):
+            logging.warning(f"Bildbeschreibung fehlgeschlagen ({response['error']}), starte ohne Zusammenfassung der Datei.")
+            return "Start der Konversation."
+        return response.get("response", "Start der Konversation.")
+    except Exception as e:
+        logging.error("Fehler beim Generieren der Bildbeschreibung:", exc_info=e)
+        return "Fehler beim Verarbeiten des Bildes."
+
+def lookup_cached_response(model: str, contents: list, use_cache: bool) -> Tuple[str, str]:
+    """
+    Sucht eine Antwort im persistenten Antwort-Cache (gemeinsam für call_gemini_api und call_gemini_api_stream).
+
+    Args:
+        model (str): Das angefragte Modell.
+        contents (list): Die Inhalte der Anfrage.
+        use_cache (bool): Ob der Cache verwendet wird.
+
+    Returns:
+        Tuple[str, str]: Der Cache-Schlüssel (None ohne Cache) und die gespeicherte Antwort (None, wenn keine vorliegt).
+    """
+    if not use_cache:
+        return None, None
+    cache_key = ResponseCache.make_key(model, contents)
+    cached_response = get_response_cache().get(cache_key)
+    if cached_response is not None:
+        logging.info(f"Antwort für {model} aus dem Cache geladen.")
+        get_metrics().inc("llm_requests_total", model=model, outcome="cache_hit")
+    return cache_key, cached_response
+
+class LLMCallAttempts:
+    """
+    Versuchsablauf eines LLM-Aufrufs, gemeinsam für call_gemini_api und call_gemini_api_stream:
+    Auswahl von Schlüssel und Modell (ApiKeyPool), Circuit Breaker, Ratenbegrenzung, Klassifikation
+    der Fehler, Ausweichen bei Kontingent-Fehlern, Wartezeit vor Wiederholungen und Metriken.
+    Der Aufrufer führt nur den eigentlichen Backend-Aufruf aus.
+    """
+
+    def __init__(self, contents: list, api_key: str, model: str):
+        self.contents = contents
+        self.api_key = api_key
+        self.model = model
+        self.metrics = get_metrics()
+        self.backend = get_llm_backend()
+        self.limiter = get_rate_limiter()
+        self.breakers = get_circuit_breakers()
+        self.pool = get_api_key_pool()
+        self.estimated_tokens = estimate_tokens(contents)
+        self.metrics.observe("llm_prompt_bytes", contents_size_bytes(contents), model=model)
+        self.attempt = 0
+        self.failovers = 0
+        self.selected = None
+        self.breaker = None
+        self.call_key = None
+        self.call_model = None
+        self.served_by = None
+
+    def select(self) -> LLMError:
+        """
+        Wählt Schlüssel und Modell für den nächsten Versuch und belegt sie im ApiKeyPool.
+
+        Returns:
+            LLMError: CircuitOpenError, wenn kein Kandidat verfügbar ist (Circuit Breaker offen), sonst None.
+        """
+        self.selected = self.pool.select(self.api_key, self.model, self.estimated_tokens, self.limiter, self.breakers)
+        self.breaker = self.breakers.get(*self.selected) if self.selected else None
+        open_for = self.breaker.acquire() if self.breaker else CIRCUIT_BREAKER_RESET_SECONDS
+        if open_for:
+            error = CircuitOpenError(f"Circuit Breaker offen, nächster Versuch in {open_for:.0f} Sekunden")
+            logging.warning(f"Aufruf an {self.model} übersprungen: {error}")
+            return error
+        self.call_key, self.call_model = self.selected
+        self.served_by = f"{self.pool.name_for(self.call_key)}/{self.call_model}"
+        self.pool.begin(self.call_key, self.call_model)
+        return None
+
+    def start(self, request: str = "Anfrage") -> None:
+        """
+        Fordert das Kontingent beim RateLimiter an und zählt den Versuch; wird im try-Block des Aufrufers
+        ausgeführt, damit jeder Fehler über record_error läuft.
+
+        Args:
+            request (str, optional): Bezeichnung der Anfrage für das Log.
+        """
+        self.metrics.inc("llm_rate_limit_wait_seconds_total", self.limiter.acquire(self.call_key, self.call_model, self.estimated_tokens), model=self.call_model)
+        logging.info(f"Sende {request} an Gemini ({self.served_by}): {str(self.contents)[:100]}... (Versuch {self.attempt + 1})")
+        self.metrics.inc("llm_attempts_total", model=self.call_model)
+
+    def record_error(self, e: Exception) -> LLMError:
+        """
+        Klassifiziert den Fehler eines Versuchs, gibt Schlüssel und Modell im Pool frei und meldet das
+        Ergebnis an den Circuit Breaker (nur vorübergehende Fehler zählen als Ausfall).
+
+        Args:
+            e (Exception): Die Ausnahme des Backends.
+
+        Returns:
+            LLMError: Der klassifizierte Fehler.
+        """
+        error = classify_llm_error(e)
+        self.pool.end(self.call_key, self.call_model, error=error)
+        logging.error(f"Gemini API Fehler ({error.kind}, {self.served_by}): {error}")
+        self.metrics.inc("llm_errors_total", model=self.call_model, kind=error.kind)
+        if error.retryable:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return error
+
+    def retry(self, error: LLMError) -> bool:
+        """
+        Entscheidet nach einem Fehler über den nächsten Versuch: bei einem Kontingent-Fehler sofort auf einen
+        anderen Schlüssel bzw. ein Ersatzmodell ausweichen, sonst nach llm_retry_delay warten, solange der
+        Fehler wiederholbar ist und API_MAX_RETRIES nicht erreicht ist.
+
+        Args:
+            error (LLMError): Der Fehler des letzten Versuchs.
+
+        Returns:
+            bool: True für einen weiteren Versuch, False, wenn der Fehler zurückgegeben wird.
+        """
+        if isinstance(error, QuotaExceededError):
+            self.metrics.inc("llm_429_total", model=self.call_model)
+            alternative = self.pool.select(self.api_key, self.model, self.estimated_tokens, self.limiter, self.breakers)
+            if alternative and alternative != self.selected and self.failovers < len(self.pool.candidates(self.api_key, self.model)):
+                # Sofort auf einen anderen Schlüssel bzw. ein Ersatzmodell ausweichen, ohne zu warten.
+                self.failovers += 1
+                logging.warning(f"Kontingent von {self.served_by} erschöpft, weiche aus auf {self.pool.name_for(alternative[0])}/{alternative[1]}.")
+                return True
+        self.attempt += 1
+        if not error.retryable or self.attempt >= API_MAX_RETRIES:
+            return False
+        delay = llm_retry_delay(error, self.attempt)
+        self.metrics.inc("llm_retries_total", model=self.call_model)
+        logging.warning(f"{'API-Kontingent erschöpft' if error.kind == 'quota' else 'Vorübergehender Fehler'}. Warte {delay:.2f} Sekunden{' (Vorgabe des Servers)' if error.retry_after is not None else ''}...")
+        tracked_sleep(delay)
+        return True
+
+    def record_success(self, total_tokens: int = None) -> None:
+        """
+        Meldet einen erfolgreichen Versuch an Circuit Breaker, Pool und RateLimiter.
+
+        Args:
+            total_tokens (int, optional): Tatsächlicher Tokenverbrauch laut Antwort; None, wenn unbekannt.
+        """
+        self.breaker.record_success()
+        self.pool.end(self.call_key, self.call_model, tokens=total_tokens or self.estimated_tokens)
+        if total_tokens:
+            self.limiter.record_usage(self.call_key, self.call_model, total_tokens - self.estimated_tokens)
+
+    def result(self, text: str = None, error: LLMError = None) -> Dict[str, Any]:
+        """
+        Bildet das Ergebnis im Format von call_gemini_api und zählt es in llm_requests_total.
+
+        Args:
+            text (str, optional): Der Antworttext eines erfolgreichen Versuchs (leer bei einer leeren Antwort).
+            error (LLMError, optional): Der endgültige Fehler; hat Vorrang vor `text`.
+
+        Returns:
+            Dict[str, Any]: "response" sowie ggf. "error", "served_by" und "failovers".
+        """
+        if error is not None:
+            outcome, result = error.kind, {"response": llm_error_message(error, self.attempt), "error": error.kind}
+        elif not text:
+            msg = "Leere Antwort von Gemini API."
+            logging.warning(msg)
+            outcome, result = "empty", {"response": msg, "error": "empty"}
+        else:
+            self.metrics.observe("llm_response_bytes", len(text.encode("utf-8")), model=self.call_model)
+            outcome, result = "ok", {"response": text}
+        self.metrics.inc("llm_requests_total", model=self.model, outcome=outcome)
+        if self.served_by is not None:
+            result["served_by"] = self.served_by
+        result["failovers"] = self.failovers
+        return result
+
+def call_gemini_api(contents: list, api_key: str, model: str, use_cache: bool = False) -> Dict[str, str]:
+    """
+    Ruft die Gemini API auf, mit Modell-Auswahl.
+    Pro Versuch wählt der ApiKeyPool den am wenigsten ausgelasteten gesunden Schlüssel (bzw. ein
+    Ersatzmodell); bei einem Kontingent-Fehler wird sofort auf einen anderen Kandidaten ausgewichen.
+    Vor jedem Versuch wird das Kontingent beim prozessweiten RateLimiter angefordert. Fehler werden
+    klassifiziert (classify_llm_error): Kontingent- und vorübergehende Fehler werden wiederholt
+    (mit der Wartezeit des Servers, falls vorgegeben), permanente nicht. Ist der Circuit Breaker
+    für Schlüssel und Modell offen, wird sofort ein Fehler geliefert.
+
+    Args:
+        contents (list): Die Inhalte, die an die API gesendet werden sollen.
+        api_key (str): Der API-Schlüssel für den Gemini-Dienst (None, wenn nur der Schlüssel-Pool verwendet wird).
+        model (str): Das Modell, das verwendet werden soll.
+        use_cache (bool, optional): Antworten aus dem persistenten Antwort-Cache lesen bzw. dort ablegen.
+
+    Returns:
+        Dict[str, str]: Die Antwort von der API unter "response". Bei einem Fehler steht dort die
+        Fehlermeldung und zusätzlich unter "error" die Fehlerart (quota, transient, permanent, circuit_open, empty).
+        "served_by" nennt Schlüsselname und Modell des letzten Versuchs, "failovers" die Anzahl der Ausweichvorgänge.
+    """
+    cache_key, cached_response = lookup_cached_response(model, contents, use_cache)
+    if cached_response is not None:
+        return {"response": cached_response}
+    attempts = LLMCallAttempts(contents, api_key, model)
+    while True:
+        error = attempts.select()
+        if error:
+            return attempts.result(error=error)
+        try:
+            attempts.start()
+            start = time.perf_counter()
+            try:
+                response = attempts.backend.generate_content(attempts.call_key, attempts.call_model, contents)  # Modell wird übergeben
+            finally:
+                attempts.metrics.observe("llm_request_duration_seconds", time.perf_counter() - start, model=attempts.call_model)
+        except Exception as e:
+            error = attempts.record_error(e)
+            if attempts.retry(error):
+                continue
+            return attempts.result(error=error)
+        usage = getattr(response, "usage_metadata", None)
+        attempts.record_success(getattr(usage, "total_token_count", None) if usage else None)
+        result = attempts.result(getattr(response, "text", None))
+        if cache_key and not result.get("error"):
+            get_response_cache().put(cache_key, model, result["response"])
+        return result
+
+def call_gemini_api_stream(contents: list, api_key: str, model: str, use_cache: bool = False, status: Dict[str, Any] = None) -> Iterator[str]:
+    """
+    Ruft die Gemini API im Streaming-Modus auf und liefert die Antwort stückweise.
+    Fehlerbehandlung wie bei call_gemini_api; wiederholt wird nur, solange noch kein Teilstück geliefert wurde.
+
+    Args:
+        contents (list): Die Inhalte, die an die API gesendet werden sollen.
+        api_key (str): Der API-Schlüssel für den Gemini-Dienst.
+        model (str): Das Modell, das verwendet werden soll.
+        use_cache (bool, optional): Antworten aus dem persistenten Antwort-Cache lesen bzw. dort ablegen.
+        status (Dict[str, Any], optional): Erhält wie das Ergebnis von call_gemini_api "error" (bei einem Fehler),
+            "served_by" und "failovers", da die Teilstücke selbst nur Text sind.
+
+    Yields:
+        str: Die Textstücke der Antwort (bzw. eine Fehlermeldung wie bei call_gemini_api).
+    """
+    if status is None:
+        status = {}
+    cache_key, cached_response = lookup_cached_response(model, contents, use_cache)
+    if cached_response is not None:
+        yield cached_response
+        return
+    attempts = LLMCallAttempts(contents, api_key, model)
+    status["failovers"] = 0
+    while True:
+        error = attempts.select()
+        if error:
+            result = attempts.result(error=error)
+            status.update(result)
+            yield status.pop("response")
+            return
+        status["served_by"] = attempts.served_by
+        received = []
+        start = None
+        try:
+            attempts.start("Streaming-Anfrage")
+            start = time.perf_counter()
+            total_tokens = None
+            for chunk in attempts.backend.generate_content_stream(attempts.call_key, attempts.call_model, contents):
+                usage = getattr(chunk, "usage_metadata", None)
+                if usage and getattr(usage, "total_token_count", None):
+                    total_tokens = usage.total_token_count
+                text = getattr(chunk, "text", None)
+                if text:
+                    received.append(text)
+                    yield text
+        except GeneratorExit:
+            # Der Aufrufer hat das Streaming abgebrochen (Stopp, Rerun, close()). Abgebrochen werden kann nur nach
+            # einem gelieferten Teilstück, der Dienst war also erreichbar; das gibt auch einen Probeaufruf frei.
+            if received:
+                attempts.breaker.record_success()
+            else:
+                attempts.breaker.release_probe()
+            attempts.pool.end(attempts.call_key, attempts.call_model)
+            raise
+        except Exception as e:
+            error = attempts.record_error(e)
+            if start is not None:
+                attempts.metrics.observe("llm_request_duration_seconds", time.perf_counter() - start, model=attempts.call_model)
+            if received:
+                # Bereits gelieferte Teilstücke bleiben die (unvollständige) Antwort.
+                attempts.metrics.inc("llm_requests_total", model=model, outcome="partial")
+                return
+            if attempts.retry(error):
+                status["failovers"] = attempts.failovers
+                continue
+            status.update(attempts.result(error=error))
+            yield status.pop("response")
+            return
+        attempts.metrics.observe("llm_request_duration_seconds", time.perf_counter() - start, model=attempts.call_model)
+        attempts.record_success(total_tokens)
+        result = attempts.result("".join(received))
+        if result.get("error"):
+            status.update(result)
+            yield status.pop("response")
+            return
+        if cache_key:
+            get_response_cache().put(cache_key, model, result["response"])
+        return
+
+@instrumented("generate_summary")
+def generate_summary(text: str, api_key: str, use_cache: bool = False, status: Dict[str, Any] = None) -> str:
+    """
+    Generiert eine Textzusammenfassung.
+
+    Args:
+        text (str): Der zu zusammenfassende Text.
+        api_key (str): Der API-Schlüssel für den Gemini-Dienst.
+        use_cache (bool, optional): Den persistenten Antwort-Cache verwenden.
+        status (Dict[str, Any], optional): Erhält "error" (bei einem Fehler), "served_by" und "failovers"
+            aus dem Ergebnis von call_gemini_api.
+
+    Returns:
+        str: Die generierte Zusammenfassung (bzw. die Fehlermeldung).
+    """
+    prompt = f"Fasse den folgenden Text prägnant zusammen:\n\n{text}"
+    result = call_gemini_api([prompt], api_key, model=MODEL_NAME_TEXT, use_cache=use_cache)  # Textmodell
+    if status is not None:
+        status.update({key: result[key] for key in ("error", "served_by", "failovers") if key in result})
+    return result.get("response", "Fehler: Keine Zusammenfassung generiert.")
+
+@instrumented("process_uploaded_file")
+def process_uploaded_file(uploaded_file, api_key: str) -> str:
+    """
+    Verarbeitet die hochgeladene Datei und gibt eine Zusammenfassung/Beschreibung zurück.
+
+    Args:
+        uploaded_file: Die hochgeladene Datei.
+        api_key (str): Der API-Schlüssel für den Gemini-Dienst.
+
+    Returns:
+        str: Die generierte Zusammenfassung/Beschreibung.
+    """
+    if uploaded_file is None:
+        return "Start der Konversation."
+
+    try:
+        _, file_part = get_uploaded_file_part(uploaded_file)  # Einmal lesen, danach aus dem Cache
+        file_bytes = file_part.inline_data.data
+        mime_type = uploaded_file.type  # MIME-Type direkt aus Streamlit-Objekt
+
+        if mime_type == "application/pdf":
+            return generate_pdf_summary_from_bytes(file_bytes, api_key)
+        elif mime_type.startswith("image"):
+            return generate_image_summary_from_bytes(file_bytes, mime_type, api_key)
+        else:
+            logging.warning(f"Nicht unterstützter Dateityp: {mime_type}")
+            return f"Nicht unterstützter Dateityp: {mime_type}"
+
+    except Exception as e:
+        logging.error(f"Fehler beim Verarbeiten der Datei: {e}", exc_info=e)
+        return "Fehler beim Verarbeiten der Datei."
+
+class SummaryPolicy:
+    """
+    Entscheidet, wann die rollierende Zusammenfassung neu berechnet wird:
+    alle `every_n_turns` Runden oder sobald `max_pending_chars` Zeichen unzusammengefasst sind.
+    Mit every_n_turns=1 wird (wie früher) nach jeder Runde zusammengefasst.
+    """
+
+    def __init__(self, every_n_turns: int = SUMMARY_EVERY_N_TURNS, max_pending_chars: int = SUMMARY_MAX_PENDING_CHARS):
+        self.every_n_turns = max(1, int(every_n_turns))
+        self.max_pending_chars = max(1, int(max_pending_chars))
+
+    def should_summarize(self, pending_turns: int, pending_chars: int) -> bool:
+        """
+        Args:
+            pending_turns (int): Anzahl der Runden seit der letzten Zusammenfassung.
+            pending_chars (int): Zeichenanzahl dieser Runden.
+
+        Returns:
+            bool: True, wenn jetzt zusammengefasst werden soll.
+        """
+        return pending_turns >= self.every_n_turns or pending_chars >= self.max_pending_chars
+
+    def describe(self) -> str:
+        return f"alle {self.every_n_turns} Runden oder ab {self.max_pending_chars} Zeichen"
+
+class NoveltyDetector:
+    """
+    Bewertet lokal (ohne API-Aufruf), wie viel Neues eine Antwort gegenüber den letzten Beiträgen bringt.
+    Jede Antwort wird in Wort-n-Gramme (Shingles) zerlegt; die Ähnlichkeit ist die größte
+    Jaccard-Ähnlichkeit zu einem der letzten `window` Beiträge, die Neuheit 1 - Ähnlichkeit.
+    Bleibt die Neuheit `stagnation_turns` Antworten in Folge unter `stagnation_threshold`,
+    gilt die Diskussion als festgefahren.
+    """
+
+    def __init__(
+        self,
+        shingle_size: int = NOVELTY_SHINGLE_SIZE,
+        window: int = NOVELTY_WINDOW,
+        duplicate_similarity: float = NOVELTY_DUPLICATE_SIMILARITY,
+        stagnation_threshold: float = NOVELTY_STAGNATION_THRESHOLD,
+        stagnation_turns: int = NOVELTY_STAGNATION_TURNS
+    ):
+        self.shingle_size = max(1, int(shingle_size))
+        self.duplicate_similarity = duplicate_similarity
+        self.stagnation_threshold = stagnation_threshold
+        self.stagnation_turns = max(1, int(stagnation_turns))
+        self._recent: Deque[frozenset] = deque(maxlen=max(1, int(window)))
+        self._low_streak = 0
+        self.scores: List[float] = []
+
+    def shingles(self, text: str) -> frozenset:
+        """
+        Args:
+            text (str): Die Antwort.
+
+        Returns:
+            frozenset: Hashes der Wort-n-Gramme (Groß-/Kleinschreibung und Satzzeichen werden ignoriert).
+        """
+        words = re.findall(r"\w+", text.lower())
+        size = self.shingle_size
+        if len(words) < size:
+            return frozenset([hash(tuple(words))]) if words else frozenset()
+        return frozenset(hash(tuple(words[i:i + size])) for i in range(len(words) - size + 1))
+
+    def similarity(self, text: str) -> float:
+        """
+        Größte Jaccard-Ähnlichkeit der Antwort zu einem der letzten Beiträge (ohne sie aufzunehmen).
+
+        Args:
+            text (str): Die Antwort.
+
+        Returns:
+            float: Ähnlichkeit zwischen 0 (nichts gemeinsam) und 1 (identisch).
+        """
+        current = self.shingles(text)
+        best = 0.0
+        for previous in self._recent:
+            union = len(current | previous)
+            if union:
+                best = max(best, len(current & previous) / union)
+        return best
+
+    def is_duplicate(self, similarity: float) -> bool:
+        return similarity >= self.duplicate_similarity
+
+    def add(self, text: str) -> float:
+        """
+        Bewertet die Antwort und nimmt sie in das Vergleichsfenster auf.
+
+        Args:
+            text (str): Die Antwort.
+
+        Returns:
+            float: Neuheit der Antwort (1 - Ähnlichkeit).
+        """
+        novelty = 1.0 - self.similarity(text)
+        self._recent.append(self.shingles(text))
+        self.scores.append(novelty)
+        self._low_streak = self._low_streak + 1 if novelty < self.stagnation_threshold else 0
+        return novelty
+
+    def stagnant(self) -> bool:
+        return self._low_streak >= self.stagnation_turns
+
+    def describe(self) -> str:
+        return f"{self.shingle_size}-Gramm-Jaccard, Stopp nach {self.stagnation_turns} Antworten mit Neuheit < {self.stagnation_threshold}"
+
+async def call_gemini_api_async(contents: list, api_key: str, model: str, use_cache: bool = False) -> Dict[str, str]:
+    """
+    Asynchrone Variante von call_gemini_api. Der blockierende Aufruf (inkl. Ratenbegrenzung
+    und Retries) läuft in einem Worker-Thread, sodass die Event-Loop weiterarbeiten kann.
+
+    Args:
+        contents (list): Die Inhalte, die an die API gesendet werden sollen.
+        api_key (str): Der API-Schlüssel für den Gemini-Dienst.
+        model (str): Das Modell, das verwendet werden soll.
+        use_cache (bool, optional): Den persistenten Antwort-Cache verwenden.
+
+    Returns:
+        Dict[str, str]: Die Antwort von der API.
+    """
+    return await asyncio.to_thread(call_gemini_api, contents, api_key, model, use_cache)
+
+async def stream_gemini_api_async(contents: list, api_key: str, model: str, use_cache: bool = False, status: Dict[str, Any] = None) -> AsyncIterator[str]:
+    """
+    Asynchrone Variante von call_gemini_api_stream; jedes Teilstück wird in einem Worker-Thread abgeholt.
+
+    Args:
+        contents (list): Die Inhalte, die an die API gesendet werden sollen.
+        api_key (str): Der API-Schlüssel für den Gemini-Dienst.
+        model (str): Das Modell, das verwendet werden soll.
+        use_cache (bool, optional): Den persistenten Antwort-Cache verwenden.
+        status (Dict[str, Any], optional): Erhält bei einem Fehler unter "error" die Fehlerart.
+
+    Yields:
+        str: Die Textstücke der Antwort.
+    """
+    chunks = call_gemini_api_stream(contents, api_key, model, use_cache, status)
+    done = object()
+    while True:
+        chunk = await asyncio.to_thread(next, chunks, done)
+        if chunk is done:
+            break
+        yield chunk
+
+async def generate_summary_async(text: str, api_key: str, use_cache: bool = False, status: Dict[str, Any] = None) -> str:
+    """
+    Asynchrone Variante von generate_summary.
+
+    Args:
+        text (str): Der zu zusammenfassende Text.
+        api_key (str): Der API-Schlüssel für den Gemini-Dienst.
+        use_cache (bool, optional): Den persistenten Antwort-Cache verwenden.
+        status (Dict[str, Any], optional): Erhält bei einem Fehler unter "error" die Fehlerart.
+
+    Returns:
+        str: Die generierte Zusammenfassung.
+    """
+    return await asyncio.to_thread(generate_summary, text, api_key, use_cache, status)
+
+def build_agent_prompt(
+    conversation_topic: str,
+    agent_config: Dict[str, str],
+    iteration_label: str,
+    current_summary: str,
+    recent_text: str,
+    previous_output: str,
+    language: str,
+    has_file: bool
+) -> str:
+    """
+    Baut den Prompt für den Beitrag eines Agenten.
+
+    Args:
+        conversation_topic (str): Das Thema der Konversation.
+        agent_config (Dict[str, str]): Name, Persönlichkeit und Anweisung des Agenten.
+        iteration_label (str): Bezeichnung der Runde, z.B. "Iteration 3".
+        current_summary (str): Die aktuelle rollierende Zusammenfassung.
+        recent_text (str): Noch nicht zusammengefasste Beiträge (wörtlich) oder "".
+        previous_output (str): Die Antwort des vorherigen Agenten oder None.
+        language (str): Die Sprache der Antwort.
+        has_file (bool): Ob eine Datei angehängt ist.
+
+    Returns:
+        str: Der Prompt-Text.
+    """
+    agent_name = agent_config["name"]
+    personality = agent_config.get("personality", "neutral")
+    prompt_text = (
+        f"Wir führen eine Konversation über: '{conversation_topic}'.\n"
+        + (f"Zusätzliche Informationen sind in der angehängten Datei verfügbar.\n" if has_file else "")
+        + f"Hier ist die Zusammenfassung der bisherigen Diskussion:\n{current_summary}\n\n"
+        + (f"Neueste Beiträge (noch nicht zusammengefasst):\n{recent_text}" if recent_text else "")
+        + f"{iteration_label}: Agent {agent_name}, bitte antworte. {agent_config.get('instruction', '')}\n"
+    )
+    if previous_output is not None:
+        prompt_text += f"Der vorherige Agent sagte: {previous_output}\n"
+    prompt_text += agent_config.get("personality_suffix", PERSONALITY_PROMPT_SUFFIXES.get(personality, ""))
+    prompt_text += f"\n\nAntworte auf {language}."
+    return prompt_text
+
+def write_chat_history_file(chat_history: List[Dict[str, str]], filename: str) -> None:
+    """
+    Schreibt den Chatverlauf in eine Textdatei.
+
+    Args:
+        chat_history (List[Dict[str, str]]): Der Chatverlauf.
+        filename (str): Der Name der Datei.
+    """
+    try:
+        with open(filename, "w", encoding="utf-8") as f:
+            for message in chat_history:
+                f.write(f"{message['role']}: {message['content']}\n")
+    except IOError as e:
+        logging.error(f"Fehler beim Schreiben in Chatverlauf-Datei '{filename}': {e}")
+
+async def joint_conversation_async(
+    conversation_topic: str,
+    selected_agents: List[Dict[str, str]],
+    iterations: int,
+    expertise_level: str,
+    language: str,
+    chat_history: List[Dict[str, str]],
+    user_state: str,
+    discussion_id: str = None,
+    api_key: str = None,
+    uploaded_file=None,
+    summary_mode: str = CONVERSATION_SUMMARY_MODE,
+    summary_policy: SummaryPolicy = None,
+    stats: Dict[str, Any] = None,
+    use_response_cache: bool = False,
+    stream: bool = False,
+    round_mode: str = "sequential",
+    max_concurrency: int = PANEL_MAX_CONCURRENCY,
+    progress_callback: Callable[[Dict[str, Any]], None] = None,
+    novelty_detector: NoveltyDetector = None,
+    early_stop: bool = False,
+    resume_state: Dict[str, Any] = None
+):
+    """
+    Asynchroner Konversations-Motor. Die Zusammenfassung einer Runde wird als Hintergrund-Task
+    gestartet, sodass Chatverlauf, Persistenz und Darstellung parallel zum LLM-Aufruf laufen.
+    Auch die Speicherung einer Iteration läuft im Hintergrund weiter, während der nächste Agent antwortet.
+
+    Mit angemeldetem Benutzer wird die Diskussion nach jeder Iteration in discussion_messages fortgeschrieben
+    (Status "running"; bei Abbruch "interrupted", am Ende "completed") und kann fortgesetzt werden.
+
+    Im Modus "sequential" wartet jeder Agent auf die aktuelle Zusammenfassung (bisheriges Verhalten).
+    Im Modus "pipelined" startet der nächste Agent sofort mit der zuletzt fertigen Zusammenfassung
+    und der Antwort des vorherigen Agenten; die Zusammenfassungen werden im Hintergrund verkettet.
+    Wann zusammengefasst wird, bestimmt die SummaryPolicy; noch nicht zusammengefasste Beiträge
+    werden wörtlich an den Prompt angehängt. Fehlerantworten von call_gemini_api (Ergebnis mit "error")
+    erscheinen im Verlauf, werden aber weder zusammengefasst noch dem nächsten Agenten zitiert;
+    eine fehlgeschlagene Zusammenfassung ersetzt nie die bisherige.
+
+    Args:
+        conversation_topic (str): Das Thema der Konversation.
+        selected_agents (List[Dict[str, str]]): Die Liste der ausgewählten Agenten.
+        iterations (int): Die Anzahl der Gesprächsrunden.
+        expertise_level (str): Das Experten-Level der Agenten.
+        language (str): Die Sprache der Konversation.
+        chat_history (List[Dict[str, str]]): Der Chatverlauf.
+        user_state (str): Der Zustand des Benutzers.
+        discussion_id (str, optional): Die ID der Diskussion.  Wird automatisch generiert, wenn nicht angegeben.
+        api_key (str, optional): Der API-Schlüssel für den Gemini-Dienst.
+        uploaded_file: Die hochgeladene Datei (optional).
+        summary_mode (str, optional): "sequential" oder "pipelined".
+        summary_policy (SummaryPolicy, optional): Taktung der Zusammenfassung. Standard: SummaryPolicy().
+        stats (Dict[str, Any], optional): Wird mit Kennzahlen der Diskussion befüllt (Policy, Aufrufe, gesparte Aufrufe,
+            Fehler sowie Aufrufe pro Schlüssel/Modell und Ausweichvorgänge des Schlüssel-Pools).
+        use_response_cache (bool, optional): Antworten aus dem persistenten Antwort-Cache verwenden
+            (aus für "kreative" Läufe, an für Demos und Regressionsläufe).
+        stream (bool, optional): Agentenantworten gestreamt abrufen und als Teilstücke weiterreichen
+            (nur im Modus "sequential").
+        round_mode (str, optional): "sequential" (reihum) oder "panel" (alle Agenten antworten pro Runde
+            gleichzeitig, Fehler einzelner Agenten brechen die Runde nicht ab).
+        max_concurrency (int, optional): Maximale Anzahl paralleler Aufrufe im Panel-Modus.
+        progress_callback (Callable, optional): Wird nach jedem Beitrag mit discussion_id, iteration und
+            agent_name aufgerufen (z.B. um die Bewertungsinfo der Oberfläche zu aktualisieren).
+        novelty_detector (NoveltyDetector, optional): Lokale Neuheitsbewertung jeder Antwort. Standard: NoveltyDetector().
+            Beinahe-Wiederholungen lösen im Modus "sequential" den Retry und später den Themenwechsel aus.
+        early_stop (bool, optional): Diskussion vorzeitig beenden, sobald die Neuheit dauerhaft unter der
+            Schwelle bleibt; die nicht mehr benötigten Agentenaufrufe werden in stats gemeldet.
+        resume_state (Dict[str, Any], optional): Zustand aus load_resume_state_db; die Diskussion wird nach
+            der letzten abgeschlossenen Runde fortgesetzt (ohne erneuten Datei-Upload).
+
+    Yields:
+        Tuple: Aktualisierter Chatverlauf, formatierter Textabschnitt, Diskussions-ID, Iterationsnummer, Agentenname.
+        Im Streaming-Modus zusätzlich Teilstücke mit Chatverlauf None und dem neuen Textstück als zweitem Element.
+        Im Panel-Modus ist die Iterationsnummer die Runde; pro Agent wird einmal geliefert.
+    """
+    if discussion_id is None:
+        discussion_id = new_discussion_id()
+    if summary_mode not in SUMMARY_MODES:
+        logging.warning(f"Unbekannter Zusammenfassungsmodus '{summary_mode}', verwende 'sequential'.")
+        summary_mode = "sequential"
+    if round_mode not in ROUND_MODES:
+        logging.warning(f"Unbekannter Rundenmodus '{round_mode}', verwende 'sequential'.")
+        round_mode = "sequential"
+
+    # ---  Verwende IMMER eine feste Datei.  Guter Name, um Konflikte zu vermeiden. ---
+    chat_history_filename = "chat_history.txt"
+
+    # --- Option zum Auskommentieren (für lokale Entwicklung nützlich) ---
+    # Setze USE_CHAT_HISTORY_FILE auf False, um das Schreiben zu deaktivieren.
+    USE_CHAT_HISTORY_FILE = False   #  Oder True
+
+    active_agents_names = [sa["name"] for sa in selected_agents]
+    num_agents = len(active_agents_names)
+    agent_outputs = [""] * num_agents
+    agent_turns: List[Union[int, None]] = [None] * num_agents  # Index der zuletzt erfolgreichen Antwort je Agent in turns
+    topic_changed = False
+    logging.info(f"Konversation gestartet: {active_agents_names}, iters={iterations}, level={expertise_level}, lang={language}, Diskussions-ID: {discussion_id}, Datei: {uploaded_file is not None}, Modus: {summary_mode}/{round_mode}")
+
+    if summary_policy is None:
+        summary_policy = SummaryPolicy()
+    if novelty_detector is None:
+        novelty_detector = NoveltyDetector()
+    if stats is None:
+        stats = {}
+    stats.update({"round_mode": round_mode, "summary_policy": summary_policy.describe(), "turns": 0, "summary_calls": 0, "summary_calls_saved": 0, "agent_errors": 0, "summary_errors": 0, "llm_calls_by_key": {}, "key_failovers": 0,
+                  "novelty": novelty_detector.describe(), "novelty_scores": [], "near_duplicates": 0, "novelty_retries": 0,
+                  "stopped_early_at": None, "early_stop_calls_saved": 0})
+    cache_stats_before = get_response_cache().stats() if use_response_cache else None
+
+    # Datei einmal lesen; alle Aufrufe der Diskussion verwenden denselben Part aus dem Cache.
+    file_part = None
+    if uploaded_file is not None:
+        try:
+            _, file_part = await asyncio.to_thread(get_uploaded_file_part, uploaded_file)
+        except Exception as e:
+            logging.error(f"Fehler beim Lesen der Datei: {e}", exc_info=e)
+
+    if resume_state is None:
+        initial_summary = await asyncio.to_thread(process_uploaded_file, uploaded_file, api_key)
+        # Zuletzt fertiggestellte Zusammenfassung; "covered" = Anzahl der darin enthaltenen Beiträge.
+        summary_state = {"text": initial_summary, "covered": 0}
+        turns: List[Tuple[str, str]] = []  # (Agentenname, Antwort) aller bisherigen Runden, ohne Fehlerantworten
+        start_round = 0
+    else:
+        # Fortsetzung: Verlauf, Beiträge und Zusammenfassung aus der Datenbank übernehmen.
+        chat_history.extend(resume_state["chat_history"])
+        summary_state = dict(resume_state["summary_state"])
+        turns = list(resume_state["turns"])
+        agent_outputs = list(resume_state["agent_outputs"])
+        for turn_idx, (name, _) in enumerate(turns):
+            if name in active_agents_names:
+                agent_turns[active_agents_names.index(name)] = turn_idx
+        start_round = resume_state["completed_rounds"]
+        for _, output in turns[-NOVELTY_WINDOW:]:
+            novelty_detector.add(output)
+        logging.info(f"Setze Diskussion {discussion_id} nach Runde {start_round} fort ({len(turns)} Beiträge).")
+    summary_task = None
+    rounds_completed = False
+    scheduled = summary_state["covered"]  # Anzahl der Beiträge, für die bereits eine Zusammenfassung gestartet wurde
+
+    if user_state:
+        await asyncio.to_thread(start_discussion_db, discussion_id, conversation_topic, active_agents_names, user_state, {
+            "selected_agents": selected_agents, "iterations": iterations, "expertise_level": expertise_level,
+            "language": language, "summary_mode": summary_mode, "round_mode": round_mode,
+            "initial_summary": summary_state["text"]
+        }, resume_state is not None)
+
+    stored_summary = {"text": None}  # Zuletzt in discussion_messages gespeicherte Zusammenfassung
+
+    def summary_columns(text: str, covered: int) -> Dict[str, Any]:
+        # Die Zusammenfassung nur bei Änderung speichern; expand_discussion_messages setzt sie wieder ein.
+        changed = text != stored_summary["text"]
+        stored_summary["text"] = text
+        return {"summary": text if changed else None, "summary_covered": covered}
+
+    persist_task = None  # Speicherung der vorherigen Iteration, läuft parallel zum nächsten LLM-Aufruf
+
+    async def write_iteration(rows: List[Dict[str, Any]], history: List[Dict[str, Any]]) -> None:
+        if rows:
+            await asyncio.to_thread(append_discussion_messages_db, discussion_id, rows)
+        if history is not None:
+            await asyncio.to_thread(write_chat_history_file, history, chat_history_filename)
+
+    async def persist_messages(turn: int, entries: List[Tuple[List[Dict[str, Any]], str, float]], prompt_summary: Tuple[str, int] = None) -> None:
+        # Nachrichten einer Iteration samt Stand der Zusammenfassung in einer Transaktion anhängen (nur mit Benutzer)
+        # und ggf. die Chatverlauf-Datei schreiben. Zeilen und Kopie des Verlaufs entstehen sofort, geschrieben wird
+        # im Hintergrund; die vorherige Speicherung wird zuvor abgewartet, damit die Reihenfolge erhalten bleibt.
+        # entries: (Chat-Nachrichten, Agentenname, Dauer in Sekunden) pro Agent; prompt_summary: (Text, covered) der Prompts.
+        nonlocal persist_task
+        history = list(chat_history) if USE_CHAT_HISTORY_FILE and turn is not None else None
+        if not user_state and history is None:
+            return
+        rows = []
+        for messages, agent_name, duration in (entries if user_state else []):
+            for m in messages:
+                row = {"turn": turn, "agent": agent_name, "role": m["role"], "content": m["content"], "error": m.get("error"), "duration_seconds": duration}
+                if m["role"] == "user" and prompt_summary is not None:
+                    # Prompt ohne die (lange) Zusammenfassung speichern.
+                    row["content"] = format_prompt_message(agent_name, turn, conversation_topic, PROMPT_SUMMARY_PLACEHOLDER, file_part is not None)
+                    row.update(summary_columns(*prompt_summary))
+                elif m["role"] == "assistant":
+                    row.update(summary_columns(summary_state["text"], summary_state["covered"]))
+                rows.append(row)
+        if persist_task is not None:
+            await persist_task
+        persist_task = asyncio.create_task(write_iteration(rows, history))
+
+    def count_llm_call(result: Dict[str, Any]) -> None:
+        # Welcher Schlüssel bzw. welches Modell den Aufruf bedient hat (Ergebnis oder Status-Dictionary).
+        served_by = result.get("served_by")
+        if served_by:
+            stats["llm_calls_by_key"][served_by] = stats["llm_calls_by_key"].get(served_by, 0) + 1
+        stats["key_failovers"] += result.get("failovers", 0)
+
+    async def chain_summary(previous_task, end: int) -> str:
+        # Baut auf der vorherigen Zusammenfassung auf, auch wenn diese noch berechnet wird.
+        previous_summary = await previous_task if previous_task is not None else summary_state["text"]
+        # Ab dem ersten noch nicht zusammengefassten Beitrag, damit nach einer fehlgeschlagenen
+        # Zusammenfassung nichts verloren geht.
+        start = summary_state["covered"]
+        new_answers = "\n\n".join(f"Neue Antwort von {name}:\n{output}" for name, output in turns[start:end])
+        new_summary_input = f"Bisherige Zusammenfassung:\n{previous_summary}\n\n{new_answers}"
+        summary_status = {}
+        summary = await generate_summary_async(new_summary_input, api_key, use_response_cache, summary_status)
+        count_llm_call(summary_status)
+        if summary_status.get("error"):
+            # Fehlermeldungen nie als Zusammenfassung weiterreichen; die Beiträge bleiben wörtlich im Prompt.
+            logging.warning(f"Zusammenfassung fehlgeschlagen ({summary_status['error']}), behalte die bisherige.")
+            stats["summary_errors"] += 1
+            return previous_summary
+        summary_state["text"] = summary
+        summary_state["covered"] = end
+        return summary
+
+    try:
+        if round_mode == "panel":
+            semaphore = asyncio.Semaphore(max(1, int(max_concurrency)))
+
+            async def panel_answer(agent_config: Dict[str, str], contents: list) -> Tuple[str, str, float]:
+                async with semaphore:
+                    started = time.perf_counter()
+                    api_resp = await call_gemini_api_async(contents, api_key, model=MODEL_NAME_TEXT, use_cache=use_response_cache)
+                    count_llm_call(api_resp)
+                    output = api_resp.get("response", f"Keine Antwort von {agent_config['name']}")
+                    if api_resp.get("error"):
+                        return output, api_resp["error"], time.perf_counter() - started
+                    if evaluate_response(output) == "schlechte antwort":
+                        logging.info(f"{agent_config['name']} => 'schlechte antwort', retry ...")
+                        retry_contents = [file_part, "Versuche eine kreativere Antwort."] if file_part is not None else ["Versuche eine kreativere Antwort."]
+                        retry_resp = await call_gemini_api_async(retry_contents, api_key, model=MODEL_NAME_TEXT, use_cache=use_response_cache)
+                        count_llm_call(retry_resp)
+                        retry_output = retry_resp.get("response", f"Keine Retry-Antwort von {agent_config['name']}")
+                        if not retry_resp.get("error"):
+                            output = retry_output
+                    return output, None, time.perf_counter() - started
+
+            for r in range(start_round, iterations):
+                if summary_task is not None and summary_mode == "sequential":
+                    await summary_task
+                current_summary, covered = summary_state["text"], summary_state["covered"]
+                recent_text = "".join(f"{name}: {output}\n\n" for name, output in turns[covered:])
+
+                # Alle Agenten beantworten dieselbe Zusammenfassung gleichzeitig (begrenzt durch die Semaphore).
+                panel_tasks = []
+                for agent_config in selected_agents:
+                    prompt_text = build_agent_prompt(
+                        conversation_topic, agent_config, f"Iteration {r+1}", current_summary, recent_text,
+                        None, language, file_part is not None
+                    )
+                    contents = [prompt_text, file_part] if file_part is not None else [prompt_text]
+                    panel_tasks.append(asyncio.create_task(panel_answer(agent_config, contents)))
+
+                round_messages = []  # Werden nach der Runde gemeinsam gespeichert (nur vollständige Runden).
+                try:
+                    # In fester Agenten-Reihenfolge übernehmen, damit der Verlauf deterministisch bleibt.
+                    for agent_idx, (agent_config, task) in enumerate(zip(selected_agents, panel_tasks)):
+                        current_agent_name = agent_config["name"]
+                        try:
+                            agent_output, agent_error, duration = await task
+                        except Exception as e:
+                            logging.error(f"Fehler bei Agent {current_agent_name} in Runde {r+1}: {e}", exc_info=e)
+                            agent_output, agent_error, duration = f"Fehler bei Agent {current_agent_name}: {e}", "exception", None
+                        if agent_error:
+                            # Fehlerantworten werden angezeigt, aber nicht zusammengefasst.
+                            stats["agent_errors"] += 1
+                        else:
+                            # Im Panel-Modus nur bewerten: ein Retry würde die gleichzeitige Runde serialisieren.
+                            if novelty_detector.is_duplicate(novelty_detector.similarity(agent_output)):
+                                stats["near_duplicates"] += 1
+                            novelty_detector.add(agent_output)
+                            agent_outputs[agent_idx] = agent_output
+                            turns.append((current_agent_name, agent_output))
+                            stats["turns"] += 1
+
+                        chat_history.append({
+                            "role": "user",
+                            "content": format_prompt_message(current_agent_name, r + 1, conversation_topic, current_summary, file_part is not None)
+                        })
+                        chat_history.append({
+                            "role": "assistant",
+                            "content": f"Antwort von Agent {current_agent_name} (Iteration {r+1}):\n{agent_output}",
+                            **({"error": agent_error} if agent_error else {})
+                        })
+                        round_messages.append((chat_history[-2:], current_agent_name, duration))
+
+                        if progress_callback:
+                            progress_callback({"discussion_id": discussion_id, "iteration": r + 1, "agent_name": current_agent_name})
+
+                        formatted_output_chunk = (
+                            f"**Iteration {r+1}: Agent {current_agent_name} ({agent_config.get('personality', 'neutral')})**\n\n"
+                            f"{agent_output}\n\n"
+                            "---\n\n"
+                        )
+                        yield chat_history, formatted_output_chunk, discussion_id, (r + 1), current_agent_name
+                finally:
+                    for task in panel_tasks:
+                        if not task.done():
+                            task.cancel()
+
+                await persist_messages(r + 1, round_messages, (current_summary, covered))
+
+                # Eine gemeinsame Zusammenfassung pro Runde (entfällt, wenn alle Agenten fehlgeschlagen sind).
+                if len(turns) > scheduled:
+                    summary_task = asyncio.create_task(chain_summary(summary_task, len(turns)))
+                    scheduled = len(turns)
+                    stats["summary_calls"] += 1
+
+                if early_stop and r + 1 < iterations and novelty_detector.stagnant():
+                    stats["stopped_early_at"] = r + 1
+                    stats["early_stop_calls_saved"] = (iterations - r - 1) * num_agents
+                    logging.info(f"Diskussion stagniert nach Runde {r+1}, beende vorzeitig ({stats['early_stop_calls_saved']} Agentenaufrufe gespart).")
+                    break
+        else:
+            for i in range(start_round, iterations):
+                agent_idx = i % num_agents
+                current_agent_name = active_agents_names[agent_idx]
+                current_agent_config = selected_agents[agent_idx]
+                current_personality = current_agent_config.get("personality", "neutral")
+
+                if summary_task is not None and summary_mode == "sequential":
+                    await summary_task
+                current_summary = summary_state["text"]
+                previous_output, quoted_turn = None, None
+                if i > 0:
+                    previous_idx = (agent_idx - 1) % num_agents
+                    quoted_turn = agent_turns[previous_idx]
+                    if quoted_turn is not None and quoted_turn != len(turns) - 1:
+                        # Der vorherige Agent ist zuletzt fehlgeschlagen: den neuesten Beitrag statt seiner älteren Antwort zitieren.
+                        quoted_turn = len(turns) - 1
+                        previous_output = turns[-1][1]
+                    else:
+                        previous_output = agent_outputs[previous_idx] or None
+                # Beiträge, die noch in keiner fertigen Zusammenfassung stecken (ohne den zitierten Beitrag).
+                covered = summary_state["covered"]
+                recent_turns = [turn for turn_idx, turn in enumerate(turns[covered:], covered) if turn_idx != quoted_turn]
+                recent_text = "".join(f"{name}: {output}\n\n" for name, output in recent_turns)
+
+                prompt_text = build_agent_prompt(
+                    conversation_topic, current_agent_config, f"Iteration {i+1}", current_summary, recent_text,
+                    previous_output, language, file_part is not None
+                )
+
+                # Inhalte vorbereiten: Datei-Part anhängen, falls vorhanden.
+                contents = [prompt_text, file_part] if file_part is not None else [prompt_text]
+
+                chat_history.append({
+                    "role": "user",
+                    "content": format_prompt_message(current_agent_name, i + 1, conversation_topic, current_summary, file_part is not None)
+                })
+
+                if stream:
+                    # Prompt-Eintrag sofort zeigen, dann die Antwort stückweise weiterreichen.
+                    yield chat_history, "", discussion_id, (i + 1), current_agent_name
+                    started = time.perf_counter()
+                    streamed_chunks = []
+                    stream_status = {}
+                    async for chunk in stream_gemini_api_async(contents, api_key, model=MODEL_NAME_TEXT, use_cache=use_response_cache, status=stream_status):
+                        streamed_chunks.append(chunk)
+                        yield None, chunk, discussion_id, (i + 1), current_agent_name
+                    agent_output = "".join(streamed_chunks) or f"Keine Antwort von {current_agent_name}"
+                    agent_error = stream_status.get("error")
+                    count_llm_call(stream_status)
+                else:
+                    started = time.perf_counter()
+                    api_resp = await call_gemini_api_async(contents, api_key, model=MODEL_NAME_TEXT, use_cache=use_response_cache)  # Immer Textmodell in der Konversation
+                    count_llm_call(api_resp)
+                    agent_output = api_resp.get("response", f"Keine Antwort von {current_agent_name}")
+                    agent_error = api_resp.get("error")
+
+                qual = evaluate_response(agent_output) if not agent_error else "neutral"
+                near_duplicate = not agent_error and novelty_detector.is_duplicate(novelty_detector.similarity(agent_output))
+                if near_duplicate:
+                    stats["near_duplicates"] += 1
+                if qual == "schlechte antwort":
+                    logging.info(f"{current_agent_name} => 'schlechte antwort', retry ...")
+                    # Retry-Logik mit korrekter Behandlung der Datei
+                    retry_contents = ["Versuche eine kreativere Antwort."]
+                    if file_part is not None:
+                        retry_contents = [file_part, "Versuche eine kreativere Antwort."]
+                elif near_duplicate:
+                    logging.info(f"{current_agent_name} => Beinahe-Wiederholung, retry ...")
+                    # Gleicher Prompt mit Hinweis, damit der Retry den Kontext der Diskussion behält.
+                    retry_contents = contents + [NOVELTY_RETRY_HINT]
+                    stats["novelty_retries"] += 1
+                if qual == "schlechte antwort" or near_duplicate:
+                    retry_resp = await call_gemini_api_async(retry_contents, api_key, model=MODEL_NAME_TEXT, use_cache=use_response_cache)  # Textmodell
+                    count_llm_call(retry_resp)
+                    retry_output = retry_resp.get("response", f"Keine Retry-Antwort von {current_agent_name}")
+                    if not retry_resp.get("error"):
+                        agent_output = retry_output
+                    near_duplicate = near_duplicate and novelty_detector.is_duplicate(novelty_detector.similarity(agent_output))
+
+                if agent_error:
+                    # Fehlerantworten werden angezeigt, aber weder zusammengefasst noch dem nächsten Agenten zitiert.
+                    logging.warning(f"Antwort von {current_agent_name} ist ein Fehler ({agent_error}) und wird nicht zusammengefasst.")
+                    stats["agent_errors"] += 1
+                else:
+                    novelty_detector.add(agent_output)
+                    agent_outputs[agent_idx] = agent_output
+                    agent_turns[agent_idx] = len(turns)
+                    turns.append((current_agent_name, agent_output))
+                    stats["turns"] += 1
+                    pending_chars = sum(len(output) for _, output in turns[scheduled:])
+                    if summary_policy.should_summarize(len(turns) - scheduled, pending_chars):
+                        # Zusammenfassung im Hintergrund starten, während Verlauf geschrieben und dargestellt wird.
+                        summary_task = asyncio.create_task(chain_summary(summary_task, len(turns)))
+                        scheduled = len(turns)
+                        stats["summary_calls"] += 1
+
+                chat_history.append({
+                    "role": "assistant",
+                    "content": f"Antwort von Agent {current_agent_name} (Iteration {i+1}):\n{agent_output}",
+                    **({"error": agent_error} if agent_error else {})
+                })
+                # Speichern (und mit USE_CHAT_HISTORY_FILE die Datei schreiben) überlappt mit dem nächsten Agentenaufruf.
+                await persist_messages(i + 1, [(chat_history[-2:], current_agent_name, time.perf_counter() - started)], (current_summary, covered))
+
+                # WICHTIG: Fortschritt (z.B. rating_info) VOR dem Yield melden
+                if progress_callback:
+                    progress_callback({"discussion_id": discussion_id, "iteration": i + 1, "agent_name": current_agent_name})
+
+                logging.info(f"Antwort Agent {current_agent_name} (i={i+1}): {agent_output[:50]}...")
+                formatted_output_chunk = (
+                    f"**Iteration {i+1}: Agent {current_agent_name} ({current_personality})**\n\n"
+                    f"{agent_output}\n\n"
+                    "---\n\n"
+                )
+                yield chat_history, formatted_output_chunk, discussion_id, (i + 1), current_agent_name
+
+                # Auch nach dem Retry noch eine Beinahe-Wiederholung: Themenwechsel (einmalig, erst gegen Ende).
+                if i > iterations * 0.6 and near_duplicate and not topic_changed:
+                    new_topic = "Neues Thema: KI-Trends 2026"
+                    agent_outputs = [new_topic] * num_agents
+                    agent_turns = [None] * num_agents  # Das neue Thema ist kein Beitrag und wird daher nicht ausgelassen.
+                    topic_changed = True
+
+                if early_stop and i + 1 < iterations and novelty_detector.stagnant():
+                    stats["stopped_early_at"] = i + 1
+                    stats["early_stop_calls_saved"] = iterations - i - 1
+                    logging.info(f"Diskussion stagniert nach Iteration {i+1}, beende vorzeitig ({stats['early_stop_calls_saved']} Agentenaufrufe gespart).")
+                    break
+
+        if summary_task is not None:
+            await summary_task
+        rounds_completed = True
+    finally:
+        if summary_task is not None and not summary_task.done():
+            summary_task.cancel()
+        if persist_task is not None:
+            # Die letzte Iteration vollständig speichern, bevor der Status gesetzt wird.
+            await persist_task
+        if user_state and not rounds_completed:
+            # Abbruch (z.B. Verbindung getrennt): bis zur letzten gespeicherten Runde fortsetzbar.
+            finish_discussion_db(discussion_id, "interrupted")
+
+    # Gegenüber einer Zusammenfassung nach jeder Runde eingesparte Aufrufe.
+    stats["summary_calls_saved"] = stats["turns"] - stats["summary_calls"]
+    logging.info(f"Zusammenfassungs-Policy ({stats['summary_policy']}): {stats['summary_calls']} Zusammenfassungen für {stats['turns']} Runden, {stats['summary_calls_saved']} Aufrufe gespart.")
+    stats["novelty_scores"] = [round(score, 3) for score in novelty_detector.scores]
+
+    final_summary_input = "Gesamter Chatverlauf:\n" + "\n".join(
+        [f"{m['role']}: {m['content']}" for m in chat_history if not m.get("error")]
+    )
+    final_summary_status = {}
+    final_summary = await generate_summary_async(final_summary_input, api_key, use_response_cache, final_summary_status)
+    count_llm_call(final_summary_status)
+    if cache_stats_before is not None:
+        cache_stats_after = get_response_cache().stats()
+        stats["response_cache_hits"] = cache_stats_after["hits"] - cache_stats_before["hits"]
+        stats["response_cache_misses"] = cache_stats_after["misses"] - cache_stats_before["misses"]
+    chat_history.append({
+        "role": "assistant",
+        "content": f"**Gesamtzusammenfassung**:\n{final_summary}"
+    })
+
+    if user_state:
+        await persist_messages(None, [(chat_history[-1:], None, None)])
+        await persist_task
+        await asyncio.to_thread(finish_discussion_db, discussion_id, "completed", final_summary)
+        logging.info(f"Diskussion {discussion_id} für {user_state} in Datenbank gespeichert.")
+    else:
+        logging.info("Keine Speicherung in Datenbank, kein Benutzer eingeloggt.")
+
+    final_text = agent_outputs[-1]
+    chat_history.append({
+        "role": "assistant",
+        "content": f"Finale Aussage:\n{final_text}"
+    })
+    logging.info(f"Finale Aussage: {final_text}")
+    yield chat_history, final_summary, discussion_id, None, None
+
+def joint_conversation_with_selected_agents(
+    conversation_topic: str,
+    selected_agents: List[Dict[str, str]],
+    iterations: int,
+    expertise_level: str,
+    language: str,
+    chat_history: List[Dict[str, str]],
+    user_state: str,
+    discussion_id: str = None,
+    api_key: str = None,
+    uploaded_file=None,
+    summary_mode: str = CONVERSATION_SUMMARY_MODE,
+    summary_policy: SummaryPolicy = None,
+    stats: Dict[str, Any] = None,
+    use_response_cache: bool = False,
+    stream: bool = False,
+    round_mode: str = "sequential",
+    max_concurrency: int = PANEL_MAX_CONCURRENCY,
+    progress_callback: Callable[[Dict[str, Any]], None] = None,
+    novelty_detector: NoveltyDetector = None,
+    early_stop: bool = False,
+    resume_state: Dict[str, Any] = None
+):
+    """
+    Führt eine Konversation mit ausgewählten Agenten durch.
+    Synchroner Wrapper um joint_conversation_async: treibt den asynchronen Generator auf einer
+    eigenen Event-Loop an, Hintergrund-Tasks laufen weiter, während der Aufrufer rendert.
+
+    Args:
+        conversation_topic (str): Das Thema der Konversation.
+        selected_agents (List[Dict[str, str]]): Die Liste der ausgewählten Agenten.
+        iterations (int): Die Anzahl der Gesprächsrunden.
+        expertise_level (str): Das Experten-Level der Agenten.
+        language (str): Die Sprache der Konversation.
+        chat_history (List[Dict[str, str]]): Der Chatverlauf.
+        user_state (str): Der Zustand des Benutzers.
+        discussion_id (str, optional): Die ID der Diskussion.  Wird automatisch generiert, wenn nicht angegeben.
+        api_key (str, optional): Der API-Schlüssel für den Gemini-Dienst.
+        uploaded_file: Die hochgeladene Datei (optional).
+        summary_mode (str, optional): "sequential" oder "pipelined" (siehe joint_conversation_async).
+        summary_policy (SummaryPolicy, optional): Taktung der rollierenden Zusammenfassung.
+        stats (Dict[str, Any], optional): Wird mit Kennzahlen der Diskussion befüllt.
+        use_response_cache (bool, optional): Den persistenten Antwort-Cache verwenden.
+        stream (bool, optional): Agentenantworten streamen (Teilstücke haben Chatverlauf None).
+        round_mode (str, optional): "sequential" oder "panel" (siehe joint_conversation_async).
+        max_concurrency (int, optional): Maximale Anzahl paralleler Aufrufe im Panel-Modus.
+        progress_callback (Callable, optional): Fortschritts-Hook (siehe joint_conversation_async).
+        novelty_detector (NoveltyDetector, optional): Lokale Neuheitsbewertung (siehe joint_conversation_async).
+        early_stop (bool, optional): Festgefahrene Diskussionen vorzeitig beenden.
+        resume_state (Dict[str, Any], optional): Fortzusetzende Diskussion (siehe joint_conversation_async).
+
+    Yields:
+        Tuple: Aktualisierter Chatverlauf, formatierter Textabschnitt, Diskussions-ID, Iterationsnummer, Agentenname.
+    """
+    loop = asyncio.new_event_loop()
+    agen = joint_conversation_async(
+        conversation_topic, selected_agents, iterations, expertise_level, language, chat_history,
+        user_state, discussion_id=discussion_id, api_key=api_key, uploaded_file=uploaded_file,
+        summary_mode=summary_mode, summary_policy=summary_policy, stats=stats,
+        use_response_cache=use_response_cache, stream=stream, round_mode=round_mode,
+        max_concurrency=max_concurrency, progress_callback=progress_callback,
+        novelty_detector=novelty_detector, early_stop=early_stop, resume_state=resume_state
+    )
+    try:
+        while True:
+            try:
+                item = loop.run_until_complete(agen.__anext__())
+            except StopAsyncIteration:
+                break
+            yield item
+    finally:
+        loop.run_until_complete(agen.aclose())
+        loop.close()
+
+@instrumented("save_chat_as_word")
+def save_chat_as_word(chat_history: List[Dict], discussion_id: str) -> str:
+    """
+    Speichert den Chatverlauf als Word-Dokument.
+
+    Args:
+        chat_history (List[Dict]): Der Chatverlauf.
+        discussion_id (str): Die ID der Diskussion.
+
+    Returns:
+        str: Der Dateiname des gespeicherten Word-Dokuments.
+    """
+    document = Document()
+    document.add_heading(f'CipherCore Agenten-Diskussion: {discussion_id}', level=1)
+    for message in chat_history:
+        role = message['role']
+        content = message['content']
+        if role == 'user':
+            document.add_paragraph("Nutzer:", style='List Bullet').add_run(f" {content}").bold = True
+        elif role == 'assistant':
+            agent_name_match = re.search(r'Agent (.*?)\s', content)
+            agent_name = agent_name_match.group(1) if agent_name_match else "Agent"
+            p = document.add_paragraph(f"{agent_name}:", style='List Bullet')
+            p.add_run(f" {content.split(':\n', 1)[1] if ':\n' in content else content}")
+    filename = f"CipherCore_Diskussion_{discussion_id}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.docx"
+    try:
+        document.save(filename)
+        logging.info(f"Word-Datei '{filename}' erfolgreich gespeichert.")
+        return filename
+    except Exception as e:
+        logging.error(f"Fehler beim Speichern der Word-Datei: {e}")
+        return None
+
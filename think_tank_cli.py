@@ -0,0 +1,1128 @@
+"""
+Kommandozeile von AI-THINK-TANK: Batch-Läufe, Benchmarks und Migrationen, z.B.
+``python think_tank_cli.py benchmark`` (Übersicht mit ``--help``).
+"""
+import logging
+import datetime
+import json
+import contextlib
+import os
+import time
+import random
+import threading
+from collections import defaultdict
+from typing import List, Dict, Tuple, Any, Iterator, Callable
+import sqlite3
+import google.generativeai as genai
+import mimetypes
+import sys
+import argparse
+import statistics
+import http.server
+import io
+import tempfile
+import tracemalloc
+import itertools
+import platform
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import think_tank
+from think_tank import (
+    AGENT_CONFIG_FILE, API_KEY_POOL_FILE, AgentRegistry, AgentRegistryLoader, ApiKeyPool,
+    CHAT_HISTORY_CODEC_VERSION, CONVERSATION_SUMMARY_MODE, CircuitBreakerRegistry, DB_BUSY_TIMEOUT_SECONDS,
+    DB_JOURNAL_MODE, GeminiClientPool, LEADERBOARD_MIN_VOTES, LEADERBOARD_SIZE, METRICS_FILE, MODEL_NAME_TEXT,
+    MODEL_NAME_VISION, MetricsRegistry, PERSONALITY_PROMPT_SUFFIXES, ROUND_MODES, RateLimitManager, RateLimiter,
+    ResponseCache, SUMMARY_EVERY_N_TURNS, SUMMARY_MODES, StubBackend, USER_DATA_SCHEMA, agent_leaderboard_db,
+    append_discussion_messages_db, create_discussion_table, discussion_search_available, expand_discussion_messages,
+    finish_discussion_db, format_prompt_message, get_agent_registry, get_api_key_pool, get_discussion_db,
+    get_file_part_cache, get_metrics, get_sleep_seconds_total, get_user_db, hash_password, index_discussion_search,
+    instrumented, joint_conversation_with_selected_agents, list_discussions_db, load_agent_config,
+    load_discussion_db, load_json_data, load_rate_limit_config, login_user, migrate_chat_history_codec,
+    new_discussion_id, rate_agent_response, rebuild_agent_rating_stats, save_discussion_data_db, save_json_data,
+    search_discussions_db, searchable_contents, set_llm_backend, set_process_api_key_pool,
+    set_process_circuit_breakers, set_process_rate_limiter, set_process_response_cache, start_discussion_db,
+    start_metrics_exporters, write_metrics_file
+)
+
+def latency_stats_ms(durations_ms: List[float], precision: int = 3) -> Dict[str, float]:
+    """
+    Mittelwert, Median und p95 gemessener Dauern.
+
+    Args:
+        durations_ms (List[float]): Dauern in Millisekunden.
+        precision (int, optional): Nachkommastellen.
+
+    Returns:
+        Dict[str, float]: mean_ms, p50_ms und p95_ms.
+    """
+    durations_ms = sorted(durations_ms)
+    return {
+        "mean_ms": round(statistics.mean(durations_ms), precision),
+        "p50_ms": round(durations_ms[(len(durations_ms) - 1) // 2], precision),
+        "p95_ms": round(durations_ms[int(0.95 * (len(durations_ms) - 1))], precision),
+    }
+
+def measure_latency_ms(func: Callable[[], Any], runs: int, precision: int = 3) -> Dict[str, float]:
+    """
+    Ruft `func` `runs`-mal nacheinander auf und misst jeden Aufruf.
+
+    Args:
+        func (Callable[[], Any]): Die zu messende Funktion.
+        runs (int): Anzahl der Aufrufe.
+        precision (int, optional): Nachkommastellen.
+
+    Returns:
+        Dict[str, float]: Latenz in Millisekunden (siehe latency_stats_ms).
+    """
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return latency_stats_ms(durations, precision)
+
+@contextlib.contextmanager
+def temporary_database(filename: str, setting: str = "DISCUSSION_DB_FILE", **overrides: Any) -> Iterator[str]:
+    """
+    Richtet die Datenbankeinstellung `setting` (DISCUSSION_DB_FILE oder USER_DB_FILE in think_tank) für die Dauer des Blocks
+    auf eine neue Datei in einem temporären Verzeichnis; Benchmarks und Prüfungen berühren so nie die echten
+    Datenbanken. Weitere Modulkonstanten (z.B. DB_JOURNAL_MODE) können über `overrides` gesetzt werden.
+    Alle Werte werden auch bei einer Ausnahme wiederhergestellt.
+
+    Args:
+        filename (str): Dateiname der temporären Datenbank.
+        setting (str, optional): Name der Modulkonstante von think_tank mit dem Dateipfad.
+        **overrides: Weitere Modulkonstanten und ihre Werte für die Dauer des Blocks.
+
+    Yields:
+        str: Das temporäre Verzeichnis (für weitere Dateien des Benchmarks).
+    """
+    module_globals = vars(think_tank)
+    saved = {name: module_globals[name] for name in (setting, *overrides)}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        module_globals.update(overrides)
+        module_globals[setting] = os.path.join(tmp_dir, filename)
+        try:
+            yield tmp_dir
+        finally:
+            module_globals.update(saved)
+
+class StubGeminiHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Minimaler lokaler Ersatz für den generateContent-Endpunkt der Gemini API (für Benchmarks).
+    Unterstützt Keep-Alive, damit wiederverwendete Verbindungen messbar sind.
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        body = json.dumps({
+            "candidates": [{"content": {"role": "model", "parts": [{"text": "Stub-Antwort"}]}, "finishReason": "STOP"}],
+            "usageMetadata": {"promptTokenCount": 10, "candidatesTokenCount": 2, "totalTokenCount": 12}
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def benchmark_client_pool(calls: int = 200) -> Dict[str, Any]:
+    """
+    Misst den Overhead pro Aufruf gegen einen lokalen Stub-Server: neuer Client pro Aufruf
+    (bisheriges Verhalten) gegenüber wiederverwendeten Clients aus dem GeminiClientPool.
+
+    Args:
+        calls (int): Anzahl der Aufrufe pro Variante.
+
+    Returns:
+        Dict[str, Any]: Mittelwert, Median und p95 in Millisekunden je Variante sowie die Prüfung,
+            dass ein verdrängter, noch ausgeliehener Client erst nach der Rückgabe geschlossen wird.
+    """
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubGeminiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client_kwargs = {"http_options": {"base_url": f"http://127.0.0.1:{server.server_address[1]}"}}
+    api_key = "benchmark-key"
+
+    def call(client: Any) -> None:
+        client.models.generate_content(model=MODEL_NAME_TEXT, contents=["ping"])
+
+    def pooled_call() -> None:
+        with pool.lease(api_key) as client:
+            call(client)
+
+    def usable(client: Any) -> bool:
+        try:
+            call(client)
+            return True
+        except Exception:
+            return False
+
+    try:
+        pool = GeminiClientPool(client_kwargs=client_kwargs)
+        results = {
+            "calls": calls,
+            "new_client_per_call": measure_latency_ms(lambda: call(genai.Client(api_key=api_key, **client_kwargs)), calls),
+            "pooled_client": measure_latency_ms(pooled_call, calls),
+        }
+        # Ein ausgeliehener Client, der verdrängt wird (max_size=1), bleibt bis zur Rückgabe nutzbar.
+        small_pool = GeminiClientPool(max_size=1, client_kwargs=client_kwargs)
+        with small_pool.lease("benchmark-key-a") as leased_client:
+            with small_pool.lease("benchmark-key-b"):
+                pass
+            results["evicted_client_usable_while_leased"] = usable(leased_client)
+        results["evicted_client_closed_after_release"] = not usable(leased_client)
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+class LocalFile(io.BytesIO):
+    """
+    Datei von der Festplatte mit der Schnittstelle von Streamlits UploadedFile (name, type, getvalue),
+    damit der Konversations-Motor auch ohne Streamlit-Upload arbeiten kann.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            super().__init__(f.read())
+        self.name = os.path.basename(path)
+        self.type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.file_id = None
+
+def resolve_agents(agent_specs: List[Any], registry: AgentRegistry) -> List[Dict[str, str]]:
+    """
+    Übersetzt Agentennamen (oder {"name", "personality"}-Objekte) in die Agentenstruktur des Motors.
+
+    Args:
+        agent_specs (List[Any]): Agentennamen oder Objekte mit Name und optionaler Persönlichkeit.
+        registry (AgentRegistry): Die geladene Agentenkonfiguration.
+
+    Returns:
+        List[Dict[str, str]]: Die ausgewählten Agenten mit Persönlichkeit und Anweisung.
+
+    Raises:
+        ValueError: Wenn ein Agent nicht in der Konfiguration vorkommt.
+    """
+    selected = []
+    for spec in agent_specs:
+        name = spec if isinstance(spec, str) else spec["name"]
+        if name not in registry:
+            raise ValueError(f"Unbekannter Agent: {name}")
+        selected.append(registry.select(name, None if isinstance(spec, str) else spec.get("personality")))
+    return selected
+
+BATCH_ENGINE_OPTIONS = ["summary_mode", "round_mode", "max_concurrency", "use_response_cache", "early_stop"]
+
+def run_discussion_job(job_index: int, spec: Dict[str, Any], api_key: str, user: str) -> Dict[str, Any]:
+    """
+    Führt eine Diskussion ohne Streamlit-Oberfläche vollständig durch (für den Batch-Betrieb).
+
+    Args:
+        job_index (int): Die laufende Nummer des Jobs.
+        spec (Dict[str, Any]): topic, agents, iterations, language, optional file, expertise_level
+            sowie optionale Motor-Parameter (BATCH_ENGINE_OPTIONS).
+        api_key (str): Der API-Schlüssel für den Gemini-Dienst.
+        user (str): Benutzer, unter dem die Diskussion gespeichert wird.
+
+    Returns:
+        Dict[str, Any]: Ergebnis- und Zeitdaten des Jobs für das JSONL-Protokoll.
+    """
+    started = time.time()
+    discussion_id = spec.get("discussion_id") or f"batch_{new_discussion_id()}_{job_index:04d}"
+    result = {"job": job_index, "discussion_id": discussion_id, "topic": spec.get("topic"), "started": datetime.datetime.fromtimestamp(started).isoformat()}
+    try:
+        selected_agents = resolve_agents(spec["agents"], get_agent_registry())
+        uploaded_file = LocalFile(spec["file"]) if spec.get("file") else None
+        stats = {}
+        options = {key: spec[key] for key in BATCH_ENGINE_OPTIONS if key in spec}
+
+        def log_progress(info: Dict[str, Any]) -> None:
+            logging.info(f"Batch-Job {job_index}: Iteration {info['iteration']} von {info['agent_name']} abgeschlossen.")
+
+        final_summary = None
+        for _, chunk_text, _, iteration_num, _ in joint_conversation_with_selected_agents(
+            conversation_topic=spec["topic"],
+            selected_agents=selected_agents,
+            iterations=int(spec.get("iterations", 10)),
+            expertise_level=spec.get("expertise_level", "Experte"),
+            language=spec.get("language", "de"),
+            chat_history=[],
+            user_state=user,
+            discussion_id=discussion_id,
+            api_key=api_key,
+            uploaded_file=uploaded_file,
+            stats=stats,
+            progress_callback=log_progress,
+            **options
+        ):
+            if iteration_num is None:
+                final_summary = chunk_text
+        result.update({"status": "ok", "stats": stats, "summary_preview": (final_summary or "")[:200]})
+    except Exception as e:
+        logging.error(f"Batch-Job {job_index} fehlgeschlagen: {e}", exc_info=e)
+        result.update({"status": "error", "error": str(e)})
+    result["duration_seconds"] = round(time.time() - started, 3)
+    return result
+
+def _init_batch_worker(shared_limiter: Any) -> None:
+    set_process_rate_limiter(shared_limiter)
+    start_metrics_exporters(http_endpoint=False)
+
+def run_batch(specs_file: str, results_file: str, api_key: str, workers: int = 2, user: str = "batch") -> int:
+    """
+    Führt alle Diskussionen einer JSONL-Datei in einem Prozess-Pool aus. Alle Worker teilen sich
+    über einen Manager-Prozess einen RateLimiter und damit das Kontingent. Jede Diskussion wird
+    nach jeder Iteration in discussion_messages gespeichert; pro Job wird eine Zeile in results_file geschrieben.
+
+    Args:
+        specs_file (str): JSONL-Datei mit einer Diskussions-Spezifikation pro Zeile.
+        results_file (str): JSONL-Datei, an die Ergebnis- und Zeitdaten angehängt werden.
+        api_key (str): Der API-Schlüssel für den Gemini-Dienst.
+        workers (int, optional): Anzahl der Worker-Prozesse.
+        user (str, optional): Benutzer, unter dem die Diskussionen gespeichert werden.
+
+    Returns:
+        int: Die Anzahl der fehlgeschlagenen Jobs.
+    """
+    with open(specs_file, "r", encoding="utf-8") as f:
+        specs = [json.loads(line) for line in f if line.strip()]
+    logging.info(f"Batch gestartet: {len(specs)} Diskussionen, {workers} Worker.")
+    failures = 0
+    with RateLimitManager() as manager:
+        shared_limiter = manager.RateLimiter(load_rate_limit_config())
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker, initargs=(shared_limiter,)) as pool:
+            futures = [pool.submit(run_discussion_job, idx, spec, api_key, user) for idx, spec in enumerate(specs)]
+            with open(results_file, "a", encoding="utf-8") as out:
+                for future in as_completed(futures):
+                    result = future.result()
+                    if result["status"] != "ok":
+                        failures += 1
+                    out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    out.flush()
+    logging.info(f"Batch beendet: {len(specs) - failures} erfolgreich, {failures} fehlgeschlagen.")
+    return failures
+
+BENCHMARK_AGENT_COUNTS = [2, 4]        # Standard-Raster für den Motor-Benchmark
+BENCHMARK_ITERATIONS = [4, 8]
+BENCHMARK_FILE_SIZES_KB = [0, 256]     # 0 = ohne Datei-Upload
+
+def benchmark_engine(
+    agent_counts: List[int],
+    iterations_list: List[int],
+    file_sizes_kb: List[int],
+    backend_options: Dict[str, Any],
+    engine_options: Dict[str, Any],
+    rate_limit: Dict[str, int] = None,
+    repeat: int = 1
+) -> List[Dict[str, Any]]:
+    """
+    Führt joint_conversation_with_selected_agents für jede Kombination aus Agentenzahl, Iterationen
+    und Dateigröße gegen ein StubBackend aus. Ohne `rate_limit` wird ein Kontingent verwendet,
+    das nie blockiert, damit nur der Motor selbst gemessen wird.
+
+    Args:
+        agent_counts (List[int]): Zu messende Anzahl an Agenten.
+        iterations_list (List[int]): Zu messende Anzahl an Iterationen.
+        file_sizes_kb (List[int]): Zu messende Dateigrößen in KB (0 = ohne Datei).
+        backend_options (Dict[str, Any]): Parameter für StubBackend (Latenz, Antwortlänge, 429-Quote, Seed).
+        engine_options (Dict[str, Any]): Zusätzliche Motor-Parameter (z.B. summary_mode, round_mode).
+        rate_limit (Dict[str, int], optional): rpm/tpm für alle Modelle.
+        repeat (int, optional): Wiederholungen pro Szenario.
+
+    Returns:
+        List[Dict[str, Any]]: Ein Messergebnis pro Szenario und Wiederholung.
+    """
+    limits = rate_limit or {"rpm": 10 ** 9, "tpm": 10 ** 12}
+    registry = get_agent_registry()
+    results = []
+    # Benchmark-Diskussionen und Antwort-Cache landen im temporären Verzeichnis, nicht in den echten Datenbanken.
+    with temporary_database("benchmark_discussions.db") as tmp_dir:
+        create_discussion_table()
+        for num_agents, iterations, file_kb, run in itertools.product(agent_counts, iterations_list, file_sizes_kb, range(repeat)):
+            if num_agents > len(registry):
+                logging.warning(f"Benchmark: {num_agents} Agenten angefordert, nur {len(registry)} konfiguriert.")
+                continue
+            uploaded_file = None
+            if file_kb:
+                path = os.path.join(tmp_dir, f"bench_{file_kb}kb.pdf")
+                if not os.path.exists(path):
+                    with open(path, "wb") as f:
+                        f.write(random.Random(file_kb).randbytes(file_kb * 1024))
+                uploaded_file = LocalFile(path)
+            backend = StubBackend(**backend_options)
+            set_llm_backend(backend)
+            set_process_rate_limiter(RateLimiter({"models": {MODEL_NAME_TEXT: limits, MODEL_NAME_VISION: limits}}))
+            set_process_response_cache(ResponseCache(os.path.join(tmp_dir, f"response_cache_{len(results)}.db")))
+            set_process_circuit_breakers(CircuitBreakerRegistry())
+            set_process_api_key_pool(ApiKeyPool())
+            get_file_part_cache().clear()
+            stats = {}
+            sleep_before = get_sleep_seconds_total()
+            tracemalloc.start()
+            started = time.perf_counter()
+            try:
+                for _ in joint_conversation_with_selected_agents(
+                    conversation_topic="Benchmark: Chancen und Risiken autonomer Stadtlogistik",
+                    selected_agents=resolve_agents(registry.names[:num_agents], registry),
+                    iterations=iterations,
+                    expertise_level="Experte",
+                    language="de",
+                    chat_history=[],
+                    user_state="benchmark",
+                    discussion_id=f"benchmark_{num_agents}_{iterations}_{file_kb}_{run}",
+                    api_key="benchmark-key",
+                    uploaded_file=uploaded_file,
+                    stats=stats,
+                    **engine_options
+                ):
+                    pass
+                wall_seconds = time.perf_counter() - started
+            finally:
+                _, peak_bytes = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                set_llm_backend(None)
+                set_process_rate_limiter(None)
+                set_process_response_cache(None)
+                set_process_circuit_breakers(None)
+                set_process_api_key_pool(None)
+            prompt_bytes = backend.prompt_bytes
+            results.append({
+                "scenario": f"agents={num_agents},iterations={iterations},file_kb={file_kb}",
+                "run": run,
+                "agents": num_agents,
+                "iterations": iterations,
+                "file_kb": file_kb,
+                "wall_seconds": round(wall_seconds, 4),
+                "llm_calls": backend.calls,
+                "injected_errors": dict(backend.injected_errors),
+                "prompt_bytes_total": sum(prompt_bytes),
+                "prompt_bytes_per_call_mean": round(statistics.mean(prompt_bytes), 1) if prompt_bytes else 0,
+                "prompt_bytes_per_call_max": max(prompt_bytes, default=0),
+                "peak_memory_bytes": peak_bytes,
+                "sleep_seconds": round(get_sleep_seconds_total() - sleep_before, 4),
+                "engine_stats": stats,
+            })
+            results[-1]["message_storage"] = discussion_message_storage(f"benchmark_{num_agents}_{iterations}_{file_kb}_{run}")
+            logging.info(f"Benchmark {results[-1]['scenario']}: {results[-1]['wall_seconds']} s, {backend.calls} Aufrufe.")
+    return results
+
+def compare_benchmark_results(results: List[Dict[str, Any]], baseline_file: str, tolerance: float = 0.2) -> List[str]:
+    """
+    Vergleicht Benchmark-Ergebnisse mit einer früheren JSONL-Ausgabe und meldet Regressionen.
+
+    Args:
+        results (List[Dict[str, Any]]): Die aktuellen Ergebnisse aus benchmark_engine.
+        baseline_file (str): JSONL-Datei eines früheren Laufs.
+        tolerance (float, optional): Erlaubte relative Verschlechterung (0.2 = 20 %).
+
+    Returns:
+        List[str]: Beschreibungen aller Regressionen (leer, wenn keine).
+    """
+    def aggregate(rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            grouped.setdefault(row["scenario"], []).append(row)
+        return {
+            scenario: {metric: statistics.median(r[metric] for r in rows) for metric in ["wall_seconds", "llm_calls", "prompt_bytes_total", "peak_memory_bytes", "sleep_seconds"]}
+            for scenario, rows in grouped.items()
+        }
+
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        baseline = aggregate([json.loads(line) for line in f if line.strip() and '"scenario"' in line])
+    regressions = []
+    for scenario, current in aggregate(results).items():
+        if scenario not in baseline:
+            continue
+        for metric, value in current.items():
+            before = baseline[scenario][metric]
+            if value > before * (1 + tolerance) and value - before > 1e-3:
+                regressions.append(f"{scenario}: {metric} {round(before, 4)} -> {round(value, 4)}")
+    return regressions
+
+def benchmark_metrics(calls: int = 100000) -> Dict[str, float]:
+    """
+    Misst den Overhead der Metrik-Erfassung pro Aufruf: Zähler, Histogramm und den
+    instrumented-Dekorator gegenüber einem unverpackten Funktionsaufruf.
+
+    Args:
+        calls (int): Anzahl der Messungen pro Variante.
+
+    Returns:
+        Dict[str, float]: Nanosekunden pro Aufruf je Variante.
+    """
+    registry = MetricsRegistry()
+
+    def noop() -> None:
+        pass
+
+    def time_per_call(func: Callable) -> float:
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        return (time.perf_counter() - start) / calls * 1e9
+
+    wrapped = instrumented("benchmark_noop")(noop)
+    baseline = time_per_call(noop)
+    results = {
+        "calls": calls,
+        "counter_inc_ns": time_per_call(lambda: registry.inc("llm_attempts_total", model=MODEL_NAME_TEXT)),
+        "histogram_observe_ns": time_per_call(lambda: registry.observe("llm_request_duration_seconds", 0.042, model=MODEL_NAME_TEXT)),
+        "instrumented_overhead_ns": time_per_call(wrapped) - baseline,
+        "render_prometheus_ms": 0.0,
+    }
+    start = time.perf_counter()
+    get_metrics().render_prometheus()
+    results["render_prometheus_ms"] = (time.perf_counter() - start) * 1000
+    # Ein call_gemini_api-Aufruf verbucht etwa 8 Zähler/Histogramm-Werte.
+    results["per_llm_call_overhead_us"] = (4 * results["counter_inc_ns"] + 4 * results["histogram_observe_ns"]) / 1000
+    return {key: round(value, 3) for key, value in results.items()}
+
+def benchmark_agent_registry(reruns: int = 50, selected: int = 10, iterations: int = 20, synthetic_agents: int = 5000) -> List[Dict[str, Any]]:
+    """
+    Misst die Agenten-Arbeit eines Streamlit-Reruns (Konfiguration laden, Auswahl aufbauen,
+    Agent pro Iteration nachschlagen) bisher (load_agent_config + lineare Suche) und mit
+    AgentRegistry, für AGENT_CONFIG_FILE und eine synthetische Konfiguration.
+
+    Args:
+        reruns (int): Anzahl simulierter Reruns pro Variante.
+        selected (int): Anzahl ausgewählter Agenten (die letzten der Konfiguration, ungünstigster Fall der Suche).
+        iterations (int): Nachschlagen pro Rerun wie im Motor.
+        synthetic_agents (int): Größe der synthetischen Konfiguration.
+
+    Returns:
+        List[Dict[str, Any]]: Millisekunden pro Rerun (Mittelwert, Median, p95) je Konfiguration und Variante.
+    """
+    personalities = ["kritisch", "visionär", "konservativ", "neutral"]
+
+    def legacy_rerun(path: str) -> None:
+        config = load_agent_config(path)
+        names = [a["name"] for a in config[-selected:]]
+        agents = [
+            {"name": name, "personality": "neutral", "instruction": next((a["description"] for a in config if a["name"] == name), "")}
+            for name in names
+        ]
+        for i in range(iterations):
+            next((a for a in agents if a["name"] == names[i % len(names)]), None)
+
+    def registry_rerun(loader: AgentRegistryLoader, path: str) -> None:
+        registry = loader.get(path)
+        agents = [registry.select(name, "neutral") for name in registry.names[-selected:]]
+        for i in range(iterations):
+            agents[i % len(agents)]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        synthetic_path = os.path.join(tmp_dir, "agent_config_synthetic.json")
+        rng = random.Random(42)
+        with open(synthetic_path, "w", encoding="utf-8") as f:
+            json.dump([
+                {"name": f"Agent {index:05d}", "personality": rng.choice(personalities), "description": f"Synthetischer Experte Nummer {index} für Benchmarks."}
+                for index in range(synthetic_agents)
+            ], f, ensure_ascii=False)
+        # Kopie, damit die Änderungsprüfung die echte Konfiguration nicht anfasst.
+        config_path = os.path.join(tmp_dir, "agent_config.json")
+        with open(AGENT_CONFIG_FILE, "rb") as src, open(config_path, "wb") as dst:
+            dst.write(src.read())
+        for label, path in (("config", config_path), (f"synthetic_{synthetic_agents}", synthetic_path)):
+            loader = AgentRegistryLoader()
+            start = time.perf_counter()
+            registry = loader.get(path)
+            cold_ms = (time.perf_counter() - start) * 1000
+            legacy = measure_latency_ms(lambda: legacy_rerun(path), reruns, precision=4)
+            cached = measure_latency_ms(lambda: registry_rerun(loader, path), reruns, precision=4)
+            # Änderung der Datei muss beim nächsten Zugriff erkannt werden.
+            stat_result = os.stat(path)
+            os.utime(path, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns + 1_000_000))
+            loader.get(path)
+            results.append({
+                "config": label,
+                "agents": len(registry),
+                "legacy": legacy,
+                "registry": cached,
+                "registry_cold_load_ms": round(cold_ms, 4),
+                "speedup": round(legacy["mean_ms"] / cached["mean_ms"], 1) if cached["mean_ms"] else None,
+                "reloaded_on_change": loader.loads == 2,
+            })
+    return results
+
+def synthetic_text_generator(rng: random.Random) -> Tuple[List[str], Callable[[int], str]]:
+    """
+    Synthetischer Wortschatz für Datenbank-Benchmarks: einige tausend Kunstwörter aus Silben,
+    Worthäufigkeiten nach Zipf (Rang 1 am häufigsten), ähnlich natürlicher Sprache.
+
+    Args:
+        rng (random.Random): Zufallsgenerator (bestimmt Wortschatz und Texte).
+
+    Returns:
+        Tuple[List[str], Callable[[int], str]]: Der Wortschatz (häufigste zuerst) und eine Funktion,
+            die einen Text aus der angegebenen Anzahl Wörter erzeugt.
+    """
+    syllables = ["ka", "lo", "mi", "ne", "ra", "su", "ti", "ver", "ber", "stad", "netz", "wer", "gen", "ung", "kraft", "lich"]
+    vocabulary = sorted({"".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(8000)})
+    rng.shuffle(vocabulary)
+    cumulative = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+    def words(count: int) -> str:
+        return " ".join(rng.choices(vocabulary, cum_weights=cumulative, k=count))
+
+    return vocabulary, words
+
+def benchmark_discussion_search(discussions: int = 100000, messages: int = 4, users: int = 100, queries: int = 50) -> Dict[str, Any]:
+    """
+    Misst die Volltextsuche auf einer synthetischen Datenbank: Aufbau, Kosten des inkrementellen Einfügens
+    (save_discussion_data_db, append_discussion_messages_db) und Latenz von search_discussions_db für
+    seltene, häufige, Präfix- und Mehrwort-Abfragen. Wörter folgen einer Zipf-Verteilung.
+
+    Args:
+        discussions (int): Anzahl synthetischer Diskussionen.
+        messages (int): Agentenantworten pro Diskussion.
+        users (int): Anzahl der Benutzer, auf die die Diskussionen verteilt werden.
+        queries (int): Abfragen pro Abfrageart.
+
+    Returns:
+        Dict[str, Any]: Aufbauzeit, Datenbankgröße, Millisekunden pro Einfügen und Latenz (Mittelwert, Median, p95) je Abfrageart.
+    """
+    if not discussion_search_available():
+        raise RuntimeError(f"SQLite {sqlite3.sqlite_version} ohne FTS5 oder älter als 3.35, keine Volltextsuche verfügbar.")
+    rng = random.Random(42)
+    vocabulary, words = synthetic_text_generator(rng)
+
+    def discussion(index: int) -> Tuple[str, str, List[str], List[Dict[str, str]], str, str]:
+        chat_history = [
+            {"role": "assistant", "content": f"Antwort von Agent Agent{turn} (Iteration {turn + 1}):\n{words(50)}"}
+            for turn in range(messages)
+        ]
+        return f"synthetic_{index:07d}", words(5), [f"Agent{turn}" for turn in range(messages)], chat_history, words(40), f"user{index % users:04d}"
+
+    with temporary_database("discussion_search_benchmark.db"):
+        create_discussion_table()
+        # Aufbau in einer Transaktion über denselben Indexpfad wie save_discussion_data_db.
+        start = time.perf_counter()
+        with get_discussion_db().transaction() as cursor:
+            for index in range(discussions):
+                disc_id, topic, agents, chat_history, summary, user = discussion(index)
+                cursor.execute(
+                    "INSERT INTO discussions (discussion_id, topic, agents, chat_history, summary, user) VALUES (?, ?, ?, ?, ?, ?)",
+                    (disc_id, topic, json.dumps(agents), json.dumps(chat_history), summary, user)
+                )
+                index_discussion_search(cursor, disc_id, topic, summary, searchable_contents(chat_history))
+        build_seconds = time.perf_counter() - start
+
+        inserts = iter(range(discussions, discussions + queries))
+        save = measure_latency_ms(lambda: save_discussion_data_db(*discussion(next(inserts))), queries)
+        append = measure_latency_ms(lambda: append_discussion_messages_db(
+            f"synthetic_{discussions:07d}", [{"role": "assistant", "content": words(50), "turn": 1, "agent": "Agent0"}]), queries)
+
+        query_kinds = {
+            "selten": lambda: rng.choice(vocabulary[2000:]),
+            "häufig": lambda: rng.choice(vocabulary[:10]),
+            "präfix": lambda: rng.choice(vocabulary[100:1000])[:3] + "*",
+            "mehrere_wörter": lambda: f"{rng.choice(vocabulary[:200])} {rng.choice(vocabulary[200:1000])}",
+        }
+        latency = {}
+        for kind, make_query in query_kinds.items():
+            hits = []
+            latency[kind] = measure_latency_ms(lambda: hits.append(len(search_discussions_db(make_query(), f"user{rng.randrange(users):04d}"))), queries)
+            latency[kind]["mean_hits"] = round(statistics.mean(hits), 1)
+        return {
+            "discussions": discussions,
+            "fts_rows": discussions * (messages + 1),
+            "build_seconds": round(build_seconds, 2),
+            "db_mb": round(get_discussion_db().file_size() / 1e6, 1),
+            "save_discussion_data_db": save,
+            "append_discussion_messages_db": append,
+            "search_latency": latency,
+        }
+
+def synthetic_transcript(words: Callable[[int], str], rounds: int, agents: int = 4, answer_words: int = 200, summary_words: int = 150) -> List[Dict[str, str]]:
+    """
+    Chatverlauf im Format von joint_conversation_async: pro Runde ein Prompt mit Thema und rollierender
+    Zusammenfassung (erneuert alle SUMMARY_EVERY_N_TURNS Runden) und eine Agentenantwort,
+    am Ende Gesamtzusammenfassung und finale Aussage.
+
+    Args:
+        words (Callable[[int], str]): Textgenerator (siehe synthetic_text_generator).
+        rounds (int): Anzahl der Runden.
+        agents (int, optional): Anzahl der Agenten im Wechsel.
+        answer_words (int, optional): Wörter pro Antwort.
+        summary_words (int, optional): Wörter pro Zusammenfassung.
+
+    Returns:
+        List[Dict[str, str]]: Der Chatverlauf.
+    """
+    topic = words(6)
+    summary = "Start der Konversation."
+    chat_history = []
+    for i in range(rounds):
+        if i and i % SUMMARY_EVERY_N_TURNS == 0:
+            summary = words(summary_words)
+        agent_name = f"Agent {i % agents}"
+        chat_history.append({"role": "user", "content": format_prompt_message(agent_name, i + 1, topic, summary, False)})
+        chat_history.append({"role": "assistant", "content": f"Antwort von Agent {agent_name} (Iteration {i + 1}):\n{words(answer_words)}"})
+    chat_history.append({"role": "assistant", "content": f"**Gesamtzusammenfassung**:\n{words(summary_words)}"})
+    chat_history.append({"role": "assistant", "content": f"Finale Aussage:\n{chat_history[-2]['content']}"})
+    return chat_history
+
+def discussion_message_storage(discussion_id: str) -> Dict[str, Any]:
+    """
+    Speicherbedarf einer Diskussion in discussion_messages (Spalten content und summary) und zum Vergleich
+    im bisherigen Format, in dem jeder Prompt die Zusammenfassung enthielt und jede Antwort sie wiederholte.
+
+    Args:
+        discussion_id (str): Die ID der Diskussion.
+
+    Returns:
+        Dict[str, Any]: Zeilen, Bytes insgesamt und pro Prompt-Zeile, jeweils aktuell und bisher.
+    """
+    rows = get_discussion_db().connection().execute(
+        "SELECT role, content, error, summary, summary_covered FROM discussion_messages WHERE discussion_id = ? ORDER BY seq",
+        (discussion_id,)).fetchall()
+    stored_bytes = [len(content.encode("utf-8")) + len((summary or "").encode("utf-8")) for _, content, _, summary, _ in rows]
+    legacy_bytes = []
+    current_summary = ""
+    for (role, _, _, summary, summary_covered), message in zip(rows, expand_discussion_messages(rows)):
+        if summary is not None:
+            current_summary = summary
+        repeated_summary = current_summary if role == "assistant" and summary_covered is not None else ""
+        legacy_bytes.append(len(message["content"].encode("utf-8")) + len(repeated_summary.encode("utf-8")))
+    prompt_rows = [index for index, row in enumerate(rows) if row[0] == "user"]
+    return {
+        "rows": len(rows),
+        "bytes": sum(stored_bytes),
+        "legacy_bytes": sum(legacy_bytes),
+        "prompt_row_bytes_mean": round(statistics.mean(stored_bytes[i] for i in prompt_rows)) if prompt_rows else 0,
+        "legacy_prompt_row_bytes_mean": round(statistics.mean(legacy_bytes[i] for i in prompt_rows)) if prompt_rows else 0,
+    }
+
+def benchmark_chat_history_codec(discussions: int = 200, rounds: int = 50, loads: int = 50) -> Dict[str, Any]:
+    """
+    Vergleicht die Spalte chat_history als JSON-Text (bisher) und im aktuellen Format
+    (encode_chat_history) für realistische Verläufe: Datenbankgröße, Zeit pro Speichern und Laden
+    (load_discussion_db) sowie Dauer und Ergebnis von migrate_chat_history_codec auf der JSON-Datenbank.
+    Zusätzlich speichert der Motor (benchmark_engine) eine Diskussion mit `rounds` Iterationen
+    in discussion_messages; gemessen wird deren Speicherbedarf (discussion_message_storage).
+
+    Args:
+        discussions (int): Anzahl gespeicherter Diskussionen.
+        rounds (int): Runden pro Diskussion.
+        loads (int): Anzahl gemessener Ladevorgänge.
+
+    Returns:
+        Dict[str, Any]: Kennzahlen je Format und der Migration.
+    """
+    rng = random.Random(42)
+    _, words = synthetic_text_generator(rng)
+    transcripts = [synthetic_transcript(words, rounds) for _ in range(discussions)]
+
+    def store(index: int, transcript: List[Dict[str, str]], legacy: bool) -> None:
+        disc_id = f"codec_{index:05d}"
+        if not legacy:
+            save_discussion_data_db(disc_id, "Benchmark", ["Agent 0"], transcript, "", "benchmark")
+            return
+        # Bisheriger Speicherpfad: json.dumps als TEXT, sonst identisch.
+        with get_discussion_db().transaction() as cursor:
+            cursor.execute("INSERT INTO discussions (discussion_id, topic, agents, chat_history, summary, user) VALUES (?, ?, ?, ?, ?, ?)",
+                           (disc_id, "Benchmark", json.dumps(["Agent 0"]), json.dumps(transcript), "", "benchmark"))
+            index_discussion_search(cursor, disc_id, "Benchmark", "", searchable_contents(transcript))
+
+    results = {"discussions": discussions, "rounds": rounds, "json_bytes_per_transcript": round(statistics.mean(len(json.dumps(t).encode("utf-8")) for t in transcripts))}
+    for label, legacy in (("json_text", True), (f"codec_v{CHAT_HISTORY_CODEC_VERSION}", False)):
+        with temporary_database(f"{label}.db"):
+            create_discussion_table()
+            to_store = iter(enumerate(transcripts))
+            save = measure_latency_ms(lambda: store(*next(to_store), legacy), len(transcripts))
+            to_load = itertools.cycle(range(discussions))
+            load = measure_latency_ms(lambda: load_discussion_db(f"codec_{next(to_load):05d}"), loads)
+            database = get_discussion_db()
+            column_bytes = database.connection().execute("SELECT SUM(length(CAST(chat_history AS BLOB))) FROM discussions").fetchone()[0]
+            results[label] = {
+                "db_mb": round(database.file_size() / 1e6, 2),
+                "chat_history_mb": round(column_bytes / 1e6, 2),
+                "save": save,
+                "load": load,
+            }
+            if legacy:
+                migration = migrate_chat_history_codec()
+                migration["roundtrip_ok"] = load_discussion_db("codec_00000")["chat_history"] == transcripts[0]
+    results["migration"] = migration
+    engine_run = benchmark_engine([min(4, len(get_agent_registry()))], [rounds], [0], {"latency_mean": 0.0}, {})
+    if engine_run:
+        results["discussion_messages"] = engine_run[0]["message_storage"]
+    return results
+
+def stress_test_discussion_db(writers: int = 4, readers: int = 4, seconds: float = 10.0, rounds: int = 5, messages_per_round: int = 2,
+                              journal_mode: str = None, busy_timeout: float = None) -> Dict[str, Any]:
+    """
+    Belastungstest der Diskussionsdatenbank mit parallelen Threads auf einer temporären Datei: Schreiber legen
+    Diskussionen an, hängen pro Runde mehrere Nachrichten in einer Transaktion an und schließen sie ab;
+    Leser listen, laden und durchsuchen gleichzeitig. Gezählt werden alle protokollierten Datenbankfehler
+    (z.B. "database is locked"). Ob alle geschriebenen Nachrichten ankommen, prüft tests/test_discussion_db.py.
+
+    Args:
+        writers (int): Anzahl schreibender Threads.
+        readers (int): Anzahl lesender Threads.
+        seconds (float): Dauer des Tests.
+        rounds (int): Runden (Schreibtransaktionen) pro Diskussion.
+        messages_per_round (int): Nachrichten pro Runde.
+        journal_mode (str, optional): Journal-Modus zum Vergleich (Standard: DB_JOURNAL_MODE).
+        busy_timeout (float, optional): Busy-Timeout in Sekunden (Standard: DB_BUSY_TIMEOUT_SECONDS).
+
+    Returns:
+        Dict[str, Any]: Operationen pro Sekunde und Latenz (Mittelwert, Median, p95) je Operation, Anzahl der
+            Datenbankfehler, abgeschlossene Diskussionen und Anzahl geöffneter Verbindungen.
+    """
+    class ErrorCounter(logging.Handler):
+        def __init__(self):
+            super().__init__(logging.ERROR)
+            self.messages = []
+
+        def emit(self, record: logging.LogRecord) -> None:
+            if record.getMessage().startswith("Datenbankfehler"):
+                self.messages.append(record.getMessage())
+
+    durations = defaultdict(list)
+    expected_messages = {}
+    discussion_ids = []
+    deadline = 0.0
+
+    def timed(operation: str, func: Callable[[], Any]) -> None:
+        start = time.perf_counter()
+        func()
+        durations[operation].append(time.perf_counter() - start)
+
+    def writer(index: int) -> None:
+        _, words = synthetic_text_generator(random.Random(index))
+        sequence = 0
+        while time.perf_counter() < deadline:
+            disc_id = f"stress_{index:02d}_{sequence:06d}"
+            sequence += 1
+            timed("start_discussion_db", lambda: start_discussion_db(disc_id, words(5), ["Agent 0", "Agent 1"], f"user{index % 4}", {"iterations": rounds}))
+            for turn in range(1, rounds + 1):
+                messages = [{"role": "assistant", "content": words(60), "turn": turn, "agent": f"Agent {offset}"} for offset in range(messages_per_round)]
+                timed("append_discussion_messages_db", lambda: append_discussion_messages_db(disc_id, messages))
+            timed("finish_discussion_db", lambda: finish_discussion_db(disc_id, "completed", words(30)))
+            expected_messages[disc_id] = rounds * messages_per_round
+            discussion_ids.append(disc_id)
+
+    def reader(index: int) -> None:
+        rng = random.Random(1000 + index)
+        vocabulary, _ = synthetic_text_generator(random.Random(index % max(writers, 1)))
+        while time.perf_counter() < deadline:
+            user = f"user{rng.randrange(4)}"
+            timed("list_discussions_db", lambda: list_discussions_db(user))
+            if discussion_ids:
+                disc_id = rng.choice(discussion_ids)
+                timed("load_discussion_db", lambda: load_discussion_db(disc_id))
+            timed("search_discussions_db", lambda: search_discussions_db(rng.choice(vocabulary[:500]), user))
+
+    errors = ErrorCounter()
+    logging.getLogger().addHandler(errors)
+    settings = {"DB_JOURNAL_MODE": journal_mode or DB_JOURNAL_MODE, "DB_BUSY_TIMEOUT_SECONDS": DB_BUSY_TIMEOUT_SECONDS if busy_timeout is None else busy_timeout}
+    with temporary_database("stress_discussions.db", **settings):
+        try:
+            database = get_discussion_db()
+            threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+            threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+            deadline = time.perf_counter() + seconds
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            completed = database.connection().execute("SELECT COUNT(*) FROM discussions WHERE status = 'completed'").fetchone()[0]
+            journal = database.connection().execute("PRAGMA journal_mode").fetchone()[0]
+            connections_opened = database.connections_opened
+        finally:
+            logging.getLogger().removeHandler(errors)
+
+    operations = {}
+    for operation, values in sorted(durations.items()):
+        operations[operation] = {
+            "count": len(values),
+            "per_second": round(len(values) / elapsed, 1),
+            **latency_stats_ms([v * 1000 for v in values]),
+        }
+    write_ops = sum(operations.get(name, {}).get("count", 0) for name in ("start_discussion_db", "append_discussion_messages_db", "finish_discussion_db"))
+    return {
+        "journal_mode": journal,
+        "writers": writers,
+        "readers": readers,
+        "seconds": round(elapsed, 2),
+        "write_transactions_per_second": round(write_ops / elapsed, 1),
+        "messages_per_second": round(sum(expected_messages.values()) / elapsed, 1),
+        "operations": operations,
+        "db_errors": len(errors.messages),
+        "db_error_examples": errors.messages[:3],
+        "discussions_completed": completed,
+        "connections_opened": connections_opened,
+    }
+
+def benchmark_leaderboard(votes: int = 1000000, agents: int = 105, measured_votes: int = 2000, queries: int = 50) -> Dict[str, Any]:
+    """
+    Misst Bewertung und Bestenliste auf einer temporären Datenbank mit `votes` synthetischen Stimmen:
+    Latenz von rate_agent_response (inkl. Fortschreiben der Kennzahlen), agent_leaderboard_db gegenüber
+    einer Aggregation über alle Bewertungen, und ob die fortgeschriebenen Kennzahlen einer Neuberechnung entsprechen.
+
+    Args:
+        votes (int): Anzahl der vorab gespeicherten Stimmen.
+        agents (int): Anzahl der Agenten.
+        measured_votes (int): Anzahl gemessener Stimmen über rate_agent_response.
+        queries (int): Anzahl gemessener Abfragen pro Abfrageart.
+
+    Returns:
+        Dict[str, Any]: Aufbauzeit, Latenzen (Mittelwert, Median, p95) und Ergebnis der Konsistenzprüfung.
+    """
+    rng = random.Random(42)
+    personalities = [*PERSONALITY_PROMPT_SUFFIXES, "neutral"]
+    quality = [rng.uniform(0.2, 0.9) for _ in range(agents)]
+    votes_per_row = 5
+
+    def synthetic_rows() -> Iterator[Tuple[str, int, str, int, int, str]]:
+        # Pro Diskussion 4 Agenten über 10 Iterationen, pro Beitrag votes_per_row Stimmen.
+        for row in range(votes // votes_per_row):
+            discussion, slot = divmod(row // 10, 4)
+            agent = (discussion * 4 + slot) % agents
+            upvotes = sum(rng.random() < quality[agent] for _ in range(votes_per_row))
+            yield (f"bench_{row // 40:07d}", 1 + row % 10, f"Agent {agent:03d}", upvotes, votes_per_row - upvotes, personalities[agent % len(personalities)])
+
+    with temporary_database("leaderboard_benchmark.db"):
+        database = get_discussion_db()
+        start = time.perf_counter()
+        with database.transaction() as cursor:
+            cursor.executemany(
+                "INSERT INTO discussion_ratings (discussion_id, iteration, agent, upvotes, downvotes, personality) VALUES (?, ?, ?, ?, ?, ?)",
+                synthetic_rows())
+            rebuild_agent_rating_stats(cursor)
+        build_seconds = time.perf_counter() - start
+
+        def vote() -> None:
+            agent = rng.randrange(agents)
+            rate_agent_response(f"bench_{rng.randrange(votes // votes_per_row // 40 + 1):07d}", rng.randint(1, 12), f"Agent {agent:03d}",
+                                "upvote" if rng.random() < quality[agent] else "downvote", personalities[agent % len(personalities)])
+
+        conn = database.connection()
+        aggregate_query = """
+            SELECT agent, SUM(upvotes) AS up, SUM(downvotes) AS down, COUNT(DISTINCT discussion_id), wilson_lower_bound(SUM(upvotes), SUM(downvotes)) AS score
+            FROM discussion_ratings GROUP BY agent HAVING up + down >= ? ORDER BY score DESC LIMIT ?
+        """
+        result = {
+            "votes": votes,
+            "rating_rows": votes // votes_per_row,
+            "agents": agents,
+            "build_seconds": round(build_seconds, 2),
+            "rate_agent_response": measure_latency_ms(vote, measured_votes),
+            "agent_leaderboard_db": measure_latency_ms(agent_leaderboard_db, queries),
+            "agent_leaderboard_db_personality": measure_latency_ms(lambda: agent_leaderboard_db(rng.choice(personalities)), queries),
+            "aggregate_over_all_ratings": measure_latency_ms(lambda: conn.execute(aggregate_query, (LEADERBOARD_MIN_VOTES, LEADERBOARD_SIZE)).fetchall(), max(1, queries // 10)),
+        }
+        stats_query = "SELECT agent, personality, upvotes, downvotes, discussions FROM agent_rating_stats ORDER BY agent, personality"
+        maintained = conn.execute(stats_query).fetchall()
+        with database.transaction() as cursor:
+            rebuild_agent_rating_stats(cursor)
+        result["aggregates_ok"] = maintained == conn.execute(stats_query).fetchall()
+        result["top"] = agent_leaderboard_db(limit=3)
+        return result
+
+def benchmark_login(users: int = 100000, logins: int = 2000, json_loads: int = 3) -> Dict[str, Any]:
+    """
+    Misst login_user mit `users` Konten in einer temporären Benutzerdatenbank (bekannter Benutzer, falsches
+    Passwort, unbekannter Benutzer) und zum Vergleich den bisherigen Pfad: user_data.json bei jedem Login
+    vollständig laden und gegen USER_DATA_SCHEMA validieren.
+
+    Args:
+        users (int): Anzahl der Konten.
+        logins (int): Gemessene Logins pro Fall.
+        json_loads (int): Gemessene Durchläufe des bisherigen JSON-Pfads.
+
+    Returns:
+        Dict[str, Any]: Aufbauzeit, Latenzen (Mittelwert, Median, p95) je Fall, Größe der JSON-Datei und
+            fehlgeschlagene Logins bekannter Benutzer.
+    """
+    rng = random.Random(42)
+    accounts = {f"user_{index:07d}": {"password": hash_password(f"passwort_{index}")} for index in range(users)}
+
+    failed_logins = []
+
+    def known_login() -> None:
+        index = rng.randrange(users)
+        if login_user(f"user_{index:07d}", f"passwort_{index}")[1] is None:
+            failed_logins.append(index)
+
+    with temporary_database("login_benchmark.db", "USER_DB_FILE") as tmp_dir:
+        json_file = os.path.join(tmp_dir, "login_benchmark.json")
+        start = time.perf_counter()
+        with get_user_db().transaction() as cursor:
+            cursor.executemany("INSERT INTO users (username, password_hash) VALUES (?, ?)",
+                               ((username, account["password"]) for username, account in accounts.items()))
+        build_seconds = time.perf_counter() - start
+        save_json_data(accounts, json_file)
+        result = {
+            "users": users,
+            "build_seconds": round(build_seconds, 2),
+            "login_user": measure_latency_ms(known_login, logins),
+            "login_user_wrong_password": measure_latency_ms(lambda: login_user(f"user_{rng.randrange(users):07d}", "falsch"), logins),
+            "login_user_unknown": measure_latency_ms(lambda: login_user(f"unbekannt_{rng.randrange(users)}", "falsch"), logins),
+            "json_file_mb": round(os.path.getsize(json_file) / 1e6, 1),
+            "json_load_and_validate": measure_latency_ms(lambda: load_json_data(json_file, USER_DATA_SCHEMA), json_loads),
+        }
+        result["failed_logins"] = len(failed_logins)
+        return result
+
+def run_cli(argv: List[str]) -> int:
+    """
+    Kommandozeilen-Einstieg für Werkzeuge außerhalb der Streamlit-Oberfläche.
+
+    Args:
+        argv (List[str]): Die Kommandozeilenargumente (ohne Programmnamen).
+
+    Returns:
+        int: Der Exit-Code.
+    """
+    parser = argparse.ArgumentParser(description="AI-THINK-TANK Kommandozeilenwerkzeuge")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    bench_metrics = subparsers.add_parser("bench-metrics", help="Overhead der Metrik-Erfassung pro Aufruf messen")
+    bench_metrics.add_argument("--calls", type=int, default=100000)
+
+    bench_registry = subparsers.add_parser("bench-agent-registry", help="Agenten-Arbeit pro Rerun mit und ohne AgentRegistry messen")
+    bench_registry.add_argument("--reruns", type=int, default=50)
+    bench_registry.add_argument("--selected", type=int, default=10)
+    bench_registry.add_argument("--synthetic-agents", type=int, default=5000)
+
+    bench_search = subparsers.add_parser("bench-discussion-search", help="Volltextsuche auf einer synthetischen Diskussionsdatenbank messen")
+    bench_search.add_argument("--discussions", type=int, default=100000)
+    bench_search.add_argument("--messages", type=int, default=4, help="Agentenantworten pro Diskussion")
+    bench_search.add_argument("--users", type=int, default=100)
+    bench_search.add_argument("--queries", type=int, default=50, help="Abfragen pro Abfrageart")
+
+    bench_codec = subparsers.add_parser("bench-chat-history", help="Speicherformat von chat_history: Größe sowie Speicher- und Ladezeit messen")
+    bench_codec.add_argument("--discussions", type=int, default=200)
+    bench_codec.add_argument("--rounds", type=int, default=50)
+
+    migrate_codec = subparsers.add_parser("migrate-chat-history", help="chat_history aller Diskussionen ins aktuelle Speicherformat umwandeln")
+    migrate_codec.add_argument("--batch-size", type=int, default=500)
+    migrate_codec.add_argument("--no-vacuum", action="store_true", help="Datenbankdatei danach nicht verkleinern")
+
+    stress_db = subparsers.add_parser("stress-db", help="Diskussionsdatenbank mit parallelen Schreib- und Lese-Threads belasten")
+    stress_db.add_argument("--writers", type=int, default=4)
+    stress_db.add_argument("--readers", type=int, default=4)
+    stress_db.add_argument("--seconds", type=float, default=10.0)
+    stress_db.add_argument("--rounds", type=int, default=5, help="Schreibtransaktionen pro Diskussion")
+    stress_db.add_argument("--messages-per-round", type=int, default=2)
+    stress_db.add_argument("--journal-mode", help=f"Zum Vergleich, z.B. DELETE (Standard: {DB_JOURNAL_MODE})")
+    stress_db.add_argument("--busy-timeout", type=float, help=f"In Sekunden (Standard: {DB_BUSY_TIMEOUT_SECONDS})")
+
+    bench_leaderboard = subparsers.add_parser("bench-leaderboard", help="Bewertung und Bestenliste bei vielen gespeicherten Stimmen messen")
+    bench_leaderboard.add_argument("--votes", type=int, default=1000000)
+    bench_leaderboard.add_argument("--agents", type=int, default=105)
+    bench_leaderboard.add_argument("--measured-votes", type=int, default=2000)
+
+    bench_login = subparsers.add_parser("bench-login", help="Login-Latenz mit vielen Benutzerkonten messen")
+    bench_login.add_argument("--users", type=int, default=100000)
+    bench_login.add_argument("--logins", type=int, default=2000)
+
+    bench_pool = subparsers.add_parser("bench-client-pool", help="Overhead pro Aufruf mit und ohne Client-Pool messen")
+    bench_pool.add_argument("--calls", type=int, default=200)
+
+    batch = subparsers.add_parser("batch", help="Diskussionen aus einer JSONL-Datei ohne Oberfläche ausführen")
+    batch.add_argument("specs", help="JSONL-Datei mit topic, agents, iterations, language und optional file pro Zeile")
+    batch.add_argument("--results", default="batch_results.jsonl", help="JSONL-Protokoll mit Ergebnis und Laufzeit pro Job")
+    batch.add_argument("--workers", type=int, default=2)
+    batch.add_argument("--user", default="batch", help="Benutzer, unter dem die Diskussionen gespeichert werden")
+    batch.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY"), help="Standard: Umgebungsvariable GEMINI_API_KEY")
+
+    bench = subparsers.add_parser("benchmark", help="Konversations-Motor gegen ein lokales Stub-Backend vermessen")
+    bench.add_argument("--agents", type=int, nargs="+", default=BENCHMARK_AGENT_COUNTS)
+    bench.add_argument("--iterations", type=int, nargs="+", default=BENCHMARK_ITERATIONS)
+    bench.add_argument("--file-kb", type=int, nargs="+", default=BENCHMARK_FILE_SIZES_KB)
+    bench.add_argument("--repeat", type=int, default=1)
+    bench.add_argument("--latency", type=float, default=0.05, help="Mittlere Stub-Latenz in Sekunden")
+    bench.add_argument("--jitter", type=float, default=0.0)
+    bench.add_argument("--latency-distribution", choices=["uniform", "lognormal"], default="uniform")
+    bench.add_argument("--response-chars", type=int, default=800)
+    bench.add_argument("--error-rate-429", type=float, default=0.0)
+    bench.add_argument("--error-rate-5xx", type=float, default=0.0)
+    bench.add_argument("--error-rate-timeout", type=float, default=0.0)
+    bench.add_argument("--retry-after", type=float, help="Retry-After-Vorgabe der injizierten 429- und 503-Fehler in Sekunden")
+    bench.add_argument("--repeat-rate", type=float, default=0.0, help="Anteil der Stub-Antworten, die die vorherige Antwort fast wiederholen")
+    bench.add_argument("--seed", type=int, default=42)
+    bench.add_argument("--rpm", type=int, help="Kontingent simulieren (Standard: unbegrenzt)")
+    bench.add_argument("--tpm", type=int)
+    bench.add_argument("--summary-mode", choices=SUMMARY_MODES, default=CONVERSATION_SUMMARY_MODE)
+    bench.add_argument("--round-mode", choices=ROUND_MODES, default="sequential")
+    bench.add_argument("--early-stop", action="store_true", help="Festgefahrene Diskussionen vorzeitig beenden")
+    bench.add_argument("--output", default="benchmark_results.jsonl")
+    bench.add_argument("--baseline", help="JSONL eines früheren Laufs; Regressionen führen zu Exit-Code 1")
+    bench.add_argument("--tolerance", type=float, default=0.2)
+
+    args = parser.parse_args(argv)
+    start_metrics_exporters()
+    try:
+        return _run_cli_command(parser, args, argv)
+    finally:
+        if METRICS_FILE:
+            write_metrics_file(METRICS_FILE.format(pid=os.getpid()))
+
+def _run_cli_command(parser: argparse.ArgumentParser, args: argparse.Namespace, argv: List[str]) -> int:
+    if args.command == "benchmark":
+        rate_limit = None
+        if args.rpm or args.tpm:
+            rate_limit = {"rpm": args.rpm or 10 ** 9, "tpm": args.tpm or 10 ** 12}
+        results = benchmark_engine(
+            args.agents, args.iterations, args.file_kb,
+            backend_options={
+                "latency_mean": args.latency, "latency_jitter": args.jitter, "latency_distribution": args.latency_distribution,
+                "response_chars": args.response_chars, "error_rate_429": args.error_rate_429, "error_rate_5xx": args.error_rate_5xx,
+                "error_rate_timeout": args.error_rate_timeout, "retry_after": args.retry_after,
+                "repeat_rate": args.repeat_rate, "seed": args.seed
+            },
+            engine_options={"summary_mode": args.summary_mode, "round_mode": args.round_mode, "early_stop": args.early_stop},
+            rate_limit=rate_limit,
+            repeat=args.repeat
+        )
+        meta = {"meta": {"timestamp": datetime.datetime.now().isoformat(), "python": platform.python_version(), "argv": argv}}
+        with open(args.output, "w", encoding="utf-8") as out:
+            out.write(json.dumps(meta) + "\n")
+            for row in results:
+                out.write(json.dumps(row, ensure_ascii=False) + "\n")
+        for row in results:
+            print(f"{row['scenario']:<40} {row['wall_seconds']:>8.3f} s {row['llm_calls']:>5} Aufrufe "
+                  f"{row['prompt_bytes_per_call_mean']:>10.0f} B/Aufruf {row['peak_memory_bytes'] / 1e6:>8.1f} MB {row['sleep_seconds']:>7.2f} s Schlaf")
+        if args.baseline:
+            regressions = compare_benchmark_results(results, args.baseline, args.tolerance)
+            for line in regressions:
+                print(f"REGRESSION {line}")
+            return 1 if regressions else 0
+    elif args.command == "bench-metrics":
+        print(json.dumps(benchmark_metrics(args.calls), indent=4))
+    elif args.command == "bench-agent-registry":
+        print(json.dumps(benchmark_agent_registry(args.reruns, args.selected, synthetic_agents=args.synthetic_agents), indent=4))
+    elif args.command == "bench-discussion-search":
+        print(json.dumps(benchmark_discussion_search(args.discussions, args.messages, args.users, args.queries), indent=4, ensure_ascii=False))
+    elif args.command == "bench-chat-history":
+        print(json.dumps(benchmark_chat_history_codec(args.discussions, args.rounds), indent=4))
+    elif args.command == "migrate-chat-history":
+        print(json.dumps(migrate_chat_history_codec(args.batch_size, not args.no_vacuum), indent=4))
+    elif args.command == "stress-db":
+        result = stress_test_discussion_db(args.writers, args.readers, args.seconds, args.rounds, args.messages_per_round, args.journal_mode, args.busy_timeout)
+        print(json.dumps(result, indent=4, ensure_ascii=False))
+        return 0 if result["db_errors"] == 0 else 1
+    elif args.command == "bench-leaderboard":
+        print(json.dumps(benchmark_leaderboard(args.votes, args.agents, args.measured_votes), indent=4, ensure_ascii=False))
+    elif args.command == "bench-login":
+        print(json.dumps(benchmark_login(args.users, args.logins), indent=4))
+    elif args.command == "bench-client-pool":
+        print(json.dumps(benchmark_client_pool(args.calls), indent=4))
+    elif args.command == "batch":
+        if not args.api_key and not get_api_key_pool().entries:
+            parser.error(f"Kein API-Schlüssel: --api-key angeben, GEMINI_API_KEY/GEMINI_API_KEYS setzen oder {API_KEY_POOL_FILE} anlegen.")
+        return 1 if run_batch(args.specs, args.results, args.api_key, args.workers, args.user) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(run_cli(sys.argv[1:]))